@@ -0,0 +1,113 @@
+"""
+Timetable cache export/import throughput and size.
+Seeds a SQLite database with synthetic connections, exports it with
+`export-cache`'s columnar format (or Parquet with --parquet, requires pyarrow),
+imports the file into an empty database and reports rows per second and the
+file size against the source database.
+Usage: python benchmarks/bench_cache_export.py [--rows N] [--parquet]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.uk_train_schedule import crud  # noqa: E402
+from app.uk_train_schedule.cache_export import (  # noqa: E402
+    export_cache,
+    import_cache,
+)
+from app.uk_train_schedule.identifiers import services, stations  # noqa: E402
+from app.uk_train_schedule.models import Base  # noqa: E402
+
+
+def station(i: int) -> str:
+    return "".join(chr(65 + (i // 26**p) % 26) for p in (2, 1, 0))
+
+
+def synthetic_rows(count: int, stations_count: int = 2500, stops: int = 8):
+    """Services calling at `stops` stations, every ride to each later stop."""
+    rows = []
+    service = 0
+    while len(rows) < count:
+        start = (service * 7) % (24 * 60) + 29_000_000
+        calls = [
+            station((service * 31 + i * 17) % stations_count) for i in range(stops)
+        ]
+        for i in range(stops):
+            for j in range(i + 1, stops):
+                rows.append(
+                    (
+                        start + 4 * i,
+                        start + 4 * j - 1,
+                        calls[i],
+                        calls[j],
+                        f"S{service}",
+                    )
+                )
+        service += 1
+    return rows[:count]
+
+
+def session(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--parquet", action="store_true")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, "source.db")
+        source = session(source_path)
+        rows = synthetic_rows(args.rows)
+        crud.bulk_insert_timetable_entries(source, rows, batch_size=5000)
+        source.commit()
+        export_path = os.path.join(
+            tmp, "cache.parquet" if args.parquet else "cache.ukcol"
+        )
+
+        started = time.perf_counter()
+        export_cache(source, export_path)
+        export_seconds = time.perf_counter() - started
+        source.close()
+
+        stations.clear()
+        services.clear()
+        target = session(os.path.join(tmp, "target.db"))
+        started = time.perf_counter()
+        imported = import_cache(target, export_path)
+        import_seconds = time.perf_counter() - started
+        target.close()
+
+        source_size = os.path.getsize(source_path)
+        export_size = os.path.getsize(export_path)
+        print(f"{imported.entries} connections")
+        print(
+            f"export: {export_seconds:6.2f}s "
+            f"({imported.entries / export_seconds:10.0f} rows/s)"
+        )
+        print(
+            f"import: {import_seconds:6.2f}s "
+            f"({imported.entries / import_seconds:10.0f} rows/s)"
+        )
+        print(
+            f"size:   {export_size / 1e6:.1f} MB export vs "
+            f"{source_size / 1e6:.1f} MB SQLite ({source_size / export_size:.1f}x)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
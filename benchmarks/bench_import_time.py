@@ -0,0 +1,71 @@
+"""
+Import-time budget for the application entrypoint.
+Runs `python -X importtime -c "import main"` in fresh interpreters and fails if
+the median cumulative import time exceeds the budget.
+Usage: python benchmarks/bench_import_time.py [--runs N] [--budget-ms MS] [--module main]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC = str(Path(__file__).resolve().parents[1] / "src")
+DEFAULT_BUDGET_MS = 1200.0
+
+
+def measure(module: str) -> tuple[float, list[tuple[float, str]]]:
+    """
+    Import module in a fresh interpreter.
+    Returns:
+        tuple: (cumulative milliseconds for module, [(self ms, name)] of slowest imports)
+    """
+    env = {**os.environ, "PYTHONPATH": SRC, "env": "PROD"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    total_ms = 0.0
+    slowest = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        slowest.append((int(self_us) / 1000, name.strip()))
+        if name.strip() == module:
+            total_ms = int(cumulative_us) / 1000
+    slowest.sort(reverse=True)
+    return total_ms, slowest[:10]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--module", default="main")
+    args = parser.parse_args(argv)
+
+    timings = []
+    slowest = []
+    for _ in range(args.runs):
+        total_ms, slowest = measure(args.module)
+        timings.append(total_ms)
+    median = statistics.median(timings)
+    print(f"import {args.module}: median {median:.1f} ms over {args.runs} runs")
+    print("slowest modules (self time, last run):")
+    for self_ms, name in slowest:
+        print(f"  {self_ms:8.1f} ms  {name}")
+    if median > args.budget_ms:
+        print(f"FAIL: over budget of {args.budget_ms:.0f} ms")
+        return 1
+    print(f"OK: within budget of {args.budget_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Batch routing throughput against the number of worker processes.
+Builds a synthetic snapshot (a grid of lines with regular services), routes the
+same random batch of journey queries with 1..N workers and reports queries per
+second and the speed-up over one worker.
+Usage: python benchmarks/bench_parallel_routing.py [--queries N] [--workers 1,2,4]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from app.uk_train_schedule.executor import (  # noqa: E402
+    JourneyQuery,
+    RoutingExecutor,
+)
+from app.uk_train_schedule.snapshot import write_snapshot  # noqa: E402
+
+
+def station(i: int) -> str:
+    return "".join(chr(65 + (i // 26**p) % 26) for p in (2, 1, 0))
+
+
+def synthetic_rows(lines: int, stops: int, headway: int, hours: int):
+    """
+    Horizontal and vertical lines over a lines x stops grid, each served every
+    headway minutes in both directions, every ride from each stop to each later stop.
+    """
+    rows = []
+    for line in range(lines):
+        for axis in (0, 1):
+            for direction in (1, -1):
+                sequence = [
+                    (line * stops + i) if axis == 0 else (i * stops + line)
+                    for i in range(stops)
+                ][::direction]
+                for start in range(0, hours * 60, headway):
+                    service = f"L{line}A{axis}D{direction}T{start}"
+                    for i, origin in enumerate(sequence):
+                        for j in range(i + 1, len(sequence)):
+                            rows.append(
+                                (
+                                    start + 3 * i,
+                                    start + 3 * j - 1,
+                                    station(origin),
+                                    station(sequence[j]),
+                                    service,
+                                )
+                            )
+    rows.sort()
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--workers", default=f"1,2,{os.cpu_count() or 1}")
+    parser.add_argument("--grid", type=int, default=12)
+    args = parser.parse_args(argv)
+
+    rows = synthetic_rows(args.grid, args.grid, headway=15, hours=6)
+    rng = random.Random(0)
+    stations = args.grid * args.grid
+    queries = [
+        JourneyQuery(
+            station(rng.randrange(stations)),
+            station(rng.randrange(stations)),
+            rng.randrange(0, 180),
+        )
+        for _ in range(args.queries)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.snapshot")
+        write_snapshot(path, rows, 0, 6 * 60)
+        print(f"{len(rows)} connections, {stations} stations, {len(queries)} queries")
+        baseline = None
+        for workers in sorted({int(w) for w in args.workers.split(",")}):
+            with RoutingExecutor(path, workers=workers) as executor:
+                executor.map(queries[: workers * executor.chunk_size])  # warm up
+                started = time.perf_counter()
+                executor.map(queries)
+                elapsed = time.perf_counter() - started
+            rate = len(queries) / elapsed
+            baseline = baseline or rate
+            print(
+                f"{workers:3d} workers: {rate:8.0f} queries/s "
+                f"({rate / baseline:.2f}x)"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
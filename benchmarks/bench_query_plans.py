@@ -0,0 +1,107 @@
+"""
+Query plans and latency of the data access queries on a realistically sized
+database.
+Seeds SQLite (and PostgreSQL with --postgres URL, a scratch database whose
+tables are dropped and recreated) with synthetic connections, merges a part of
+them into service runs, gathers planner statistics and runs the query plan
+checks (see app.uk_train_schedule.query_plans). Prints each query's median
+latency and indexes; exits 1 if a plan reads a table in full or misses its
+index, or, with --baseline, if a query got more than --tolerance times slower
+than the recorded latencies. --save records this run's latencies.
+Usage: python benchmarks/bench_query_plans.py [--rows N] [--service-rows N]
+       [--postgres URL] [--baseline FILE] [--save FILE] [--tolerance X]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.uk_train_schedule import crud, service_runs  # noqa: E402
+from app.uk_train_schedule.identifiers import services, stations  # noqa: E402
+from app.uk_train_schedule.models import Base  # noqa: E402
+from app.uk_train_schedule.query_plans import check_query_plans  # noqa: E402
+from bench_cache_export import synthetic_rows  # noqa: E402
+
+
+def seed(url: str, rows, service_rows: int):
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    stations.clear()
+    services.clear()
+    started = time.perf_counter()
+    crud.bulk_insert_timetable_entries(db, rows, batch_size=5000)
+    db.commit()
+    service_runs.upsert_service_runs(db, rows[:service_rows])
+    db.execute(text("ANALYZE"))
+    db.commit()
+    print(f"seeded in {time.perf_counter() - started:.1f}s")
+    return db
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--service-rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--postgres", help="PostgreSQL URL to check as well")
+    parser.add_argument("--baseline", help="JSON latencies from an earlier --save")
+    parser.add_argument("--save", help="Write this run's latencies as JSON")
+    parser.add_argument("--tolerance", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    rows = synthetic_rows(args.rows)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    latencies = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [("sqlite", f"sqlite:///{os.path.join(tmp, 'plans.db')}")]
+        if args.postgres:
+            backends.append(("postgresql", args.postgres))
+        for dialect, url in backends:
+            print(f"{dialect}: {len(rows)} connections")
+            db = seed(url, rows, args.service_rows)
+            try:
+                reports = check_query_plans(db, repeat=args.repeat)
+            finally:
+                db.close()
+            for report in reports:
+                key = f"{dialect}:{report.name}"
+                latencies[key] = report.median_ms
+                previous = baseline.get(key)
+                slower = (
+                    previous is not None
+                    and report.median_ms > previous * args.tolerance
+                )
+                failed = failed or slower or not report.ok
+                print(
+                    f"  {'ok  ' if report.ok and not slower else 'FAIL'} "
+                    f"{report.name:42} {report.median_ms:9.3f} ms"
+                    + (f" (was {previous:.3f})" if previous is not None else "")
+                    + f"  {', '.join(sorted(report.indexes)) or '-'}"
+                )
+                if not report.ok:
+                    for line in report.plan:
+                        print(f"       | {line}")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(latencies, file, indent=2, sort_keys=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
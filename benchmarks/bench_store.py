@@ -0,0 +1,143 @@
+"""
+Timetable store latency per backend.
+Upserts synthetic fetches (one station's departures and calling points per
+upsert), then times route range lookups and departure board pages. SQLite, the
+"services" store (on SQLite) and the in-memory store always run; PostgreSQL runs
+when --postgres URL is given (point it at a scratch database; tables are created
+if missing).
+Usage: python benchmarks/bench_store.py [--fetches N] [--lookups N] [--postgres URL]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.uk_train_schedule.identifiers import services, stations  # noqa: E402
+from app.uk_train_schedule.models import Base  # noqa: E402
+from app.uk_train_schedule.store import (  # noqa: E402
+    MemoryTimetableStore,
+    PostgresTimetableStore,
+    ServiceRunTimetableStore,
+    SqliteTimetableStore,
+    StoredConnection,
+)
+
+
+def station(i: int) -> str:
+    return "".join(chr(65 + (i // 26**p) % 26) for p in (2, 1, 0))
+
+
+def synthetic_fetches(fetches: int, stations_count: int, per_fetch: int, seed=0):
+    """
+    Departure lists as a station_timetables fetch would return them: per_fetch
+    services from one origin, each calling at four later stations.
+    """
+    rng = random.Random(seed)
+    result = []
+    for fetch in range(fetches):
+        origin = rng.randrange(stations_count)
+        rows = []
+        for i in range(per_fetch):
+            departure = fetch * 60 + i
+            service = f"F{fetch}S{i}"
+            for stop in range(1, 5):
+                rows.append(
+                    StoredConnection(
+                        departure,
+                        departure + 7 * stop,
+                        station(origin),
+                        station((origin + stop) % stations_count),
+                        service,
+                    )
+                )
+        result.append((station(origin), rows))
+    return result
+
+
+def run(name, store, db, fetches, lookups, stations_count):
+    started = time.perf_counter()
+    for _, rows in fetches:
+        store.upsert(db, rows)
+    upsert_ms = (time.perf_counter() - started) * 1000 / len(fetches)
+
+    rng = random.Random(1)
+    horizon = len(fetches) * 60
+    started = time.perf_counter()
+    for _ in range(lookups):
+        origin = rng.randrange(stations_count)
+        start = rng.randrange(horizon)
+        store.connections(
+            db,
+            station(origin),
+            station((origin + 1) % stations_count),
+            start,
+            start + 60,
+        )
+    lookup_us = (time.perf_counter() - started) * 1e6 / lookups
+
+    started = time.perf_counter()
+    for _ in range(lookups):
+        origin, _ = fetches[rng.randrange(len(fetches))]
+        store.departures(db, origin, rng.randrange(horizon), None, 20)
+    board_us = (time.perf_counter() - started) * 1e6 / lookups
+    print(
+        f"{name:10s} upsert {upsert_ms:8.2f} ms/fetch   "
+        f"route {lookup_us:8.1f} us   board {board_us:8.1f} us"
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fetches", type=int, default=200)
+    parser.add_argument("--per-fetch", type=int, default=100)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--stations", type=int, default=100)
+    parser.add_argument("--postgres", help="PostgreSQL URL to benchmark as well")
+    args = parser.parse_args(argv)
+
+    fetches = synthetic_fetches(args.fetches, args.stations, args.per_fetch)
+    total = sum(len(rows) for _, rows in fetches)
+    print(f"{len(fetches)} fetches, {total} connections, {args.lookups} lookups")
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [
+            (
+                "sqlite",
+                SqliteTimetableStore(),
+                f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            ),
+            (
+                "services",
+                ServiceRunTimetableStore(),
+                f"sqlite:///{os.path.join(tmp, 'services.db')}",
+            ),
+            ("memory", MemoryTimetableStore(), None),
+        ]
+        if args.postgres:
+            backends.append(("postgresql", PostgresTimetableStore(), args.postgres))
+        for name, store, url in backends:
+            stations.clear()
+            services.clear()
+            db = None
+            if url:
+                engine = create_engine(url)
+                Base.metadata.create_all(engine)
+                db = sessionmaker(bind=engine)()
+            try:
+                run(name, store, db, fetches, args.lookups, args.stations)
+            finally:
+                if db is not None:
+                    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Requests per second through the journey request validation and response
+serialisation layers.
+Compares the previous Python field validators (re.fullmatch per station code and
+a start_time parsed to check it, then again in the controller) against the
+constrained-type JourneyRequest, and json, orjson (if installed) and pydantic's
+own JSON output for JourneyResponse.
+Usage: python benchmarks/bench_validation.py [--iterations N]
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from pydantic import BaseModel, Field, field_validator  # noqa: E402
+
+from app.responses import FastJSONResponse, orjson  # noqa: E402
+from app.uk_train_schedule.schema import (  # noqa: E402
+    JourneyRequest,
+    JourneyResponse,
+)
+
+
+class PreviousJourneyRequest(BaseModel):
+    """JourneyRequest as it was validated before constrained types."""
+
+    station_codes: List[str] = Field(...)
+    start_time: str = Field(default_factory=lambda: datetime.now().isoformat())
+    max_wait: int = Field(...)
+
+    @field_validator("station_codes")
+    def validate_station_codes(v):
+        if not v or len(v) < 2:
+            raise ValueError("At least two station codes are required.")
+        for code in v:
+            if not re.fullmatch(r"[A-Z]{3}", code):
+                raise ValueError(f"Invalid station code: {code}.")
+        return v
+
+    @field_validator("start_time")
+    def validate_start_time(v):
+        try:
+            datetime.fromisoformat(v)
+        except Exception:
+            raise ValueError("start_time must be a valid ISO 8601 datetime string.")
+        return v
+
+    @field_validator("max_wait")
+    def validate_max_wait(v):
+        if v <= 0 or v > 600:
+            raise ValueError("max_wait must be between 1 and 600 minutes.")
+        return v
+
+
+def rate(label: str, function, iterations: int) -> float:
+    function()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    per_second = iterations / (time.perf_counter() - started)
+    print(f"{label:42s} {per_second:12,.0f} /s")
+    return per_second
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args(argv)
+    n = args.iterations
+
+    body = json.dumps(
+        {
+            "station_codes": ["LBG", "SAJ", "NWX", "BXY", "DFD", "GNW"],
+            "start_time": "2025-06-16T10:00:00+01:00",
+            "max_wait": 30,
+        }
+    ).encode()
+
+    def previous():
+        req = PreviousJourneyRequest.model_validate_json(body)
+        datetime.fromisoformat(req.start_time)  # parsed again by the controller
+
+    print("Request validation (JSON body -> model, start time parsed)")
+    before = rate("field validators", previous, n)
+    after = rate(
+        "constrained types", lambda: JourneyRequest.model_validate_json(body), n
+    )
+    print(f"{'speed-up':42s} {after / before:12.2f}x")
+
+    response = JourneyResponse(arrival_time="2025-06-16T11:05:00+01:00")
+    content = response.model_dump()
+    print("Response serialisation (JourneyResponse -> bytes)")
+    rate(
+        "json.dumps",
+        lambda: json.dumps(content, separators=(",", ":")).encode(),
+        n,
+    )
+    if orjson is not None:
+        rate("FastJSONResponse (orjson)", lambda: FastJSONResponse(content).body, n)
+    rate("pydantic model_dump_json", response.model_dump_json, n)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Replay a captured request log against the app.
+Requests from a log written with request_log_path set are sent in arrival
+order, paced like the original traffic (scaled by --speed; 0 sends as fast as
+--concurrency allows). By default the app runs in-process with upstream_mode
+"replay" over --archive, on a fresh SQLite database, so no network is needed
+and a run reproduces the recorded upstream data exactly; --url targets a running
+server instead. Reports throughput, latency percentiles, status counts and how
+many statuses differ from the log.
+Usage: python benchmarks/replay_load.py requests.log [--archive DIR]
+       [--concurrency N] [--speed S] [--url http://host:port]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def replay(client, entries, concurrency: int, speed: float):
+    """Send entries through client; returns ([(entry, status, ms)], seconds)."""
+    results = []
+    lock = threading.Lock()
+    first = entries[0]["time"] if entries else 0.0
+    started = time.perf_counter()
+
+    def send(entry):
+        if speed > 0:
+            delay = (entry["time"] - first) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        sent = time.perf_counter()
+        response = client.request(
+            entry["method"],
+            entry["path"] + (f"?{entry['query']}" if entry["query"] else ""),
+            content=entry["body"].encode() or None,
+            headers=entry["headers"],
+        )
+        elapsed = (time.perf_counter() - sent) * 1000
+        with lock:
+            results.append((entry, response.status_code, elapsed))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, entries))
+    return results, time.perf_counter() - started
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("log", help="Request log (request_log_path)")
+    parser.add_argument("--archive", default="upstream_archive")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--url", help="Replay against a running server")
+    args = parser.parse_args(argv)
+
+    if not args.url:
+        # Before the app (and its settings) are imported
+        os.environ["upstream_mode"] = "replay"
+        os.environ["upstream_archive_path"] = args.archive
+        os.environ["request_log_path"] = ""
+        os.environ.setdefault(
+            "db_url", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'replay.db')}"
+        )
+    from app.request_log import read_request_log
+
+    entries = read_request_log(args.log)
+    if args.url:
+        import httpx
+
+        with httpx.Client(base_url=args.url, timeout=60) as client:
+            results, elapsed = replay(client, entries, args.concurrency, args.speed)
+    else:
+        from fastapi.testclient import TestClient
+
+        from app.router import create_app
+
+        with TestClient(create_app()) as client:
+            results, elapsed = replay(client, entries, args.concurrency, args.speed)
+
+    latencies = [ms for _, _, ms in results]
+    statuses = Counter(status for _, status, _ in results)
+    changed = sum(1 for entry, status, _ in results if status != entry["status"])
+    print(
+        f"{len(results)} requests in {elapsed:.2f}s "
+        f"({len(results) / max(elapsed, 1e-9):.1f} req/s)"
+    )
+    if latencies:
+        print(
+            f"latency ms: mean {statistics.fmean(latencies):.1f}  "
+            f"p50 {percentile(latencies, 0.5):.1f}  "
+            f"p95 {percentile(latencies, 0.95):.1f}  "
+            f"p99 {percentile(latencies, 0.99):.1f}"
+        )
+    print("statuses: " + ", ".join(f"{k}: {v}" for k, v in sorted(statuses.items())))
+    print(f"{changed} responses with a different status than recorded")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
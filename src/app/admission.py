@@ -0,0 +1,265 @@
+"""
+Admission control for expensive endpoints.
+At most settings.admission_max_concurrent requests per worker are served at
+once; the rest wait in a bounded priority queue (settings.admission_queue_size)
+for up to settings.admission_max_wait_seconds, or their deadline if sooner.
+Requests that cannot be queued, or wait too long, are rejected straight away
+with 503 and a Retry-After estimated from recent service times, so overload
+produces quick rejections instead of every request timing out on the thread
+pool, upstream and the database.
+Lower Priority values are admitted first. When the queue is full, a request of
+a better class than the worst one waiting takes its place and the displaced
+request is rejected.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from enum import IntEnum
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from fastapi import HTTPException, Request, status
+
+from app import deadline
+from app.settings import settings
+
+
+class Priority(IntEnum):
+    """Admission classes, best first."""
+
+    CACHED = 0  # expected to be answered without upstream fetches
+    UNCACHED = 1  # may fetch from upstream
+
+
+class Overloaded(HTTPException):
+    """503 with a Retry-After hint, raised when a request is not admitted."""
+
+    def __init__(self, retry_after: int, detail: str = "Server overloaded"):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class AdmissionStats(NamedTuple):
+    """Counters of one worker's admission controller."""
+
+    in_flight: int
+    queued: int
+    admitted: int
+    rejected: int
+    shed: int
+    timed_out: int
+    service_ms: float
+
+
+# Waiter states; changed only under the controller's lock
+_WAITING, _GRANTED, _SHED, _ABANDONED = range(4)
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "state")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.future: asyncio.Future = loop.create_future()
+        self.state = _WAITING
+
+    def wake(self) -> None:
+        # Waiters may belong to another thread's event loop
+        self.loop.call_soon_threadsafe(self._set)
+
+    def _set(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded priority wait queue. acquire() is awaited on
+    the event loop, so waiting requests do not hold thread pool threads.
+    """
+
+    # Weight of the latest request in the moving average of service time
+    SERVICE_TIME_ALPHA = 0.2
+
+    def __init__(self, max_concurrent: int, queue_size: int, max_wait: float):
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        # (priority, sequence, waiter); removed waiters stay until popped
+        self._heap: List[Tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._service_seconds = 0.0
+        self._counters: Dict[str, int] = {
+            "admitted": 0,
+            "rejected": 0,
+            "shed": 0,
+            "timed_out": 0,
+        }
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free for a new request."""
+        with self._lock:
+            return self._retry_after()
+
+    def _retry_after(self) -> int:
+        waves = (self._queued + 1) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(self._service_seconds * waves))
+
+    def _reject(self, counter: str) -> Overloaded:
+        self._counters[counter] += 1
+        return Overloaded(self._retry_after())
+
+    def _worst_waiting(self) -> Optional[Tuple[int, int, _Waiter]]:
+        waiting = [entry for entry in self._heap if entry[2].state == _WAITING]
+        return max(waiting, key=lambda entry: entry[:2], default=None)
+
+    async def acquire(self, priority: Priority, timeout: Optional[float] = None):
+        """
+        Wait for a slot for up to timeout seconds (default max_wait).
+        Raises:
+            Overloaded: If the queue is full, the wait times out, or a request of
+                a better class displaced this one from the queue.
+        """
+        with self._lock:
+            if self._in_flight < self.max_concurrent and not self._queued:
+                self._in_flight += 1
+                self._counters["admitted"] += 1
+                return
+            if self._queued >= self.queue_size:
+                worst = self._worst_waiting()
+                if worst is None or worst[0] <= priority:
+                    raise self._reject("rejected")
+                worst[2].state = _SHED
+                self._queued -= 1
+                self._counters["shed"] += 1
+                worst[2].wake()
+            waiter = _Waiter(asyncio.get_running_loop())
+            heapq.heappush(self._heap, (priority, next(self._sequence), waiter))
+            self._queued += 1
+        wait = self.max_wait if timeout is None else min(timeout, self.max_wait)
+        try:
+            await asyncio.wait_for(waiter.future, max(wait, 0))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                state = waiter.state
+                if state == _WAITING:
+                    waiter.state = _ABANDONED
+                    self._queued -= 1
+            if state == _GRANTED:
+                # Granted as the wait was cancelled; pass the slot on
+                self.release()
+            raise
+        with self._lock:
+            if waiter.state == _GRANTED:
+                return
+            if waiter.state == _WAITING:
+                waiter.state = _ABANDONED
+                self._queued -= 1
+                raise self._reject("timed_out")
+            raise Overloaded(self._retry_after())
+
+    def release(self, service_seconds: Optional[float] = None) -> None:
+        """Free a slot, handing it to the best waiting request if there is one."""
+        with self._lock:
+            if service_seconds is not None:
+                self._service_seconds += self.SERVICE_TIME_ALPHA * (
+                    service_seconds - self._service_seconds
+                )
+            while self._heap:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.state == _WAITING:
+                    waiter.state = _GRANTED
+                    self._queued -= 1
+                    self._counters["admitted"] += 1
+                    waiter.wake()
+                    return
+            self._in_flight -= 1
+
+    def stats(self) -> AdmissionStats:
+        with self._lock:
+            return AdmissionStats(
+                in_flight=self._in_flight,
+                queued=self._queued,
+                service_ms=round(self._service_seconds * 1000, 3),
+                **self._counters,
+            )
+
+
+_admission: Optional[AdmissionController] = None
+_admission_lock = threading.Lock()
+
+
+def get_admission() -> Optional[AdmissionController]:
+    """
+    Return the process-wide admission controller, or None when admission
+    control is disabled (settings.admission_max_concurrent <= 0).
+    """
+    global _admission
+    if settings.admission_max_concurrent <= 0:
+        return None
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                _admission = AdmissionController(
+                    settings.admission_max_concurrent,
+                    settings.admission_queue_size,
+                    settings.admission_max_wait_seconds,
+                )
+    return _admission
+
+
+def _reset_after_fork() -> None:
+    # Each worker process limits its own concurrency
+    global _admission
+    _admission = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+Classifier = Callable[[Request], Awaitable[Priority]]
+
+
+def admission_dependency(classify: Classifier):
+    """
+    Build a dependency that admits a request in the class chosen by classify
+    and holds its slot until the response has been produced.
+    """
+
+    async def admit(request: Request) -> AsyncIterator[None]:
+        controller = get_admission()
+        if controller is None:
+            yield
+            return
+        priority = await classify(request)
+        request_deadline = deadline.current()
+        remaining = request_deadline.remaining() if request_deadline else None
+        await controller.acquire(priority, remaining)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            controller.release(time.monotonic() - started)
+
+    return admit
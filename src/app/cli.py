@@ -0,0 +1,315 @@
+"""
+Command-line maintenance tasks for the UK Train Timetable application.
+Usage: PYTHONPATH=src python -m app.cli <command> [options]
+"""
+
+import argparse
+import logging
+import sys
+from datetime import date, datetime
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _migrate(args: argparse.Namespace) -> int:
+    from app.uk_train_schedule.models import create_all_tables
+
+    create_all_tables(reset=args.reset)
+    print(f"Database schema {'recreated' if args.reset else 'up to date'}")
+    return 0
+
+
+def _snapshot(args: argparse.Namespace) -> int:
+    from app.uk_train_schedule.snapshot import day_window, export_snapshot, today
+    from database.session import create_session
+
+    day = date.fromisoformat(args.date) if args.date else today()
+    start_minute, end_minute = day_window(day)
+    with create_session() as db:
+        count = export_snapshot(db, args.output, start_minute, end_minute)
+    print(f"Exported {count} connections for {day} to {args.output}")
+    return 0
+
+
+def _build_graph(args: argparse.Namespace) -> int:
+    from app.uk_train_schedule.graph import build_graph
+    from database.session import create_session
+
+    with create_session() as db:
+        station_count, edge_count = build_graph(db, args.output)
+    print(
+        f"Built transfer graph with {station_count} stations and {edge_count} edges "
+        f"at {args.output}"
+    )
+    return 0
+
+
+def _precompute_itineraries(args: argparse.Namespace) -> int:
+    import csv
+    import json
+
+    from app.uk_train_schedule.executor import JourneyQuery, RoutingExecutor
+    from app.uk_train_schedule.identifiers import stations
+    from app.uk_train_schedule.interchange import interchange_times
+    from app.uk_train_schedule.timeconv import (
+        LONDON,
+        from_epoch_minute,
+        localize,
+        to_epoch_minute,
+    )
+    from database.session import create_session
+
+    start = localize(datetime.fromisoformat(args.start)) if args.start else None
+    queries = []
+    with open(args.pairs, newline="") as fh:
+        for row in csv.reader(fh):
+            if not row or row[0].startswith("#"):
+                continue
+            origin, destination, *rest = (value.strip() for value in row)
+            query_start = localize(datetime.fromisoformat(rest[0])) if rest else start
+            if query_start is None:
+                print(f"No start time for {origin}->{destination}", file=sys.stderr)
+                return 2
+            queries.append(
+                JourneyQuery(
+                    origin, destination, to_epoch_minute(query_start), args.max_changes
+                )
+            )
+
+    with create_session() as db:
+        executor = RoutingExecutor(
+            args.snapshot,
+            args.workers,
+            args.chunk_size,
+            lambda code: interchange_times.minutes(
+                db, stations.key(db, code, create=False)
+            ),
+        )
+    with executor:
+        results = executor.map(queries)
+
+    def render(minute: int) -> str:
+        return from_epoch_minute(minute, LONDON).isoformat()
+
+    with open(args.output, "w") as out:
+        for query, options in zip(queries, results):
+            record = {
+                "origin": query.origin,
+                "destination": query.destination,
+                "start_time": render(query.start_minute),
+                "options": [
+                    {
+                        "arrival_time": render(option.arrival_minute),
+                        "changes": option.changes,
+                        "legs": [
+                            {
+                                "service_id": leg.service,
+                                "station_from": leg.station_from,
+                                "station_to": leg.station_to,
+                                "departure_time": render(leg.departure_minute),
+                                "arrival_time": render(leg.arrival_minute),
+                            }
+                            for leg in option.legs
+                        ],
+                    }
+                    for option in options
+                ],
+            }
+            out.write(json.dumps(record) + "\n")
+    print(f"Wrote {len(queries)} itineraries to {args.output}")
+    return 0
+
+
+def _interchange(args: argparse.Namespace) -> int:
+    from app.uk_train_schedule.interchange import interchange_times
+    from database.session import create_session
+
+    with create_session() as db:
+        interchange_times.set(db, args.station, args.minutes)
+    print(f"Minimum connection time at {args.station} set to {args.minutes} minutes")
+    return 0
+
+
+def _evict(args: argparse.Namespace) -> int:
+    from app.uk_train_schedule.snapshot import day_window, today
+    from app.uk_train_schedule.store import get_store
+    from app.uk_train_schedule.timeconv import to_epoch_minute
+    from database.session import create_session
+
+    if args.before:
+        before_minute = to_epoch_minute(datetime.fromisoformat(args.before))
+    else:
+        before_minute = day_window(today())[0]
+    with create_session() as db:
+        count = get_store().evict(db, before_minute)
+    print(f"Evicted {count} connections departing before minute {before_minute}")
+    return 0
+
+
+def _export_cache(args: argparse.Namespace) -> int:
+    from app.uk_train_schedule.cache_export import export_cache
+    from app.uk_train_schedule.timeconv import to_epoch_minute
+    from database.session import create_session
+
+    start_minute = (
+        to_epoch_minute(datetime.fromisoformat(args.start)) if args.start else None
+    )
+    end_minute = to_epoch_minute(datetime.fromisoformat(args.end)) if args.end else None
+    with create_session() as db:
+        try:
+            result = export_cache(db, args.output, start_minute, end_minute)
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            return 2
+    print(
+        f"Exported {result.entries} connections, {result.coverage} coverage windows "
+        f"and {result.rates} departure rates to {args.output}"
+    )
+    return 0
+
+
+def _import_cache(args: argparse.Namespace) -> int:
+    from app.uk_train_schedule.cache_export import import_cache
+    from database.session import create_session
+
+    with create_session() as db:
+        try:
+            result = import_cache(db, args.input)
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            return 2
+    print(
+        f"Imported {result.entries} connections, {result.coverage} coverage windows "
+        f"and {result.rates} departure rates from {args.input}"
+    )
+    return 0
+
+
+def _check_query_plans(args: argparse.Namespace) -> int:
+    from app.uk_train_schedule.query_plans import check_query_plans
+    from database.session import create_session
+
+    with create_session() as db:
+        reports = check_query_plans(db, repeat=args.repeat)
+    for report in reports:
+        print(
+            f"{'ok  ' if report.ok else 'FAIL'} {report.name:42} "
+            f"{report.median_ms:9.3f} ms  {', '.join(sorted(report.indexes)) or '-'}"
+        )
+        if report.missing:
+            print(f"     missing index: {', '.join(sorted(report.missing))}")
+        if report.full_scans:
+            print(f"     full scan of: {', '.join(sorted(report.full_scans))}")
+        if args.verbose or not report.ok:
+            for line in report.plan:
+                print(f"     | {line}")
+    return 0 if all(report.ok for report in reports) else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli", description="UK Train Timetable maintenance tasks"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="Create database tables")
+    migrate.add_argument(
+        "--reset",
+        action="store_true",
+        help="Drop and recreate all tables (discards the timetable cache)",
+    )
+    migrate.set_defaults(func=_migrate)
+
+    snapshot = commands.add_parser(
+        "snapshot", help="Export a day's connections to a memory-mappable snapshot"
+    )
+    snapshot.add_argument("--date", help="Service date (YYYY-MM-DD), default today")
+    snapshot.add_argument(
+        "--output", default=settings.snapshot_path, help="Snapshot file path"
+    )
+    snapshot.set_defaults(func=_snapshot)
+
+    graph = commands.add_parser(
+        "build-graph",
+        help="Build the station transfer graph and lower-bound tables (run nightly)",
+    )
+    graph.add_argument(
+        "--output", default=settings.graph_path, help="Transfer graph file path"
+    )
+    graph.set_defaults(func=_build_graph)
+
+    precompute = commands.add_parser(
+        "precompute-itineraries",
+        help="Route a batch of station pairs over the snapshot on all cores",
+    )
+    precompute.add_argument(
+        "pairs", help="CSV of origin,destination[,start_time ISO 8601] rows"
+    )
+    precompute.add_argument("--output", required=True, help="JSON Lines output file")
+    precompute.add_argument(
+        "--start", help="Start time (ISO 8601) for rows without one"
+    )
+    precompute.add_argument("--max-changes", type=int, default=3)
+    precompute.add_argument(
+        "--snapshot", default=settings.snapshot_path, help="Snapshot file path"
+    )
+    precompute.add_argument(
+        "--workers", type=int, default=None, help="Worker processes (default: CPUs)"
+    )
+    precompute.add_argument("--chunk-size", type=int, default=64)
+    precompute.set_defaults(func=_precompute_itineraries)
+
+    interchange = commands.add_parser(
+        "interchange", help="Set a station's minimum connection time"
+    )
+    interchange.add_argument("station", help="Station code")
+    interchange.add_argument("minutes", type=int, help="Minimum connection minutes")
+    interchange.set_defaults(func=_interchange)
+
+    evict = commands.add_parser(
+        "evict", help="Drop cached connections that departed before a time"
+    )
+    evict.add_argument(
+        "--before", help="ISO 8601 time (naive is UK local), default start of today"
+    )
+    evict.set_defaults(func=_evict)
+
+    export = commands.add_parser(
+        "export-cache",
+        help="Export the timetable cache to a compressed columnar file",
+    )
+    export.add_argument(
+        "output", help="Output file (.parquet for Parquet, requires pyarrow)"
+    )
+    export.add_argument("--from", dest="start", help="Earliest departure (ISO 8601)")
+    export.add_argument("--to", dest="end", help="Departures before (ISO 8601)")
+    export.set_defaults(func=_export_cache)
+
+    import_ = commands.add_parser(
+        "import-cache", help="Load a timetable cache export into the database"
+    )
+    import_.add_argument("input", help="File written by export-cache")
+    import_.set_defaults(func=_import_cache)
+
+    plans = commands.add_parser(
+        "check-query-plans",
+        help="Explain the data access queries and fail if one stops using its index",
+    )
+    plans.add_argument("--repeat", type=int, default=5, help="Timed runs per query")
+    plans.add_argument("--verbose", action="store_true", help="Print every plan")
+    plans.set_defaults(func=_check_query_plans)
+    return parser
+
+
+def main(argv=None) -> int:
+    from app.logs import configure_logging
+
+    configure_logging()
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
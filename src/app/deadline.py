@@ -0,0 +1,163 @@
+"""
+Per-request deadlines and cancellation.
+A Deadline is attached to the current context by the request_deadline
+dependency and checked at the points where a request waits on something
+outside the process: before each upstream fetch (whose timeout is capped by the
+remaining budget), before each database statement and between journey legs.
+Context variables are copied into FastAPI's thread pool, so code running for a
+request sees its deadline without it being passed explicitly. Work that runs
+outside a request (the write-behind writer, CLI commands) has no deadline.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+from fastapi import Header, HTTPException, Request, status
+
+from app.settings import settings
+
+# Non-standard status (as used by nginx) for requests abandoned by the client
+CLIENT_CLOSED_REQUEST = 499
+
+
+class DeadlineExceeded(HTTPException):
+    """Raised when a request runs past its deadline."""
+
+    def __init__(self, detail: str = "Request deadline exceeded"):
+        super().__init__(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=detail)
+
+
+class RequestCancelled(HTTPException):
+    """Raised when the client has gone away and the work is no longer wanted."""
+
+    def __init__(self, detail: str = "Request cancelled by the client"):
+        super().__init__(status_code=CLIENT_CLOSED_REQUEST, detail=detail)
+
+
+class Deadline:
+    """
+    A point in (monotonic) time after which a request's work should stop, and a
+    cancellation flag that any thread may set. seconds=None never expires.
+    """
+
+    def __init__(self, seconds: Optional[float]):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (may be negative), or None if there is no time limit."""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def check(self) -> None:
+        """
+        Raises:
+            RequestCancelled: If the request was cancelled.
+            DeadlineExceeded: If the deadline has passed.
+        """
+        if self.cancelled:
+            raise RequestCancelled()
+        if self.expired:
+            raise DeadlineExceeded()
+
+    def timeout(self, limit: float) -> float:
+        """
+        Timeout for a blocking call: limit, capped by the remaining budget.
+        Raises if the budget is already spent.
+        """
+        self.check()
+        remaining = self.remaining()
+        return limit if remaining is None else min(limit, remaining)
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "deadline", default=None
+)
+
+
+def current() -> Optional[Deadline]:
+    """The deadline of the request being served in this context, if any."""
+    return _current.get()
+
+
+def check() -> None:
+    """Raise if the current request is cancelled or past its deadline."""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check()
+
+
+def timeout(limit: float) -> float:
+    """limit capped by the current request's remaining budget (see Deadline.timeout)."""
+    deadline = _current.get()
+    return limit if deadline is None else deadline.timeout(limit)
+
+
+@contextmanager
+def use(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Make deadline the current one for the duration of the block."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def request_timeout(header_value: Optional[float]) -> Optional[float]:
+    """
+    The time budget for a request: the X-Request-Timeout header when given
+    (capped at settings.max_request_timeout_seconds), else
+    settings.request_timeout_seconds. A budget of 0 or less means no deadline.
+    """
+    seconds = settings.request_timeout_seconds
+    if header_value is not None:
+        seconds = min(header_value, settings.max_request_timeout_seconds)
+    return seconds if seconds > 0 else None
+
+
+async def _watch_disconnect(request: Request, deadline: Deadline) -> None:
+    while not deadline.cancelled:
+        if await request.is_disconnected():
+            deadline.cancel()
+            return
+        await asyncio.sleep(settings.disconnect_poll_seconds)
+
+
+async def request_deadline(
+    request: Request,
+    x_request_timeout: Optional[float] = Header(
+        None, gt=0, description="Time budget for this request in seconds"
+    ),
+) -> AsyncIterator[Deadline]:
+    """
+    Dependency giving the request a Deadline and making it current. It runs on
+    the event loop (not the thread pool), so the context it sets is the one the
+    endpoint and later dependencies are run in. While the request is served,
+    a watcher cancels the deadline if the client disconnects.
+    """
+    deadline = Deadline(request_timeout(x_request_timeout))
+    # Not reset on exit: each request runs in its own task and context, and the
+    # exit may run in a different context from the one the value was set in
+    _current.set(deadline)
+    watcher = asyncio.create_task(_watch_disconnect(request, deadline))
+    try:
+        yield deadline
+    finally:
+        watcher.cancel()
@@ -10,7 +10,12 @@ from datetime import datetime, timezone
 from fastapi import APIRouter
 
 from app.health.exceptions import HealthCheckException
-from app.health.schema import HealthResponse
+from app.health.schema import (
+    AdmissionResponse,
+    HealthResponse,
+    IngestResponse,
+    SnapshotResponse,
+)
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -47,3 +52,62 @@ def health_check() -> HealthResponse:
         return resp
     except Exception:
         raise HealthCheckException() from Exception
+
+
+@router.get(
+    "/ingest",
+    summary="Timetable write queue",
+    description="Returns this worker's write-behind queue counters",
+    status_code=200,
+    response_model=IngestResponse,
+    tags=["health"],
+)
+def ingest_stats() -> IngestResponse:
+    """
+    Queue depth, batches and rows written, and inline (backpressured) writes for
+    the worker process that serves the request.
+    """
+    from app.uk_train_schedule.ingest import get_ingest_queue
+
+    return IngestResponse(**get_ingest_queue().stats()._asdict())
+
+
+@router.get(
+    "/admission",
+    summary="Admission control",
+    description="Returns this worker's journey admission counters",
+    status_code=200,
+    response_model=AdmissionResponse,
+    tags=["health"],
+)
+def admission_stats() -> AdmissionResponse:
+    """
+    Requests in flight and queued, and those admitted, rejected, displaced by a
+    better class (shed) or timed out while queued, for the worker process that
+    serves the request.
+    """
+    from app.admission import get_admission
+
+    controller = get_admission()
+    if controller is None:
+        return AdmissionResponse(enabled=False)
+    return AdmissionResponse(enabled=True, **controller.stats()._asdict())
+
+
+@router.get(
+    "/snapshot",
+    summary="Timetable snapshot",
+    description="Returns this worker's snapshot generation and reload counters",
+    status_code=200,
+    response_model=SnapshotResponse,
+    tags=["health"],
+)
+def snapshot_stats() -> SnapshotResponse:
+    """
+    The snapshot generation being served (0 when there is none), its size and
+    window, how long it took to build, and the rebuilds completed and failed by
+    the worker process that serves the request.
+    """
+    from app.uk_train_schedule.snapshot_manager import get_snapshot_manager
+
+    return SnapshotResponse(**get_snapshot_manager().stats()._asdict())
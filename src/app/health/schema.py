@@ -13,3 +13,40 @@ class HealthResponse(BaseModel):
     server: str
     author: str
     env: str
+
+
+class IngestResponse(BaseModel):
+    queued_batches: int
+    max_queued_batches: int
+    submitted_batches: int
+    written_batches: int
+    written_rows: int
+    writes: int
+    failed_batches: int
+    inline_batches: int
+    last_write_ms: float
+
+
+class AdmissionResponse(BaseModel):
+    enabled: bool
+    in_flight: int = 0
+    queued: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    shed: int = 0
+    timed_out: int = 0
+    service_ms: float = 0.0
+
+
+class SnapshotResponse(BaseModel):
+    generation: int
+    connections: int
+    stations: int
+    size_bytes: int
+    start_minute: int
+    end_minute: int
+    build_seconds: float
+    builds: int
+    adopted: int
+    failures: int
+    building: bool
@@ -0,0 +1,186 @@
+"""
+Logging setup for the API and the maintenance commands.
+configure_logging routes every record through a bounded queue to a listener
+thread, so request threads never wait on formatting or on the terminal or disk:
+they only enqueue the record, and the message is built from its %-style
+arguments on the listener thread (or not at all when the record is filtered out).
+Records are written as text or, with settings.log_format = "json", as one JSON
+object per line with the call's extra fields. Repetitive info lines are sampled
+per logger (settings.log_sampling), and payloads logged through truncate() are
+capped at settings.log_payload_limit characters.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import reprlib
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from app.settings import settings
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+# Attributes every LogRecord has; anything else came from extra=
+_RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime", "suppressed"}
+
+
+class truncate:
+    """
+    A log argument rendered as at most limit characters, lazily: the repr is
+    only built if the record is emitted, and reprlib bounds the work for large
+    containers instead of formatting them in full and cutting the result.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: Optional[int] = None):
+        self.value = value
+        self.limit = settings.log_payload_limit if limit is None else limit
+
+    def __str__(self) -> str:
+        if isinstance(self.value, str):
+            text = self.value
+        else:
+            bounded = reprlib.Repr()
+            bounded.maxlevel = 4
+            bounded.maxstring = bounded.maxother = self.limit
+            bounded.maxdict = bounded.maxlist = bounded.maxtuple = 32
+            text = bounded.repr(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[: self.limit]}... [{len(text) - self.limit} more characters]"
+
+    __repr__ = __str__
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes the first of every `every` records with the same logger and message
+    template, for loggers listed in rates, at INFO and below; warnings and errors
+    always pass. An emitted record's `suppressed` attribute counts the records
+    dropped since the previous one.
+    """
+
+    def __init__(self, rates: Mapping[str, int]):
+        super().__init__()
+        self.rates = dict(rates)
+        self._counts: Dict[Tuple[str, Any], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = self.rates.get(record.name, 1)
+        if every <= 1 or record.levelno > logging.INFO:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            seen = self._counts.get(key, 0)
+            self._counts[key] = seen + 1
+        if seen % every:
+            return False
+        record.suppressed = every - 1 if seen else 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process,
+        }
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Enqueues records without formatting them and without blocking: when the
+    queue is full the record is dropped and counted. Arguments are formatted
+    later on the listener thread, so they must not be mutated after logging.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[DroppingQueueHandler] = None
+
+
+def configure_logging(level: int = logging.INFO, force: bool = False) -> None:
+    """
+    Install the queued handler on the root logger and start its listener.
+    Like logging.basicConfig, this does nothing if the root logger already has
+    handlers, unless force replaces them. Forked children restart the listener.
+    """
+    global _listener, _handler
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return
+    stop_logging()
+    log_queue: queue.Queue = queue.Queue(settings.log_queue_size)
+    output = logging.StreamHandler()
+    output.setFormatter(
+        JsonFormatter()
+        if settings.log_format == "json"
+        else logging.Formatter(TEXT_FORMAT)
+    )
+    _handler = DroppingQueueHandler(log_queue)
+    _handler.addFilter(SamplingFilter(settings.log_sampling))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(level)
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    """Records dropped because the queue was full, in this process."""
+    return _handler.dropped if _handler is not None else 0
+
+
+def _restart_after_fork() -> None:
+    global _listener
+    # The listener thread does not survive a fork; the queue may hold a
+    # half-written state from it, so start over with a fresh one
+    if _listener is not None:
+        _listener = None
+        configure_logging(logging.getLogger().level, force=True)
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+atexit.register(stop_logging)
@@ -0,0 +1,88 @@
+"""
+Capture of incoming requests for offline replay.
+When settings.request_log_path is set, RequestLogMiddleware appends one JSON line
+per HTTP request: arrival time, method, path, query string, the headers that
+change how a request is served, the body, and the status and latency it was
+served with. benchmarks/replay_load.py replays such a log against the app.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import IO, Any, Dict, List, Optional
+
+# Headers that affect the response, kept so a replay is served the same way
+LOGGED_HEADERS = frozenset({"content-type", "if-none-match", "x-request-timeout"})
+
+
+class RequestLogMiddleware:
+    """
+    ASGI middleware writing a request log line once each request completes.
+    The log file is opened on first use in each process and appended to with
+    one write per line, so forked workers can share it.
+    """
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+        self._file: Optional[IO[str]] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        chunks: List[bytes] = []
+        response: Dict[str, Any] = {"status": None}
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            await send(message)
+
+        arrived = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            self._write(
+                {
+                    "time": round(arrived, 6),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope.get("query_string", b"").decode("latin-1"),
+                    "headers": {
+                        name.decode("latin-1"): value.decode("latin-1")
+                        for name, value in scope.get("headers", [])
+                        if name.decode("latin-1").lower() in LOGGED_HEADERS
+                    },
+                    "body": b"".join(chunks).decode("utf-8", "replace"),
+                    "status": response["status"],
+                    "ms": round((time.perf_counter() - started) * 1000, 3),
+                }
+            )
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None or self._pid != os.getpid():
+                self._file = open(self.path, "a", encoding="utf-8")
+                self._pid = os.getpid()
+            self._file.write(line)
+            self._file.flush()
+
+
+def read_request_log(path: str) -> List[Dict[str, Any]]:
+    """Entries of a request log, in arrival order."""
+    with open(path, encoding="utf-8") as file:
+        entries = [json.loads(line) for line in file if line.strip()]
+    entries.sort(key=lambda entry: entry["time"])
+    return entries
@@ -0,0 +1,44 @@
+"""
+JSON response rendering.
+FastAPI releases that serialise response models straight to JSON bytes in
+pydantic-core are already faster than any response class, so the orjson class
+is only used on releases without that path (and only when orjson is installed).
+"""
+
+import inspect
+from typing import Any, Optional, Type
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson when it is installed, else the json module.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return super().render(content)
+
+
+def _has_native_serialisation() -> bool:
+    from fastapi import routing
+
+    return "dump_json" in inspect.signature(routing.serialize_response).parameters
+
+
+def default_response_class() -> Optional[Type[Response]]:
+    """
+    FastJSONResponse when orjson is available and FastAPI does not serialise
+    response models natively; otherwise None, leaving FastAPI's default (setting
+    any class explicitly would turn the native path off).
+    """
+    if orjson is not None and not _has_native_serialisation():
+        return FastJSONResponse
+    return None
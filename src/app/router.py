@@ -1,22 +1,84 @@
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-from app.health.router import router as health_router
-from app.uk_train_schedule.router import router as journey_router
+from app.settings import settings
 
 logger = logging.getLogger(__name__)
-app = FastAPI(title="UK Train Timetable API")
-logger.info("FastAPI app instance created.")
-app.include_router(health_router)
-logger.info("Health router included.")
-app.include_router(journey_router)
-logger.info("Journey router included.")
-
-
-@app.get("/", include_in_schema=False)
-def root():
-    return {
-        "status": "ok",
-        "message": "UK Train Timetable API. See /health for health check.",
-    }
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application startup and shutdown. Importing the app has no side effects;
+    logging and the database engine are set up here, and tables are only
+    created automatically in DEV (run `python -m app.cli migrate` elsewhere).
+    """
+    from app.logs import configure_logging
+    from database.session import dispose_engine, get_engine
+
+    configure_logging()
+    get_engine()
+    if settings.env == "DEV":
+        from app.uk_train_schedule.models import create_all_tables
+
+        create_all_tables()
+        logger.info("Database tables ensured (DEV).")
+    yield
+    from app.uk_train_schedule.ingest import get_ingest_queue
+
+    if not get_ingest_queue().stop(settings.ingest_flush_timeout_seconds):
+        logger.warning("Timetable writes still queued at shutdown were dropped.")
+    dispose_engine()
+
+
+def create_app() -> FastAPI:
+    """
+    Build the FastAPI application. Routers are imported here rather than at
+    module import so that importing app.router stays cheap.
+    """
+    from app.health.router import router as health_router
+    from app.responses import default_response_class
+    from app.uk_train_schedule.router import router as journey_router
+    from app.uk_train_schedule.router import station_router
+
+    options = {}
+    response_class = default_response_class()
+    if response_class is not None:
+        options["default_response_class"] = response_class
+    app = FastAPI(title="UK Train Timetable API", lifespan=lifespan, **options)
+    logger.info("FastAPI app instance created.")
+    if settings.request_log_path:
+        from app.request_log import RequestLogMiddleware
+
+        app.add_middleware(RequestLogMiddleware, path=settings.request_log_path)
+        logger.info("Logging requests to %s.", settings.request_log_path)
+    app.include_router(health_router)
+    logger.info("Health router included.")
+    app.include_router(journey_router)
+    logger.info("Journey router included.")
+    app.include_router(station_router)
+    logger.info("Station router included.")
+
+    @app.get("/", include_in_schema=False)
+    def root():
+        return {
+            "status": "ok",
+            "message": "UK Train Timetable API. See /health for health check.",
+        }
+
+    return app
+
+
+_app: FastAPI | None = None
+
+
+def __getattr__(name: str):
+    # `from app.router import app` builds the application on first access
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,11 +1,6 @@
-import logging
+from typing import Dict
 
 from pydantic_settings import BaseSettings
-from sqlalchemy import create_engine
-
-from app.uk_train_schedule.models import Base
-
-logger = logging.getLogger(__name__)
 
 
 class Settings(BaseSettings):
@@ -13,6 +8,44 @@ class Settings(BaseSettings):
     app_key: str = "your_api_key_here"
     db_url: str = "sqlite:///train_schedule.db"
     env: str = "DEV"
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 1
+    cache_event_poll_seconds: float = 1.0
+    sqlite_busy_timeout_ms: int = 5000
+    snapshot_path: str = "timetable.snapshot"
+    graph_path: str = "transfer.graph"
+    # Fetched routes written within this many seconds share one snapshot rebuild
+    snapshot_reload_delay_seconds: float = 30.0
+    board_horizon_minutes: int = 60
+    upstream_window_minutes: int = 120
+    fetch_target_departures: int = 100
+    fetch_min_horizon_minutes: int = 30
+    fetch_max_horizon_minutes: int = 1440
+    journey_cache_size: int = 10000
+    journey_cache_max_age: int = 60
+    min_connection_minutes: int = 2
+    options_horizon_minutes: int = 360
+    timetable_store: str = "sql"
+    write_behind: bool = True
+    ingest_queue_size: int = 256
+    ingest_max_batch_rows: int = 5000
+    ingest_put_timeout_seconds: float = 5.0
+    ingest_flush_timeout_seconds: float = 30.0
+    request_timeout_seconds: float = 30.0
+    max_request_timeout_seconds: float = 120.0
+    disconnect_poll_seconds: float = 0.25
+    admission_max_concurrent: int = 16
+    admission_queue_size: int = 64
+    admission_max_wait_seconds: float = 5.0
+    upstream_mode: str = "live"
+    upstream_archive_path: str = "upstream_archive"
+    request_log_path: str = ""
+    log_format: str = "text"
+    log_queue_size: int = 10000
+    log_payload_limit: int = 2048
+    # Logger name -> keep one in N info records per message
+    log_sampling: Dict[str, int] = {"app.uk_train_schedule.controller.cache": 100}
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8",
@@ -21,9 +54,3 @@ class Settings(BaseSettings):
 
 
 settings = Settings()
-
-try:
-    engine = create_engine(settings.db_url)
-    Base.metadata.create_all(engine)
-except Exception as e:
-    logger.error(f"Failed to create tables on startup: {e}")
@@ -0,0 +1,111 @@
+"""
+In-process cache of journey planning results.
+Results are keyed on the normalised request and dropped whenever timetable data
+for one of the journey's legs is written (locally or by another worker).
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.settings import settings
+from app.uk_train_schedule import events
+from app.uk_train_schedule.timeconv import to_epoch_minute
+
+JourneyKey = Tuple[Tuple[str, ...], int, int, int]
+
+
+class CachedJourney(NamedTuple):
+    """A cached journey result and its entity tag."""
+
+    arrival_time: str
+    etag: str
+
+
+def journey_key(
+    station_codes: List[str], start_time: datetime, max_wait: int
+) -> JourneyKey:
+    """
+    Normalised cache key: station codes, start minute, max wait and the UTC offset
+    the response is rendered in.
+    """
+    offset = int(start_time.utcoffset().total_seconds()) // 60
+    return (tuple(station_codes), to_epoch_minute(start_time), max_wait, offset)
+
+
+class JourneyResultCache:
+    """
+    Thread-safe LRU of journey results with per-route invalidation.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[JourneyKey, CachedJourney]" = OrderedDict()
+        self._by_route: Dict[str, Set[JourneyKey]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def get(self, key: JourneyKey) -> Optional[CachedJourney]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+            return cached
+
+    def put(self, key: JourneyKey, arrival_time: str, generation: int) -> CachedJourney:
+        """
+        Cache a result computed while the cache was at the given generation. If
+        route data was invalidated in the meantime the result is returned but not stored.
+        """
+        digest = hashlib.sha1(repr((key, arrival_time)).encode()).hexdigest()[:20]
+        cached = CachedJourney(arrival_time, f'"{digest}"')
+        with self._lock:
+            if generation != self.generation or self.maxsize <= 0:
+                return cached
+            self._entries[key] = cached
+            self._entries.move_to_end(key)
+            for route in self._routes(key):
+                self._by_route[route].add(key)
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                self._unindex(evicted)
+        return cached
+
+    def invalidate_route(self, route: str) -> None:
+        """Drop every cached journey with a leg on the given route key."""
+        with self._lock:
+            self.generation += 1
+            for key in self._by_route.pop(route, set()):
+                if self._entries.pop(key, None) is not None:
+                    self._unindex(key, skip=route)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._by_route.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _routes(key: JourneyKey) -> List[str]:
+        codes = key[0]
+        return [events.route_key(a, b) for a, b in zip(codes, codes[1:])]
+
+    def _unindex(self, key: JourneyKey, skip: Optional[str] = None) -> None:
+        for route in self._routes(key):
+            if route == skip:
+                continue
+            keys = self._by_route.get(route)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_route[route]
+
+
+journey_cache = JourneyResultCache(settings.journey_cache_size)
+events.subscribe(events.ROUTE_TOPIC, journey_cache.invalidate_route)
+events.subscribe(events.TIMETABLE_TOPIC, lambda key: journey_cache.clear())
@@ -0,0 +1,426 @@
+"""
+Compressed, columnar export and import of the timetable cache.
+Used to seed a new node with a warmed cache instead of copying the database.
+Two formats are written:
+- Parquet (path ending in .parquet), when pyarrow is installed: one row per
+  connection with station codes and service ids as (dictionary-encoded) string
+  columns; fetch coverage and departure rates travel in the schema metadata.
+- Otherwise a columnar file of its own: chunks of CHUNK_ROWS connections sorted
+  by departure, stored as five int32 columns (departure deltas, journey
+  durations and station/service keys), each compressed separately with zstd
+  when the zstandard package is installed, else zlib. A trailer holds the
+  key -> code dictionaries, coverage and departure rates.
+Both are read back one chunk at a time, so imports stream in bounded memory and
+write in large batches within a single transaction.
+Exports read and imports write timetable_entries directly, so both require the
+"sql" timetable store; the other stores keep their rows elsewhere.
+"""
+
+import json
+import logging
+import os
+import struct
+import zlib
+from itertools import accumulate
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.settings import settings
+from app.uk_train_schedule import events
+from app.uk_train_schedule.identifiers import services, stations
+from app.uk_train_schedule.models import (
+    DepartureRate,
+    FetchCoverage,
+    Service,
+    Station,
+    TimetableEntry,
+)
+from database.dialects import insert_ignore_tuples
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional dependency
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"UKTTCOLS"
+VERSION = 1
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+# magic, version, codec
+_HEADER = struct.Struct("<8sHH")
+# rows in the chunk, then the compressed size of each column
+_CHUNK = struct.Struct("<6I")
+# metadata offset and size, magic
+_TRAILER = struct.Struct("<QQ8s")
+PARQUET_MAGIC = b"PAR1"
+CHUNK_ROWS = 65536
+# Rows per INSERT batch on import
+IMPORT_BATCH_ROWS = 5000
+ENTRY_COLUMNS = (
+    "service_key",
+    "station_from_key",
+    "station_to_key",
+    "departure_minute",
+    "arrival_minute",
+)
+# Codes resolved per identifier lookup (bounded by SQL parameter limits)
+_KEY_BATCH = 5000
+
+# departure_minute, arrival_minute, station_from, station_to, service (refs are
+# source-database keys in the columnar format, codes in Parquet)
+Chunk = Tuple[List[int], List[int], List[Any], List[Any], List[Any]]
+
+
+class CacheTransfer(NamedTuple):
+    """Counts of what an export wrote or an import read."""
+
+    entries: int
+    coverage: int
+    rates: int
+
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("File is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _int32_bytes(values: List[int]) -> bytes:
+    return struct.pack(f"<{len(values)}i", *values)
+
+
+def _int32_values(data: bytes) -> List[int]:
+    return list(struct.unpack(f"<{len(data) // 4}i", data))
+
+
+def _require_sql_store() -> None:
+    """
+    Raises:
+        ValueError: If settings.timetable_store does not keep timetable_entries.
+    """
+    if settings.timetable_store != "sql":
+        raise ValueError(
+            "Cache export and import need timetable_store=sql; the "
+            f"{settings.timetable_store!r} store does not keep its connections in "
+            "timetable_entries"
+        )
+
+
+def _window_filter(query, column, start_minute, end_minute):
+    if start_minute is not None:
+        query = query.where(column >= start_minute)
+    if end_minute is not None:
+        query = query.where(column < end_minute)
+    return query
+
+
+def _entry_chunks(
+    db: Session, start_minute: Optional[int], end_minute: Optional[int]
+) -> Iterator[Chunk]:
+    """Connections departing in the window, by departure, CHUNK_ROWS at a time."""
+    query = _window_filter(
+        select(
+            TimetableEntry.departure_minute,
+            TimetableEntry.arrival_minute,
+            TimetableEntry.station_from_key,
+            TimetableEntry.station_to_key,
+            TimetableEntry.service_key,
+        ),
+        TimetableEntry.departure_minute,
+        start_minute,
+        end_minute,
+    ).order_by(TimetableEntry.departure_minute, TimetableEntry.id)
+    # Core rather than ORM execution: plain tuples, no per-row ORM processing
+    result = db.connection().execute(query.execution_options(yield_per=CHUNK_ROWS))
+    for rows in result.partitions():
+        yield tuple(list(column) for column in zip(*rows))
+
+
+def _metadata(
+    db: Session, start_minute: Optional[int], end_minute: Optional[int]
+) -> Dict[str, Any]:
+    """
+    Coverage and departure rates for the export. Only coverage windows inside
+    the exported window are kept, so an import never claims rows it lacks.
+    """
+    coverage = select(
+        FetchCoverage.station_from,
+        FetchCoverage.calling_at,
+        FetchCoverage.start_minute,
+        FetchCoverage.end_minute,
+    )
+    if start_minute is not None:
+        coverage = coverage.where(FetchCoverage.start_minute >= start_minute)
+    if end_minute is not None:
+        coverage = coverage.where(FetchCoverage.end_minute <= end_minute)
+    rates = select(
+        DepartureRate.station_from,
+        DepartureRate.calling_at,
+        DepartureRate.departures_per_hour,
+        DepartureRate.samples,
+    )
+    return {
+        "window": [start_minute, end_minute],
+        "coverage": [list(row) for row in db.execute(coverage)],
+        "rates": [list(row) for row in db.execute(rates)],
+    }
+
+
+def export_cache(
+    db: Session,
+    path: str,
+    start_minute: Optional[int] = None,
+    end_minute: Optional[int] = None,
+) -> CacheTransfer:
+    """
+    Export connections departing in [start_minute, end_minute) (everything by
+    default) with their coverage and departure rates. Paths ending in .parquet
+    are written as Parquet (requires pyarrow). The file is written beside the
+    target and renamed into place.
+    Raises:
+        ValueError: If the timetable store is not "sql".
+    """
+    _require_sql_store()
+    metadata = _metadata(db, start_minute, end_minute)
+    chunks = _entry_chunks(db, start_minute, end_minute)
+    tmp_path = f"{path}.tmp"
+    try:
+        if path.endswith(".parquet"):
+            entries = _write_parquet(db, tmp_path, chunks, metadata)
+        else:
+            entries = _write_columnar(db, tmp_path, chunks, metadata)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    logger.info("Exported %s timetable entries to %s", entries, path)
+    return CacheTransfer(entries, len(metadata["coverage"]), len(metadata["rates"]))
+
+
+def _write_columnar(
+    db: Session, path: str, chunks: Iterable[Chunk], metadata: Dict[str, Any]
+) -> int:
+    codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+    entries = 0
+    station_keys, service_keys = set(), set()
+    with open(path, "wb") as fh:
+        fh.write(_HEADER.pack(MAGIC, VERSION, codec))
+        for departures, arrivals, froms, tos, service_refs in chunks:
+            # Sorted by departure: deltas are small, durations smaller
+            deltas = [departures[0]] + [
+                b - a for a, b in zip(departures, departures[1:])
+            ]
+            durations = [arr - dep for dep, arr in zip(departures, arrivals)]
+            columns = [
+                _compress(codec, _int32_bytes(column))
+                for column in (deltas, durations, froms, tos, service_refs)
+            ]
+            fh.write(_CHUNK.pack(len(departures), *(len(c) for c in columns)))
+            for column in columns:
+                fh.write(column)
+            entries += len(departures)
+            station_keys.update(froms, tos)
+            service_keys.update(service_refs)
+        metadata = dict(
+            metadata,
+            entries=entries,
+            stations=_codes(db, Station, station_keys),
+            services=_codes(db, Service, service_keys),
+        )
+        encoded = _compress(codec, json.dumps(metadata).encode())
+        offset = fh.tell()
+        fh.write(encoded)
+        fh.write(_TRAILER.pack(offset, len(encoded), MAGIC))
+    return entries
+
+
+def _codes(db: Session, model, keys: set) -> Dict[str, str]:
+    """key -> code for the given dimension keys (JSON object keys are strings)."""
+    codes = {}
+    for key, code in db.execute(select(model.id, model.code)):
+        if key in keys:
+            codes[str(key)] = code
+    return codes
+
+
+def _write_parquet(
+    db: Session, path: str, chunks: Iterable[Chunk], metadata: Dict[str, Any]
+) -> int:
+    if pyarrow is None:
+        raise ValueError("Parquet export requires pyarrow")
+    stations.preload(db)
+    services.preload(db)
+    schema = pyarrow.schema(
+        [
+            ("departure_minute", pyarrow.int32()),
+            ("arrival_minute", pyarrow.int32()),
+            ("station_from", pyarrow.string()),
+            ("station_to", pyarrow.string()),
+            ("service_id", pyarrow.string()),
+        ],
+        metadata={"uk_train_schedule": json.dumps(metadata)},
+    )
+    entries = 0
+    with pyarrow.parquet.ParquetWriter(path, schema, compression="zstd") as writer:
+        for departures, arrivals, froms, tos, service_refs in chunks:
+            writer.write_batch(
+                pyarrow.record_batch(
+                    [
+                        departures,
+                        arrivals,
+                        [stations.code(db, key) for key in froms],
+                        [stations.code(db, key) for key in tos],
+                        [services.code(db, key) for key in service_refs],
+                    ],
+                    schema=schema,
+                )
+            )
+            entries += len(departures)
+    return entries
+
+
+def _read_columnar(path: str) -> Tuple[Dict[str, Any], Iterator[Chunk]]:
+    fh = open(path, "rb")
+    try:
+        magic, version, codec = _HEADER.unpack(fh.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} timetable export")
+        fh.seek(-_TRAILER.size, os.SEEK_END)
+        offset, size, _ = _TRAILER.unpack(fh.read(_TRAILER.size))
+        fh.seek(offset)
+        metadata = json.loads(_decompress(codec, fh.read(size)))
+    except BaseException:
+        fh.close()
+        raise
+
+    def chunks() -> Iterator[Chunk]:
+        with fh:
+            fh.seek(_HEADER.size)
+            while fh.tell() < offset:
+                count, *sizes = _CHUNK.unpack(fh.read(_CHUNK.size))
+                deltas, durations, froms, tos, service_refs = (
+                    _int32_values(_decompress(codec, fh.read(size))) for size in sizes
+                )
+                departures = list(accumulate(deltas))
+                arrivals = [dep + d for dep, d in zip(departures, durations)]
+                yield departures, arrivals, froms, tos, service_refs
+
+    metadata["stations"] = {int(k): v for k, v in metadata["stations"].items()}
+    metadata["services"] = {int(k): v for k, v in metadata["services"].items()}
+    return metadata, chunks()
+
+
+def _read_parquet(path: str) -> Tuple[Dict[str, Any], Iterator[Chunk]]:
+    if pyarrow is None:
+        raise ValueError("Parquet import requires pyarrow")
+    parquet = pyarrow.parquet.ParquetFile(path)
+    metadata = json.loads(parquet.schema_arrow.metadata[b"uk_train_schedule"])
+    codes = [
+        set(parquet.read(columns=[column]).column(0).unique().to_pylist())
+        for column in ("station_from", "station_to", "service_id")
+    ]
+    # References are the codes themselves
+    metadata["stations"] = {code: code for code in codes[0] | codes[1]}
+    metadata["services"] = {code: code for code in codes[2]}
+
+    def chunks() -> Iterator[Chunk]:
+        for batch in parquet.iter_batches(batch_size=CHUNK_ROWS):
+            yield tuple(column.to_pylist() for column in batch.columns)
+
+    return metadata, chunks()
+
+
+def _local_keys(db: Session, cache, refs: Dict[Any, str]) -> Dict[Any, int]:
+    """Map export references to this database's keys, creating missing codes."""
+    items = list(refs.items())
+    keys: Dict[Any, int] = {}
+    for start in range(0, len(items), _KEY_BATCH):
+        end = start + _KEY_BATCH
+        batch = items[start:end]
+        local = cache.keys(db, [code for _, code in batch])
+        keys.update((ref, local[code]) for ref, code in batch)
+    return keys
+
+
+def import_cache(db: Session, path: str) -> CacheTransfer:
+    """
+    Import an export written by export_cache (format detected from the file),
+    skipping connections already cached. Rows are inserted in batches of
+    IMPORT_BATCH_ROWS and committed once; coverage is added and departure rates
+    replaced after the rows, then every worker's journey cache is dropped.
+    Raises:
+        ValueError: If the timetable store is not "sql" or the file is not an export.
+    """
+    _require_sql_store()
+    with open(path, "rb") as fh:
+        parquet = fh.read(len(PARQUET_MAGIC)) == PARQUET_MAGIC
+    metadata, chunks = (_read_parquet if parquet else _read_columnar)(path)
+    station_keys = _local_keys(db, stations, metadata["stations"])
+    service_keys = _local_keys(db, services, metadata["services"])
+    entries = 0
+    for departures, arrivals, froms, tos, service_refs in chunks:
+        rows = [
+            (
+                service_keys[service],
+                station_keys[station_from],
+                station_keys[station_to],
+                departure,
+                arrival,
+            )
+            for departure, arrival, station_from, station_to, service in zip(
+                departures, arrivals, froms, tos, service_refs
+            )
+        ]
+        for start in range(0, len(rows), IMPORT_BATCH_ROWS):
+            end = start + IMPORT_BATCH_ROWS
+            insert_ignore_tuples(
+                db, TimetableEntry.__table__, ENTRY_COLUMNS, rows[start:end]
+            )
+        entries += len(rows)
+    if metadata["coverage"]:
+        db.execute(
+            insert(FetchCoverage),
+            [
+                dict(
+                    zip(
+                        ("station_from", "calling_at", "start_minute", "end_minute"),
+                        row,
+                    )
+                )
+                for row in metadata["coverage"]
+            ],
+        )
+    for station_from, calling_at, departures_per_hour, samples in metadata["rates"]:
+        db.merge(
+            DepartureRate(
+                station_from=station_from,
+                calling_at=calling_at,
+                departures_per_hour=departures_per_hour,
+                samples=samples,
+            )
+        )
+    db.commit()
+    if entries:
+        # One event rather than one per route: an import touches most of them
+        events.publish(db, events.TIMETABLE_TOPIC, os.path.basename(path))
+    logger.info("Imported %s timetable entries from %s", entries, path)
+    return CacheTransfer(entries, len(metadata["coverage"]), len(metadata["rates"]))
@@ -4,24 +4,53 @@ Handles fetching, caching, and planning journeys using database and external API
 """
 
 import logging
-from datetime import datetime, timedelta
-from typing import List
+import math
+from datetime import datetime, timezone
+from typing import Iterator, List, NamedTuple, Optional, Sequence
 
-import httpx
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
+from app import deadline
+from app.logs import truncate
 from app.settings import settings
-from app.uk_train_schedule.crud import (
-    get_earliest_timetable_entry,
-    post_timetable_entry,
+from app.uk_train_schedule.crud import get_departure_rate
+from app.uk_train_schedule.graph import StationBounds, get_graph, timetable_bounds
+from app.uk_train_schedule.identifiers import stations
+from app.uk_train_schedule.ingest import FetchBatch, get_ingest_queue, write_batches
+from app.uk_train_schedule.interchange import interchange_times
+from app.uk_train_schedule.raptor import RaptorJourney, RaptorTimetable
+from app.uk_train_schedule.routing import (
+    ConnectionRow,
+    JourneyLeg,
+    Label,
+    backtrack,
+    leg_window,
+    origin_labels,
+    relax_leg,
 )
+from app.uk_train_schedule.snapshot_manager import get_snapshot_manager
+from app.uk_train_schedule.store import Departure, StoredConnection, get_store
+from app.uk_train_schedule.timeconv import (
+    LONDON,
+    from_epoch_minute,
+    localize,
+    service_day,
+    to_epoch_minute,
+)
+from app.uk_train_schedule.upstream_archive import get_archive
 
 logger = logging.getLogger(__name__)
+# Cache hits are logged on every leg; sampled by default (settings.log_sampling)
+cache_logger = logging.getLogger(f"{__name__}.cache")
 
 TRANSPORT_API_URL = (
     "https://transportapi.com/v3/uk/train/station_timetables/{station_from}.json"
 )
+# Maximum departures requested per station_timetables call
+FETCH_LIMIT = 1000
+# Upper bound on a single upstream call; less when the request's deadline is nearer
+FETCH_TIMEOUT_SECONDS = 30
 
 
 # Custom exception for TransportAPI errors
@@ -32,64 +61,68 @@ class TransportAPIException(HTTPException):
         super().__init__(status_code=status_code, detail=detail)
 
 
-# Helper to parse time strings
-def parse_time(date_str: str, time_str: str) -> datetime:
-    """
-    Parse date and time strings into a datetime object.
-    Args:
-        date_str (str): Date string (YYYY-MM-DD)
-        time_str (str): Time string (HH:MM)
-    Returns:
-        datetime: Combined datetime object
-    """
-    return datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
+class FetchPlan(NamedTuple):
+    """Size of an upstream station_timetables request."""
 
+    horizon_minutes: int
+    limit: int
 
-def _timetable_cache_hit(
-    db: Session,
-    station_from: str,
-    station_to: str,
-    window_start: datetime,
-    window_end: datetime,
-):
+
+# Departures requested beyond the expected count, to absorb busier periods
+FETCH_HEADROOM = 1.5
+FETCH_MIN_LIMIT = 20
+# A departure this far before the previous one is on the next date (the
+# fetch horizon crossed midnight)
+DAY_ROLLOVER_MINUTES = 12 * 60
+
+
+def _fetch_plan(
+    db: Session, station_from: str, station_to: Optional[str], window_minutes: int
+) -> FetchPlan:
     """
-    Returns the first matching TimetableEntry if found, otherwise None.
-    Uses get_earliest_timetable_entry from crud, but restricts to window_end.
+    Choose the fetch horizon and limit for a station from its observed departures
+    per hour: busy stations fetch short windows, sparse ones long windows, each
+    sized to about settings.fetch_target_departures. The horizon always spans the
+    window the caller needs. Unobserved stations use the upstream defaults.
     """
-    try:
-        # Use the CRUD function, but filter for window_end as well
-        entry = get_earliest_timetable_entry(db, station_from, station_to, window_start)
-        if entry and window_start <= entry.aimed_departure_time < window_end:
-            return entry
-        return None
-    except Exception as exc:
-        logger.error(
-            f"Database error during cache check for {station_from}->{station_to} in "
-            f"window {window_start} to {window_end}: {exc}"
+    rate = get_departure_rate(db, station_from, station_to)
+    if rate is None:
+        return FetchPlan(
+            max(settings.upstream_window_minutes, window_minutes), FETCH_LIMIT
         )
-        return None
+    horizon = settings.fetch_target_departures * 60 / max(rate, 0.1)
+    horizon = min(
+        max(horizon, settings.fetch_min_horizon_minutes),
+        settings.fetch_max_horizon_minutes,
+    )
+    horizon = max(int(horizon), window_minutes)
+    limit = math.ceil(rate * horizon / 60 * FETCH_HEADROOM)
+    return FetchPlan(horizon, min(max(limit, FETCH_MIN_LIMIT), FETCH_LIMIT))
 
 
 def _fetch_timetable_from_api(
-    station_from: str, station_to: str, window_start: datetime
+    station_from: str,
+    station_to: Optional[str],
+    window_start: datetime,
+    horizon_minutes: Optional[int] = None,
+    limit: int = FETCH_LIMIT,
 ) -> dict:
     """
     Fetch timetable data from TransportAPI for the given window.
     Args:
         station_from (str): Departure station code
-        station_to (str): Arrival station code
-        window_start (datetime): Start of time window (UTC)
+        station_to (Optional[str]): Calling-point filter, or None for all departures
+        window_start (datetime): Start of time window (naive values are UK local time)
+        horizon_minutes (Optional[int]): Window length (upstream default if None)
+        limit (int): Maximum departures returned
     Returns:
         dict: API response data
     Raises:
         TransportAPIException: If the API call fails or returns an error status.
     """
-    from datetime import timezone
+    import httpx  # deferred: only needed on a cache miss
 
-    if window_start.tzinfo is None:
-        window_start_utc = window_start.replace(tzinfo=timezone.utc)
-    else:
-        window_start_utc = window_start.astimezone(timezone.utc)
+    window_start_utc = localize(window_start).astimezone(timezone.utc)
     datetime_str = window_start_utc.strftime("%Y-%m-%dT%H:%M:00Z")
     params = {
         "app_id": settings.app_id,
@@ -98,23 +131,51 @@ def _fetch_timetable_from_api(
         "station_detail": "calling_at",
         "train_status": "passenger",
         "datetime": datetime_str,
-        "limit": 1000,
-        "calling_at": station_to,
+        "limit": limit,
     }
+    if horizon_minutes:
+        params["to_offset"] = (
+            f"PT{horizon_minutes // 60:02d}:{horizon_minutes % 60:02d}:00"
+        )
+    if station_to:
+        params["calling_at"] = station_to
     url = TRANSPORT_API_URL.format(station_from=station_from)
+    archive = get_archive()
+    if settings.upstream_mode == "replay":
+        data = archive.get(url, params)
+        if data is None:
+            raise TransportAPIException(
+                detail=f"No recorded TransportAPI response for {station_from}->"
+                f"{station_to} at {datetime_str}",
+                status_code=status.HTTP_502_BAD_GATEWAY,
+            )
+        return data
     try:
         with httpx.Client() as client:
             try:
-                response = client.get(url, params=params, timeout=30)
+                response = client.get(
+                    url,
+                    params=params,
+                    timeout=deadline.timeout(FETCH_TIMEOUT_SECONDS),
+                )
                 response.raise_for_status()
                 data = response.json()
                 # Validate response structure
                 if "departures" not in data or "all" not in data.get("departures", {}):
-                    logger.error(f"Malformed response from TransportAPI: {data}")
+                    logger.error(
+                        "Malformed response from TransportAPI: %s", truncate(data)
+                    )
                     raise TransportAPIException(
                         detail="Malformed response from TransportAPI",
                         status_code=status.HTTP_502_BAD_GATEWAY,
                     )
+                if archive is not None:
+                    try:
+                        archive.put(url, params, data)
+                    except OSError as exc:
+                        logger.warning(
+                            "Could not record TransportAPI response: %s", exc
+                        )
                 return data
             except httpx.HTTPStatusError as exc:
                 # Try to extract error message from TransportAPI JSON if present
@@ -127,35 +188,50 @@ def _fetch_timetable_from_api(
                         detail = f"TransportAPI returned HTTP {exc.response.status_code}: {exc.response.text}"
                 except Exception:
                     detail = f"TransportAPI returned HTTP {exc.response.status_code}: {exc.response.text}"
-                logger.error(detail)
+                logger.error("%s", truncate(detail))
                 raise TransportAPIException(
                     detail=detail,
                     status_code=exc.response.status_code,
                 ) from exc
     except httpx.TimeoutException as exc:
         logger.error(
-            f"Timeout fetching timetable for {station_from}->{station_to} at "
-            f"{window_start}: {exc}"
+            "Timeout fetching timetable for %s->%s at %s: %s",
+            station_from,
+            station_to,
+            window_start,
+            exc,
         )
+        # Timed out on the request's budget rather than the upstream's
+        deadline.check()
         raise TransportAPIException(
             detail="Timeout from TransportAPI",
             status_code=status.HTTP_504_GATEWAY_TIMEOUT,
         ) from exc
     except httpx.RequestError as exc:
         logger.error(
-            f"Request error fetching timetable for {station_from}->{station_to} at "
-            f"{window_start}: {exc}"
+            "Request error fetching timetable for %s->%s at %s: %s",
+            station_from,
+            station_to,
+            window_start,
+            exc,
         )
         raise TransportAPIException(
             detail="Request error from TransportAPI",
             status_code=status.HTTP_502_BAD_GATEWAY,
         ) from exc
-    except TransportAPIException:
+    except (
+        TransportAPIException,
+        deadline.DeadlineExceeded,
+        deadline.RequestCancelled,
+    ):
         raise
     except Exception as exc:
         logger.error(
-            f"Unexpected error fetching timetable for {station_from}->{station_to} at "
-            f"{window_start}: {exc}"
+            "Unexpected error fetching timetable for %s->%s at %s: %s",
+            station_from,
+            station_to,
+            window_start,
+            exc,
         )
         raise TransportAPIException(
             detail="Unexpected error from TransportAPI",
@@ -163,124 +239,433 @@ def _fetch_timetable_from_api(
         ) from exc
 
 
-def _store_timetable_entries(
-    db: Session, data: dict, station_from: str, station_to: str
-) -> None:
+def _parse_timetable_entries(
+    data: dict,
+    station_from: str,
+    station_to: Optional[str],
+    window_start_minute: Optional[int] = None,
+    plan: Optional[FetchPlan] = None,
+) -> Optional[FetchBatch]:
     """
-    Store timetable entries from API data into the database.
+    Turn API data into a FetchBatch of connections and the window it covers.
     Logs errors and skips malformed entries, but continues processing others.
     Args:
-        db (Session): SQLAlchemy session
         data (dict): API response data
         station_from (str): Departure station code
-        station_to (str): Arrival station code
+        station_to (Optional[str]): Arrival station code, or None to keep every calling point
+        window_start_minute (Optional[int]): Requested window start; when given, the
+            batch records the window covered by the fetch
+        plan (Optional[FetchPlan]): Horizon and limit the data was fetched with
+            (upstream defaults if None)
+    Returns:
+        Optional[FetchBatch]: The batch, or None if the response has no date
     """
-    stored_count = 0
-    try:
-        date = data.get("date")
-        if not date:
-            logger.error("No 'date' in API response.")
-            return
-        departures = data.get("departures", {}).get("all", [])
-        for dep in departures:
-            try:
-                service_id = dep.get("service")
-                aimed_departure_time = parse_time(date, dep.get("aimed_departure_time"))
-                for call in dep.get("station_detail", {}).get("calling_at", []):
-                    if call.get("station_code") == station_to:
-                        aimed_arrival_time = parse_time(
-                            date, call.get("aimed_arrival_time")
-                        )
-                        post_timetable_entry(
-                            db,
-                            service_id,
-                            station_from,
-                            station_to,
-                            aimed_departure_time,
-                            aimed_arrival_time,
-                        )
-                        stored_count += 1
-            except Exception as entry_exc:
-                logger.error(
-                    f"Error storing entry for service_id={dep.get('service')}: "
-                    f"{entry_exc}"
+    if plan is None:
+        plan = FetchPlan(settings.upstream_window_minutes, FETCH_LIMIT)
+    date = data.get("date")
+    if not date:
+        logger.error("No 'date' in API response.")
+        return None
+    day = service_day(date)
+    departures = data.get("departures", {}).get("all", [])
+    rows = []
+    last_departure_minute = window_start_minute
+    # Departures are in time order from the window start; one that is well
+    # before the previous has wrapped past midnight onto the next date
+    previous_minute = window_start_minute
+    for dep in departures:
+        try:
+            service_id = dep.get("service")
+            departure_time = dep.get("aimed_departure_time")
+            departure_minute = day.epoch_minute(departure_time)
+            while (
+                previous_minute is not None
+                and departure_minute < previous_minute - DAY_ROLLOVER_MINUTES
+            ):
+                day = day.next()
+                departure_minute = day.epoch_minute(departure_time)
+            previous_minute = departure_minute
+            if last_departure_minute is not None:
+                last_departure_minute = max(last_departure_minute, departure_minute)
+            for call in dep.get("station_detail", {}).get("calling_at", []):
+                call_code = call.get("station_code")
+                if station_to is not None and call_code != station_to:
+                    continue
+                arrival_minute = day.epoch_minute(call.get("aimed_arrival_time"))
+                if arrival_minute < departure_minute:
+                    # Service runs past midnight into the next day
+                    arrival_minute = day.next().epoch_minute(
+                        call.get("aimed_arrival_time")
+                    )
+                rows.append(
+                    StoredConnection(
+                        departure_minute,
+                        arrival_minute,
+                        station_from,
+                        call_code,
+                        service_id,
+                    )
                 )
+        except Exception as entry_exc:
+            logger.error(
+                "Error storing entry for service_id=%s: %s",
+                dep.get("service"),
+                entry_exc,
+            )
+    if window_start_minute is not None and len(departures) < plan.limit:
+        # Not truncated by the limit: the whole upstream window was returned
+        last_departure_minute = max(
+            last_departure_minute, window_start_minute + plan.horizon_minutes
+        )
+    return FetchBatch(
+        station_from,
+        station_to,
+        rows,
+        window_start_minute,
+        last_departure_minute,
+        len(departures),
+    )
+
+
+def _write_batch(db: Session, batch: FetchBatch) -> None:
+    """Write a fetched batch on the caller's thread, logging failures."""
+    try:
+        inserted = write_batches(db, [batch])
         logger.info(
-            f"Stored {stored_count} timetable entries for "
-            f"{station_from}->{station_to}"
+            "Stored %s timetable entries (%s new) for %s->%s",
+            len(batch.rows),
+            inserted,
+            batch.station_from,
+            batch.station_to or "all calling points",
         )
     except Exception as exception:
+        db.rollback()
         logger.error(
-            f"Error processing timetable entries for {station_from}->{station_to}: "
-            f"{exception}"
+            "Error processing timetable entries for %s->%s: %s",
+            batch.station_from,
+            batch.station_to,
+            exception,
         )
 
 
-def fetch_or_store_timetable(
-    db: Session, station_from: str, station_to: str, starting_time: str, max_wait: int
-):
+def _fetch_and_store(
+    db: Session,
+    station_from: str,
+    station_to: Optional[str],
+    start_minute: int,
+    window_minutes: int,
+    wait: bool = False,
+) -> List[StoredConnection]:
     """
-    Fetch and cache timetable data for a given station pair and time window.
-    If a cached entry exists, return it. Otherwise, fetch from the API, store, and return the new entry.
+    Fetch departures from start_minute, sized by _fetch_plan to span at least
+    window_minutes, and store them.
+    With settings.write_behind the rows are queued for the background writer and
+    returned at once, so the caller can plan over them without waiting for the
+    database; wait blocks until they have been written (for callers that read
+    them back from the store).
+    Returns:
+        List[StoredConnection]: The fetched connections
     """
-    window_start = datetime.fromisoformat(starting_time)
-    window_end = window_start + timedelta(minutes=max_wait)
-    cache_entry = _timetable_cache_hit(
-        db, station_from, station_to, window_start, window_end
-    )
-    if cache_entry:
-        logger.info(
-            f"Cache hit for {station_from}->{station_to} in window {window_start} to {window_end}"
-        )
-        return cache_entry
+    plan = _fetch_plan(db, station_from, station_to, window_minutes)
     logger.info(
-        f"Fetching timetable from API for {station_from}->{station_to} at {window_start} for window {max_wait} minutes"
+        "Fetching timetable from API for %s->%s from %s (%s minutes, limit %s)",
+        station_from,
+        station_to or "all",
+        start_minute,
+        plan.horizon_minutes,
+        plan.limit,
     )
-    data = _fetch_timetable_from_api(station_from, station_to, window_start)
-    _store_timetable_entries(db, data, station_from, station_to)
-    logger.info(
-        f"Stored timetable entries for {station_from}->{station_to} in window {window_start} to {window_end}"
+    data = _fetch_timetable_from_api(
+        station_from,
+        station_to,
+        from_epoch_minute(start_minute, LONDON),
+        plan.horizon_minutes,
+        plan.limit,
     )
-    return _timetable_cache_hit(db, station_from, station_to, window_start, window_end)
+    batch = _parse_timetable_entries(data, station_from, station_to, start_minute, plan)
+    if batch is None:
+        return []
+    if settings.write_behind:
+        written = get_ingest_queue().submit(db, batch)
+        if wait:
+            written.wait()
+    else:
+        _write_batch(db, batch)
+    return batch.rows
 
 
-def find_earliest_journey(
-    db: Session, station_codes: List[str], start_time: str, max_wait: int
-) -> str:
+def fetch_or_store_connections(
+    db: Session,
+    station_from: str,
+    station_to: str,
+    start_minute: int,
+    end_minute: int,
+) -> List[ConnectionRow]:
     """
-    Finds the earliest valid journey for a list of station codes and a start time.
-    Returns the arrival time at the final destination as an ISO8601 string.
-    Raises TransportAPIException if any leg cannot be completed.
+    All cached departures for a route in [start_minute, end_minute], fetching the
+    window from the API first if it has not been covered yet. Fetched rows are
+    used directly (they may still be queued for writing); the store is only read
+    on a miss when the fetch was truncated before end_minute.
+    Returns:
+        List[ConnectionRow]: (departure_minute, arrival_minute, service_id) rows
     """
-    logger.info(
-        f"Finding earliest journey for {station_codes} from {start_time} with max_wait {max_wait}"
+    store = get_store()
+    if store.is_covered(db, station_from, station_to, start_minute, end_minute):
+        cache_logger.info(
+            "Cache hit for %s->%s in window %s to %s",
+            station_from,
+            station_to,
+            start_minute,
+            end_minute,
+            extra={
+                "station_from": station_from,
+                "station_to": station_to,
+                "start_minute": start_minute,
+                "end_minute": end_minute,
+            },
+        )
+        return store.connections(db, station_from, station_to, start_minute, end_minute)
+    fetched = _fetch_and_store(
+        db, station_from, station_to, start_minute, end_minute - start_minute
     )
-    current_time = datetime.fromisoformat(start_time)
+    connections = {
+        (row.departure_minute, row.arrival_minute, row.service_id)
+        for row in fetched
+        if row.station_to == station_to
+        and start_minute <= row.departure_minute <= end_minute
+    }
+    if not fetched or max(row.departure_minute for row in fetched) < end_minute:
+        connections.update(
+            store.connections(db, station_from, station_to, start_minute, end_minute)
+        )
+    return sorted(connections)
+
+
+class JourneyStage(NamedTuple):
+    """
+    A leg of a planned journey once its connections have been relaxed.
+    labels are the reachable arrivals at station_to, earliest first.
+    """
+
+    station_from: str
+    station_to: str
+    labels: List[Label]
+
+
+def iter_journey_stages(
+    db: Session, station_codes: List[str], start_minute: int, max_wait: int
+) -> Iterator[JourneyStage]:
+    """
+    Resolve the legs of a journey through station_codes one at a time, yielding
+    each as soon as its connections are known. Legs after the one being consumed
+    are not fetched until the caller asks for them, so abandoning the iterator
+    abandons the remaining upstream fetches.
+    Raises TransportAPIException (404) if a leg cannot be completed.
+    """
+    station_keys = stations.keys(db, station_codes, create=False)
+    labels = origin_labels(start_minute)
     for station_from, station_to in zip(station_codes, station_codes[1:]):
-        entry = fetch_or_store_timetable(
-            db, station_from, station_to, current_time.isoformat(), max_wait
+        deadline.check()
+        window_start, window_end = leg_window(labels, max_wait)
+        connections = fetch_or_store_connections(
+            db, station_from, station_to, window_start, window_end
         )
-        if not entry:
+        min_connection = interchange_times.minutes(db, station_keys.get(station_from))
+        labels = relax_leg(labels, connections, max_wait, min_connection)
+        if not labels:
+            after = from_epoch_minute(window_start, LONDON)
             logger.warning(
-                f"No trains found for {station_from} to {station_to} after {current_time}"
+                "No trains found for %s to %s after %s", station_from, station_to, after
             )
             raise TransportAPIException(
-                detail=(
-                    f"No trains found for {station_from} to {station_to} after {current_time}"
-                ),
+                detail=f"No trains found for {station_from} to {station_to} after {after}",
                 status_code=status.HTTP_404_NOT_FOUND,
             )
-        wait_time = (entry.aimed_departure_time - current_time).total_seconds() / 60
-        if wait_time > max_wait:
-            logger.warning(
-                f"Wait time at {station_from} exceeds max_wait: {wait_time:.0f} > {max_wait}"
-            )
-            raise TransportAPIException(
-                detail=(
-                    f"Wait time at {station_from} exceeds max_wait ({wait_time:.0f} > {max_wait})"
-                ),
-                status_code=status.HTTP_400_BAD_REQUEST,
+        yield JourneyStage(station_from, station_to, labels)
+
+
+def journey_legs(station_codes: List[str], labels: List[Label]) -> List[JourneyLeg]:
+    """
+    The trains of the earliest-arriving journey, from the final stage's labels.
+    """
+    return [
+        JourneyLeg(
+            station_from,
+            station_to,
+            label.service_key,
+            label.departure_minute,
+            label.arrival_minute,
+        )
+        for (station_from, station_to), label in zip(
+            zip(station_codes, station_codes[1:]), backtrack(labels[0])
+        )
+    ]
+
+
+def plan_journey(
+    db: Session, station_codes: List[str], start_minute: int, max_wait: int
+) -> List[JourneyLeg]:
+    """
+    Plan the earliest-arriving journey through station_codes, in order.
+    Every departure within max_wait of a reachable arrival is considered, so a
+    later but faster train is taken when it arrives sooner. Changing trains needs
+    the station's minimum connection time; staying aboard does not. Each leg costs one
+    range query (plus an API fetch when the window is not cached).
+    Raises TransportAPIException (404) if a leg cannot be completed.
+    """
+    labels = origin_labels(start_minute)
+    for stage in iter_journey_stages(db, station_codes, start_minute, max_wait):
+        labels = stage.labels
+    return journey_legs(station_codes, labels)
+
+
+def _raptor_timetable(
+    db: Session,
+    start_minute: int,
+    fetched: Optional[Sequence[StoredConnection]] = None,
+) -> RaptorTimetable:
+    """
+    Trip arrays for journeys in [start_minute, start_minute +
+    settings.options_horizon_minutes]: those of the current snapshot generation
+    when it covers the whole range and the origin needed no fetch (fetched is
+    None), otherwise built from the cached timetable plus the just-fetched
+    connections, which may not be written yet.
+    """
+    end_minute = start_minute + settings.options_horizon_minutes
+    generation = get_snapshot_manager().current()
+    if (
+        fetched is None
+        and generation is not None
+        and generation.snapshot.start_minute <= start_minute
+        and end_minute <= generation.snapshot.end_minute
+    ):
+        return generation.timetable
+    connections = get_store().connections_departing(db, start_minute, end_minute)
+    if fetched:
+        connections = sorted(
+            set(connections).union(
+                row
+                for row in fetched
+                if start_minute <= row.departure_minute < end_minute
             )
-        current_time = entry.aimed_arrival_time
-    logger.info(f"Final arrival time: {current_time.isoformat()}")
-    return current_time.isoformat()
+        )
+    return RaptorTimetable(connections)
+
+
+def _lower_bounds(
+    timetable: RaptorTimetable, station_to: str
+) -> Optional[StationBounds]:
+    """
+    Transfer graph lower bounds to station_to for the timetable's stations, or
+    None without a graph or when the graph is older than the timetable's trips
+    (its bounds could then prune journeys that exist).
+    """
+    graph = get_graph()
+    if graph is None or station_to not in timetable.station_index:
+        return None
+    return timetable_bounds(graph, timetable).to(station_to)
+
+
+def get_journey_options(
+    db: Session,
+    station_from: str,
+    station_to: str,
+    start_minute: int,
+    max_changes: int,
+) -> List[RaptorJourney]:
+    """
+    Pareto-optimal journeys for (arrival time, changes) between two stations.
+    Departures from the origin are fetched from the API if their window has not
+    been cached; the rest of the network is routed over what is cached.
+    Raises TransportAPIException (404) if no journey is found.
+    """
+    end_minute = start_minute + settings.options_horizon_minutes
+    fetched = None
+    if not get_store().is_covered(db, station_from, None, start_minute, end_minute):
+        fetched = _fetch_and_store(
+            db, station_from, None, start_minute, settings.options_horizon_minutes
+        )
+    timetable = _raptor_timetable(db, start_minute, fetched)
+    min_connection = [
+        interchange_times.minutes(db, stations.key(db, code, create=False))
+        for code in timetable.stations
+    ]
+    options = timetable.journeys(
+        station_from,
+        station_to,
+        start_minute,
+        max_changes,
+        min_connection,
+        _lower_bounds(timetable, station_to),
+    )
+    if not options:
+        after = from_epoch_minute(start_minute, LONDON)
+        logger.warning(
+            "No journeys found from %s to %s after %s", station_from, station_to, after
+        )
+        raise TransportAPIException(
+            detail=f"No journeys found from {station_from} to {station_to} after {after}",
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    return options
+
+
+def find_earliest_journey(
+    db: Session, station_codes: List[str], start_time: datetime, max_wait: int
+) -> str:
+    """
+    Finds the earliest valid journey for a list of station codes and a start time
+    (naive datetimes are UK local time).
+    Returns the arrival time at the final destination as an ISO8601 string, in the
+    start time's UTC offset.
+    Raises TransportAPIException if any leg cannot be completed.
+    """
+    logger.info(
+        "Finding earliest journey for %s from %s with max_wait %s",
+        station_codes,
+        start_time,
+        max_wait,
+    )
+    start = localize(start_time)
+    legs = plan_journey(db, station_codes, to_epoch_minute(start), max_wait)
+    arrival_time = from_epoch_minute(legs[-1].arrival_minute, start.tzinfo).isoformat()
+    logger.info("Final arrival time: %s", arrival_time)
+    return arrival_time
+
+
+def get_departure_board(
+    db: Session,
+    station_code: str,
+    after_minute: int,
+    after_id: Optional[int],
+    limit: int,
+    calling_at: Optional[str] = None,
+) -> List[Departure]:
+    """
+    Departures from a station served from the timetable cache, keyset-paginated on
+    (departure_minute, id). When the requested window has not been fetched yet, a
+    single station_timetables call fills it before the range scan is repeated
+    (waiting for the write, since pagination cursors need stored row ids).
+    Returns:
+        List[Departure]: Up to limit departures in departure order
+    """
+    store = get_store()
+    entries = store.departures(
+        db, station_code, after_minute, after_id, limit, calling_at
+    )
+    if len(entries) == limit:
+        window_end = entries[-1].departure_minute
+    else:
+        window_end = after_minute + settings.board_horizon_minutes
+    if store.is_covered(db, station_code, calling_at, after_minute, window_end):
+        cache_logger.info(
+            "Departure board cache hit for %s from %s",
+            station_code,
+            after_minute,
+            extra={"station_from": station_code, "start_minute": after_minute},
+        )
+        return entries
+    _fetch_and_store(
+        db, station_code, calling_at, after_minute, window_end - after_minute, wait=True
+    )
+    return store.departures(db, station_code, after_minute, after_id, limit, calling_at)
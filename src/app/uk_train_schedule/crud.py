@@ -4,12 +4,17 @@ Handles database insertions and queries for train schedules.
 """
 
 import logging
-from datetime import datetime, timezone
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
 
+from sqlalchemy import delete, exists, func, tuple_
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 
-from app.uk_train_schedule.models import TimetableEntry
+from app.uk_train_schedule.identifiers import services, stations
+from app.uk_train_schedule.models import DepartureRate, FetchCoverage, TimetableEntry
+from app.uk_train_schedule.timeconv import to_epoch_minute
+from database.dialects import insert_ignore, insert_ignore_tuples
 
 logger = logging.getLogger(__name__)
 
@@ -19,28 +24,22 @@ def post_timetable_entry(
     service_id: str,
     station_from: str,
     station_to: str,
-    aimed_departure_time: datetime,
-    aimed_arrival_time: datetime,
+    aimed_departure_time: datetime | int,
+    aimed_arrival_time: datetime | int,
 ) -> bool:
     """
     Add a new timetable entry for a train between two stations.
+    Times may be given as epoch minutes or datetimes (naive datetimes are UK local time).
     Returns True if a new entry was added, False if duplicate.
     """
-    # Ensure all datetimes are timezone-aware and in UTC
-    if aimed_departure_time.tzinfo is None:
-        aimed_departure_time = aimed_departure_time.replace(tzinfo=timezone.utc)
-    else:
-        aimed_departure_time = aimed_departure_time.astimezone(timezone.utc)
-    if aimed_arrival_time.tzinfo is None:
-        aimed_arrival_time = aimed_arrival_time.replace(tzinfo=timezone.utc)
-    else:
-        aimed_arrival_time = aimed_arrival_time.astimezone(timezone.utc)
+    departure_minute = to_epoch_minute(aimed_departure_time)
+    station_keys = stations.keys(db, (station_from, station_to))
     entry = TimetableEntry(
-        service_id=service_id,
-        station_from=station_from,
-        station_to=station_to,
-        aimed_departure_time=aimed_departure_time,
-        aimed_arrival_time=aimed_arrival_time,
+        service_key=services.key(db, service_id),
+        station_from_key=station_keys.get(station_from),
+        station_to_key=station_keys.get(station_to),
+        departure_minute=departure_minute,
+        arrival_minute=to_epoch_minute(aimed_arrival_time),
     )
     try:
         db.add(entry)
@@ -50,43 +49,353 @@ def post_timetable_entry(
     except IntegrityError:
         db.rollback()
         logger.warning(
-            f"Duplicate timetable entry: {service_id} - {station_from}->{station_to} |"
-            f"{aimed_departure_time}|"
+            "Duplicate timetable entry: %s - %s->%s |%s|",
+            service_id,
+            station_from,
+            station_to,
+            departure_minute,
         )
         return False
 
 
+# Columns written by bulk_insert_timetable_entries(raw=True), in tuple order
+_BULK_COLUMNS = (
+    "service_key",
+    "station_from_key",
+    "station_to_key",
+    "departure_minute",
+    "arrival_minute",
+)
+
+
+def bulk_insert_timetable_entries(
+    db: Session,
+    rows: Sequence[Tuple[int, int, str, str, str]],
+    batch_size: int = 500,
+    raw: bool = False,
+) -> int:
+    """
+    Insert many timetable entries, skipping duplicates, without committing.
+    rows are (departure_minute, arrival_minute, station_from, station_to,
+    service_id); codes are resolved to keys up front and the rows are written in
+    executemany batches of batch_size. raw hands key tuples straight to the
+    driver's executemany through one compiled statement (insert_ignore_tuples),
+    which suits in-process drivers such as sqlite3.
+    Returns:
+        int: Number of entries inserted (-1 if the driver cannot tell)
+    """
+    station_keys = stations.keys(
+        db, {code for row in rows for code in (row[2], row[3])}
+    )
+    service_keys = services.keys(db, {row[4] for row in rows})
+    if raw:
+        keyed = [
+            (
+                service_keys[service_id],
+                station_keys[station_from],
+                station_keys[station_to],
+                departure,
+                arrival,
+            )
+            for departure, arrival, station_from, station_to, service_id in rows
+        ]
+        inserted = 0
+        for start in range(0, len(keyed), batch_size):
+            end = start + batch_size
+            count = insert_ignore_tuples(
+                db, TimetableEntry.__table__, _BULK_COLUMNS, keyed[start:end]
+            )
+            inserted = -1 if count < 0 or inserted < 0 else inserted + count
+        return inserted
+    values = [
+        {
+            "service_key": service_keys[service_id],
+            "station_from_key": station_keys[station_from],
+            "station_to_key": station_keys[station_to],
+            "departure_minute": departure,
+            "arrival_minute": arrival,
+        }
+        for departure, arrival, station_from, station_to, service_id in rows
+    ]
+    inserted = 0
+    for start in range(0, len(values), batch_size):
+        end = start + batch_size
+        count = insert_ignore(db, TimetableEntry.__table__, values[start:end])
+        inserted = -1 if count < 0 or inserted < 0 else inserted + count
+    return inserted
+
+
+def evict_timetable_entries(db: Session, before_minute: int) -> int:
+    """
+    Delete timetable entries departing before before_minute, and the fetch
+    coverage that ends before it.
+    Returns:
+        int: Number of timetable entries deleted
+    """
+    deleted = db.execute(
+        delete(TimetableEntry).where(TimetableEntry.departure_minute < before_minute)
+    ).rowcount
+    db.execute(delete(FetchCoverage).where(FetchCoverage.end_minute < before_minute))
+    db.commit()
+    return deleted
+
+
 def get_earliest_timetable_entry(
-    db: Session, station_from: str, station_to: str, after_time: datetime
+    db: Session, station_from: str, station_to: str, after_time: datetime | int
 ) -> TimetableEntry | None:
     """
     Get the earliest timetable entry for a route after a given time, ordered by departure
+    after_time may be epoch minutes or a datetime (truncated to the minute).
     Returns:
         TimetableEntry | None: The earliest timetable entry or None if not found
     """
-    # Truncate seconds and microseconds for time comparison
-    if after_time.tzinfo is None:
-        after_time = after_time.replace(tzinfo=timezone.utc)
-    else:
-        after_time = after_time.astimezone(timezone.utc)
-    after_time_trunc = after_time.replace(second=0, microsecond=0)
-    entry = (
+    station_keys = stations.keys(db, (station_from, station_to), create=False)
+    if station_from not in station_keys or station_to not in station_keys:
+        return None
+    return (
         db.query(TimetableEntry)
         .filter(
-            TimetableEntry.station_from == station_from,
-            TimetableEntry.station_to == station_to,
-            TimetableEntry.aimed_departure_time >= after_time_trunc,
+            TimetableEntry.station_from_key == station_keys.get(station_from),
+            TimetableEntry.station_to_key == station_keys.get(station_to),
+            TimetableEntry.departure_minute >= to_epoch_minute(after_time),
         )
-        .order_by(TimetableEntry.aimed_departure_time)
+        .order_by(TimetableEntry.departure_minute)
         .first()
     )
-    if entry:
-        if entry.aimed_departure_time.tzinfo is None:
-            entry.aimed_departure_time = entry.aimed_departure_time.replace(
-                tzinfo=timezone.utc
+
+
+def get_connections_in_window(
+    db: Session,
+    station_from: str,
+    station_to: str,
+    start_minute: int,
+    end_minute: int,
+) -> List[Tuple[int, int, int]]:
+    """
+    All departures for a route in [start_minute, end_minute] in a single range scan.
+    Returns:
+        List[Tuple[int, int, int]]: (departure_minute, arrival_minute, service_key)
+            rows ordered by departure
+    """
+    station_keys = stations.keys(db, (station_from, station_to), create=False)
+    if station_from not in station_keys or station_to not in station_keys:
+        return []
+    rows = (
+        db.query(
+            TimetableEntry.departure_minute,
+            TimetableEntry.arrival_minute,
+            TimetableEntry.service_key,
+        )
+        .filter(
+            TimetableEntry.station_from_key == station_keys.get(station_from),
+            TimetableEntry.station_to_key == station_keys.get(station_to),
+            TimetableEntry.departure_minute >= start_minute,
+            TimetableEntry.departure_minute <= end_minute,
+        )
+        .order_by(TimetableEntry.departure_minute)
+        .all()
+    )
+    return [tuple(row) for row in rows]
+
+
+def get_connections_departing(
+    db: Session, start_minute: int, end_minute: int
+) -> List[Tuple[int, int, str, str, str]]:
+    """
+    Every cached connection departing in [start_minute, end_minute), network-wide.
+    Returns:
+        List[Tuple[int, int, str, str, str]]: (departure_minute, arrival_minute,
+            station_from, station_to, service_id) rows ordered by departure
+    """
+    rows = (
+        db.query(
+            TimetableEntry.departure_minute,
+            TimetableEntry.arrival_minute,
+            TimetableEntry.station_from_key,
+            TimetableEntry.station_to_key,
+            TimetableEntry.service_key,
+        )
+        .filter(
+            TimetableEntry.departure_minute >= start_minute,
+            TimetableEntry.departure_minute < end_minute,
+        )
+        .order_by(TimetableEntry.departure_minute)
+        .all()
+    )
+    return [
+        (
+            departure,
+            arrival,
+            stations.code(db, from_key),
+            stations.code(db, to_key),
+            services.code(db, service_key),
+        )
+        for departure, arrival, from_key, to_key, service_key in rows
+    ]
+
+
+def get_fastest_rides(db: Session) -> List[Tuple[str, str, int]]:
+    """
+    The fastest cached ride between every pair of stations served directly
+    (a full aggregation over timetable_entries, for offline jobs).
+    Returns:
+        List[Tuple[str, str, int]]: (station_from, station_to, minutes) rows
+    """
+    stations.preload(db)
+    rows = db.query(
+        TimetableEntry.station_from_key,
+        TimetableEntry.station_to_key,
+        func.min(TimetableEntry.arrival_minute - TimetableEntry.departure_minute),
+    ).group_by(TimetableEntry.station_from_key, TimetableEntry.station_to_key)
+    return [
+        (stations.code(db, from_key), stations.code(db, to_key), ride)
+        for from_key, to_key, ride in rows
+    ]
+
+
+def get_departures(
+    db: Session,
+    station_from: str,
+    after_minute: int,
+    after_id: Optional[int] = None,
+    limit: int = 20,
+    calling_at: Optional[str] = None,
+) -> List[TimetableEntry]:
+    """
+    Keyset-paginated departures from a station, ordered by (departure_minute, id).
+    Rows strictly after the (after_minute, after_id) key are returned; without
+    after_id every departure at or after after_minute is included.
+    With calling_at, only entries arriving there are returned; otherwise each
+    service appears once, represented by its furthest stored calling point.
+    """
+    from_key = stations.key(db, station_from, create=False)
+    if from_key is None:
+        return []
+    query = db.query(TimetableEntry).filter(TimetableEntry.station_from_key == from_key)
+    if after_id is None:
+        query = query.filter(TimetableEntry.departure_minute >= after_minute)
+    else:
+        query = query.filter(
+            tuple_(TimetableEntry.departure_minute, TimetableEntry.id)
+            > tuple_(after_minute, after_id)
+        )
+    if calling_at:
+        to_key = stations.key(db, calling_at, create=False)
+        if to_key is None:
+            return []
+        query = query.filter(TimetableEntry.station_to_key == to_key)
+    else:
+        later = aliased(TimetableEntry)
+        query = query.filter(
+            ~exists().where(
+                later.service_key == TimetableEntry.service_key,
+                later.station_from_key == TimetableEntry.station_from_key,
+                later.departure_minute == TimetableEntry.departure_minute,
+                later.arrival_minute > TimetableEntry.arrival_minute,
             )
-        if entry.aimed_arrival_time.tzinfo is None:
-            entry.aimed_arrival_time = entry.aimed_arrival_time.replace(
-                tzinfo=timezone.utc
+        )
+    return (
+        query.order_by(TimetableEntry.departure_minute, TimetableEntry.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def is_window_covered(
+    db: Session,
+    station_from: str,
+    calling_at: Optional[str],
+    start_minute: int,
+    end_minute: int,
+) -> bool:
+    """
+    Check whether departures in [start_minute, end_minute] have already been fetched,
+    either for this calling point or by an unfiltered fetch.
+    """
+    filters = [""] if not calling_at else [calling_at, ""]
+    return db.query(
+        exists().where(
+            FetchCoverage.station_from == station_from,
+            FetchCoverage.calling_at.in_(filters),
+            FetchCoverage.start_minute <= start_minute,
+            FetchCoverage.end_minute >= end_minute,
+        )
+    ).scalar()
+
+
+def mark_window_covered(
+    db: Session,
+    station_from: str,
+    calling_at: Optional[str],
+    start_minute: int,
+    end_minute: int,
+) -> None:
+    """
+    Record that departures in [start_minute, end_minute] have been fetched and stored.
+    """
+    db.add(
+        FetchCoverage(
+            station_from=station_from,
+            calling_at=calling_at or "",
+            start_minute=start_minute,
+            end_minute=end_minute,
+        )
+    )
+    db.commit()
+
+
+def get_departure_rate(
+    db: Session, station_from: str, calling_at: Optional[str]
+) -> Optional[float]:
+    """
+    Average observed departures per hour for a fetch key, or None if never fetched.
+    """
+    rate = (
+        db.query(DepartureRate.departures_per_hour)
+        .filter(
+            DepartureRate.station_from == station_from,
+            DepartureRate.calling_at == (calling_at or ""),
+        )
+        .scalar()
+    )
+    return None if rate is None else float(rate)
+
+
+def record_departure_rate(
+    db: Session,
+    station_from: str,
+    calling_at: Optional[str],
+    observed: float,
+    weight: float = 0.3,
+) -> None:
+    """
+    Fold an observed departures-per-hour rate into the fetch key's average
+    (exponentially weighted; the first observation is taken as is).
+    """
+    row = (
+        db.query(DepartureRate)
+        .filter(
+            DepartureRate.station_from == station_from,
+            DepartureRate.calling_at == (calling_at or ""),
+        )
+        .one_or_none()
+    )
+    if row is None:
+        db.add(
+            DepartureRate(
+                station_from=station_from,
+                calling_at=calling_at or "",
+                departures_per_hour=observed,
+                samples=1,
             )
-    return entry
+        )
+    else:
+        row.departures_per_hour = (
+            1 - weight
+        ) * row.departures_per_hour + weight * observed
+        row.samples += 1
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker recorded the first observation concurrently
+        db.rollback()
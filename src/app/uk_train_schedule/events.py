@@ -0,0 +1,138 @@
+"""
+Cache invalidation events shared between worker processes.
+Events are appended to the cache_events table; every process dispatches its own
+events immediately and picks up other workers' events by polling.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.settings import settings
+from app.uk_train_schedule.models import CacheEvent
+
+logger = logging.getLogger(__name__)
+
+ROUTE_TOPIC = "route"
+INTERCHANGE_TOPIC = "interchange"
+# Timetable data replaced wholesale (e.g. a bulk import); drop everything derived
+TIMETABLE_TOPIC = "timetable"
+# Number of most recent events kept when the table is pruned
+EVENT_RETENTION = 10000
+
+_subscribers: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+_lock = threading.Lock()
+_last_seen_id: int | None = None
+_last_poll = 0.0
+
+
+def _origin() -> str:
+    # Evaluated per call so forked workers report their own pid
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _reset_after_fork() -> None:
+    global _last_seen_id, _last_poll
+    _last_seen_id = None
+    _last_poll = 0.0
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def subscribe(topic: str, callback: Callable[[str], None]) -> None:
+    """
+    Register a callback invoked with the event key whenever topic is published.
+    """
+    _subscribers[topic].append(callback)
+
+
+def _dispatch(topic: str, key: str) -> None:
+    for callback in list(_subscribers.get(topic, ())):
+        try:
+            callback(key)
+        except Exception as exc:
+            logger.error("Cache event handler failed for %s:%s: %s", topic, key, exc)
+
+
+def publish(db: Session, topic: str, key: str) -> None:
+    """
+    Record an invalidation event for other workers and dispatch it locally.
+    """
+    publish_many(db, topic, [key])
+
+
+def publish_many(db: Session, topic: str, keys: Iterable[str]) -> None:
+    """
+    Record several invalidation events in one transaction and dispatch them locally.
+    """
+    keys = list(keys)
+    origin = _origin()
+    try:
+        db.add_all([CacheEvent(topic=topic, key=key, origin=origin) for key in keys])
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        logger.error("Failed to publish cache events for %s: %s", topic, exc)
+    for key in keys:
+        _dispatch(topic, key)
+
+
+def route_key(station_from: str, station_to: str) -> str:
+    """Event key for a station pair."""
+    return f"{station_from}:{station_to}"
+
+
+def poll(db: Session, force: bool = False) -> int:
+    """
+    Dispatch events published by other processes since the last poll.
+    Polls at most once every settings.cache_event_poll_seconds unless force is set.
+    Returns:
+        int: Number of events dispatched
+    """
+    global _last_seen_id, _last_poll
+    now = time.monotonic()
+    if not force and now - _last_poll < settings.cache_event_poll_seconds:
+        return 0
+    if not _lock.acquire(blocking=False):
+        return 0
+    try:
+        _last_poll = now
+        if _last_seen_id is None:
+            # Start from the current head; earlier events predate this process's caches
+            _last_seen_id = db.query(func.max(CacheEvent.id)).scalar() or 0
+            return 0
+        events = (
+            db.query(CacheEvent)
+            .filter(CacheEvent.id > _last_seen_id)
+            .order_by(CacheEvent.id)
+            .all()
+        )
+        origin = _origin()
+        previous_id = _last_seen_id
+        dispatched = 0
+        for event in events:
+            _last_seen_id = event.id
+            if event.origin != origin:
+                _dispatch(event.topic, event.key)
+                dispatched += 1
+        if previous_id // EVENT_RETENTION != _last_seen_id // EVENT_RETENTION:
+            # Crossed a retention boundary: drop events every worker has long since seen
+            db.query(CacheEvent).filter(
+                CacheEvent.id <= _last_seen_id - EVENT_RETENTION
+            ).delete(synchronize_session=False)
+            db.commit()
+        return dispatched
+    except Exception as exc:
+        db.rollback()
+        logger.error("Failed to poll cache events: %s", exc)
+        return 0
+    finally:
+        _lock.release()
@@ -0,0 +1,137 @@
+"""
+Parallel batch routing.
+Once the timetable is in memory, journey queries are pure CPU, so batches are
+spread over a process pool. The RAPTOR trip arrays are built once in the parent
+and inherited by forked workers (copy-on-write, never written), so workers start
+without loading anything. Where fork is unavailable each worker maps the
+snapshot file itself and builds its own arrays.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, NamedTuple, Optional, Sequence
+
+from app.uk_train_schedule.raptor import RaptorJourney, RaptorTimetable
+from app.uk_train_schedule.snapshot import TimetableSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Default number of queries sent to a worker at a time
+DEFAULT_CHUNK_SIZE = 64
+
+
+class JourneyQuery(NamedTuple):
+    """One journey options query."""
+
+    origin: str
+    destination: str
+    start_minute: int
+    max_changes: int = 3
+
+
+# Per-process routing state, set in the parent before forking or by _init_worker
+_timetable: Optional[RaptorTimetable] = None
+_min_connection: Optional[Sequence[int]] = None
+
+
+def _init_worker(
+    snapshot_path: Optional[str], min_connection: Optional[Sequence[int]]
+) -> None:
+    global _timetable, _min_connection
+    if snapshot_path is not None:
+        with TimetableSnapshot(snapshot_path) as snapshot:
+            _timetable = RaptorTimetable(snapshot)
+        _min_connection = min_connection
+
+
+def _route(query: JourneyQuery) -> List[RaptorJourney]:
+    return _timetable.journeys(
+        query.origin,
+        query.destination,
+        query.start_minute,
+        query.max_changes,
+        _min_connection,
+    )
+
+
+def _route_batch(queries: List[JourneyQuery]) -> List[List[RaptorJourney]]:
+    return [_route(query) for query in queries]
+
+
+class RoutingExecutor:
+    """
+    Answer batches of journey queries across worker processes.
+    Results are returned in request order.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        workers: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        min_connection: Optional[Callable[[str], int]] = None,
+    ):
+        """
+        Args:
+            snapshot_path (str): Timetable snapshot to route over
+            workers (Optional[int]): Worker processes (default one per CPU)
+            chunk_size (int): Queries sent to a worker per task
+            min_connection (Optional[Callable[[str], int]]): Interchange minutes
+                for a station code, evaluated once per station here
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        with TimetableSnapshot(snapshot_path) as snapshot:
+            self.timetable = RaptorTimetable(snapshot)
+        self.min_connection = None
+        if min_connection is not None:
+            self.min_connection = [
+                min_connection(code) for code in self.timetable.stations
+            ]
+        self._fork = "fork" in multiprocessing.get_all_start_methods()
+        if self._fork:
+            context = multiprocessing.get_context("fork")
+            initargs = (None, None)
+        else:
+            context = multiprocessing.get_context()
+            initargs = (snapshot_path, self.min_connection)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=initargs,
+        )
+        logger.info(
+            "Routing executor started with %s workers over %s trips",
+            self.workers,
+            len(self.timetable),
+        )
+
+    def map(self, queries: Iterable[JourneyQuery]) -> List[List[RaptorJourney]]:
+        """
+        Route every query, chunk_size queries per task.
+        Returns:
+            List[List[RaptorJourney]]: Options for each query, in request order
+        """
+        global _timetable, _min_connection
+        if self._fork:
+            # Workers are forked on demand and inherit this state
+            _timetable, _min_connection = self.timetable, self.min_connection
+        queries = list(queries)
+        bounds = range(0, len(queries) + self.chunk_size, self.chunk_size)
+        chunks = [queries[start:end] for start, end in zip(bounds, bounds[1:])]
+        results: List[List[RaptorJourney]] = []
+        for batch in self._pool.map(_route_batch, chunks):
+            results.extend(batch)
+        return results
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+    def __enter__(self) -> "RoutingExecutor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,314 @@
+"""
+Precomputed station-to-station transfer graph.
+The graph is built offline from the timetable store: stations are nodes, and
+each directly served station pair is an edge weighted by its fastest scheduled
+ride (minutes). Edges are stored as CSR arrays together with an all-pairs table
+of shortest ride times, which is a lower bound on any real journey (waiting is
+never negative). The journey options planner uses the table to skip arrivals
+that cannot beat the best arrival found so far.
+The file layout mirrors the timetable snapshot and is memory-mapped read-only.
+TimetableBounds checks once per routed timetable that the graph is not older
+than its trips, so queries only read the bounds of the stations they reach.
+"""
+
+import heapq
+import logging
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from sqlalchemy.orm import Session
+
+from app.settings import settings
+from app.uk_train_schedule.raptor import RaptorTimetable
+from app.uk_train_schedule.store import get_store
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"UKTTGRPH"
+VERSION = 1
+# magic, version, nodes, edges, 5 section offsets (codes, indptr, indices, weights,
+# lower bounds) and the end of file
+_HEADER = struct.Struct("<8sIII6Q")
+STATION_CODE_SIZE = 4
+# Lower bound for station pairs with no path
+UNREACHABLE = 2**31 - 1
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def build_graph(db: Session, path: str) -> Tuple[int, int]:
+    """
+    Build the transfer graph from every ride in the timetable store and write it
+    to path.
+    Returns:
+        Tuple[int, int]: Number of stations and edges written
+    """
+    return write_graph(path, get_store().fastest_rides(db))
+
+
+def shortest_ride_times(
+    indptr: List[int], indices: List[int], weights: List[int]
+) -> array:
+    """
+    All-pairs shortest ride times over a CSR graph (one Dijkstra per source).
+    Returns:
+        array: Row-major n x n int32 table, UNREACHABLE where there is no path
+    """
+    n = len(indptr) - 1
+    table = array("i", [UNREACHABLE]) * (n * n)
+    for source in range(n):
+        row = source * n
+        table[row + source] = 0
+        heap = [(0, source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > table[row + node]:
+                continue
+            for edge in range(indptr[node], indptr[node + 1]):
+                target = indices[edge]
+                candidate = distance + weights[edge]
+                if candidate < table[row + target]:
+                    table[row + target] = candidate
+                    heapq.heappush(heap, (candidate, target))
+    return table
+
+
+def write_graph(path: str, edges) -> Tuple[int, int]:
+    """
+    Serialise (station_from, station_to, minutes) edges as CSR arrays plus the
+    lower-bound table.
+    """
+    codes = sorted({edge[0] for edge in edges} | {edge[1] for edge in edges})
+    index = {code: i for i, code in enumerate(codes)}
+    adjacency: List[Dict[int, int]] = [{} for _ in codes]
+    for station_from, station_to, minutes in edges:
+        if station_from == station_to:
+            continue
+        targets = adjacency[index[station_from]]
+        target = index[station_to]
+        targets[target] = min(minutes, targets.get(target, minutes))
+    indptr = [0]
+    indices: List[int] = []
+    weights: List[int] = []
+    for targets in adjacency:
+        for target in sorted(targets):
+            indices.append(target)
+            weights.append(targets[target])
+        indptr.append(len(indices))
+    lower_bounds = shortest_ride_times(indptr, indices, weights)
+
+    sections = [
+        b"".join(
+            code.encode("ascii").ljust(STATION_CODE_SIZE, b"\0") for code in codes
+        ),
+        array("i", indptr).tobytes(),
+        array("i", indices).tobytes(),
+        array("i", weights).tobytes(),
+        lower_bounds.tobytes(),
+    ]
+    offsets = []
+    position = _align(_HEADER.size)
+    for section in sections:
+        offsets.append(position)
+        position = _align(position + len(section))
+    offsets.append(position)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(_HEADER.pack(MAGIC, VERSION, len(codes), len(indices), *offsets))
+        for offset, section in zip(offsets, sections):
+            fh.seek(offset)
+            fh.write(section)
+        fh.truncate(position)
+    os.replace(tmp_path, path)
+    logger.info(
+        "Wrote transfer graph %s with %s stations and %s edges",
+        path,
+        len(codes),
+        len(indices),
+    )
+    return len(codes), len(indices)
+
+
+class TransferGraph:
+    """
+    Read-only view over a memory-mapped transfer graph file.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, nodes, edges, *offsets = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {VERSION} transfer graph")
+        self.path = path
+        self.station_count = nodes
+        self.edge_count = edges
+        self._view = view = memoryview(self._mmap)
+        # Each section runs from its offset to the next one
+        codes, indptr, indices, weights, lower_bounds = (
+            view[start:end] for start, end in zip(offsets, offsets[1:])
+        )
+        self._station_codes = codes
+        self.indptr = indptr.cast("i")
+        self.indices = indices.cast("i")
+        self.weights = weights.cast("i")
+        self._lower_bounds = lower_bounds.cast("i")
+
+    def __enter__(self) -> "TransferGraph":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for view in (
+            self._station_codes,
+            self.indptr,
+            self.indices,
+            self.weights,
+            self._lower_bounds,
+            self._view,
+        ):
+            view.release()
+        self._mmap.close()
+
+    def station_code(self, index: int) -> str:
+        start, end = index * STATION_CODE_SIZE, (index + 1) * STATION_CODE_SIZE
+        raw = bytes(self._station_codes[start:end])
+        return raw.rstrip(b"\0").decode("ascii")
+
+    def station_index(self, code: str) -> Optional[int]:
+        """Binary search the sorted station table; None if the code is absent."""
+        index = bisect_left(range(self.station_count), code, key=self.station_code)
+        if index < self.station_count and self.station_code(index) == code:
+            return index
+        return None
+
+    def neighbours(self, index: int) -> List[Tuple[int, int]]:
+        """(station index, fastest ride minutes) for each station served directly."""
+        return [
+            (self.indices[edge], self.weights[edge])
+            for edge in range(self.indptr[index], self.indptr[index + 1])
+        ]
+
+    def lower_bound(self, source: int, target: int) -> int:
+        """Shortest possible ride time in minutes (UNREACHABLE if no path)."""
+        return self._lower_bounds[source * self.station_count + target]
+
+    def lower_bounds_to(self, target: int) -> array:
+        """
+        Lower bounds from every station to target, as an array indexed by station
+        (one column of the table, extracted once per query).
+        """
+        n = self.station_count
+        return array("i", self._lower_bounds[target::n])
+
+
+_graph: Optional[TransferGraph] = None
+
+
+def get_graph() -> Optional[TransferGraph]:
+    """
+    Return the process-wide transfer graph mapped from settings.graph_path, or None
+    if it has not been built.
+    """
+    global _graph
+    if _graph is None and os.path.exists(settings.graph_path):
+        try:
+            _graph = TransferGraph(settings.graph_path)
+            logger.info(
+                "Mapped transfer graph %s (%s stations)",
+                settings.graph_path,
+                _graph.station_count,
+            )
+        except (OSError, ValueError, struct.error) as exc:
+            logger.error(
+                "Failed to map transfer graph %s: %s", settings.graph_path, exc
+            )
+    return _graph
+
+
+class StationBounds:
+    """
+    Lower bounds to one graph node, indexed like a timetable's stations and read
+    from the graph's table on demand (0 for stations the graph does not know).
+    """
+
+    __slots__ = ("_graph", "_nodes", "_target")
+
+    def __init__(self, graph: TransferGraph, nodes: array, target: int):
+        self._graph = graph
+        self._nodes = nodes
+        self._target = target
+
+    def __getitem__(self, station: int) -> int:
+        node = self._nodes[station]
+        return 0 if node < 0 else self._graph.lower_bound(node, self._target)
+
+
+class TimetableBounds:
+    """
+    The graph's view of a RaptorTimetable: the graph node of each of its
+    stations (-1 if unknown), and whether the graph's bounds are admissible for
+    its trips. They are when no segment rides faster than the graph's shortest
+    ride between its stations: a bound then never exceeds a segment's ride plus
+    the bound at its end, whatever the destination. A graph built before faster
+    trips were cached fails this.
+    """
+
+    def __init__(self, graph: TransferGraph, timetable: RaptorTimetable):
+        self.graph = graph
+        self.nodes = array("i")
+        for code in timetable.stations:
+            node = graph.station_index(code)
+            self.nodes.append(-1 if node is None else node)
+        nodes = self.nodes
+        self.admissible = all(
+            nodes[stop] < 0
+            or (
+                nodes[following] >= 0
+                and graph.lower_bound(nodes[stop], nodes[following]) <= ride
+            )
+            for stop, following, ride in timetable.segments
+        )
+
+    def to(self, destination: str) -> Optional[StationBounds]:
+        """Bounds to destination, or None when they cannot be used."""
+        target = self.graph.station_index(destination)
+        if not self.admissible or target is None:
+            return None
+        return StationBounds(self.graph, self.nodes, target)
+
+
+_timetable_bounds: "WeakKeyDictionary[RaptorTimetable, TimetableBounds]" = (
+    WeakKeyDictionary()
+)
+
+
+def timetable_bounds(
+    graph: TransferGraph, timetable: RaptorTimetable
+) -> TimetableBounds:
+    """
+    TimetableBounds for timetable, computed once per graph and timetable (a
+    snapshot generation's timetable is checked once, not per query).
+    """
+    bounds = _timetable_bounds.get(timetable)
+    if bounds is None or bounds.graph is not graph:
+        bounds = _timetable_bounds[timetable] = TimetableBounds(graph, timetable)
+        if not bounds.admissible:
+            logger.info(
+                "Transfer graph %s overestimates rides in a timetable of %s trips; "
+                "not pruning with it",
+                graph.path,
+                len(timetable),
+            )
+    return bounds
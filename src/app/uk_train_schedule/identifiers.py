@@ -0,0 +1,104 @@
+"""
+In-memory dictionaries mapping station codes and service identifiers to the
+small integer keys stored in timetable_entries.
+Keys never change once assigned, so cached mappings are never invalidated.
+"""
+
+import threading
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.uk_train_schedule.models import Service, Station
+from database.dialects import insert_ignore
+
+
+class IdentifierCache:
+    """
+    Thread-safe code <-> key cache backed by a dimension table with (id, code) columns.
+    """
+
+    def __init__(self, model):
+        self._model = model
+        self._keys: Dict[str, int] = {}
+        self._codes: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, code: str, key: int) -> None:
+        with self._lock:
+            self._keys[code] = key
+            self._codes[key] = code
+
+    def key(self, db: Session, code: str, create: bool = True) -> Optional[int]:
+        """
+        Return the key for a code, inserting it into the dimension table if new.
+        With create=False, unknown codes return None.
+        """
+        key = self._keys.get(code)
+        if key is not None:
+            return key
+        return self.keys(db, [code], create).get(code)
+
+    def keys(
+        self, db: Session, codes: Iterable[str], create: bool = True
+    ) -> Dict[str, int]:
+        """
+        Resolve many codes with at most one insert and one select.
+        New codes are inserted and committed before being cached, so a later
+        rollback of the caller's work cannot leave a cached key without its row.
+        Unknown codes are omitted from the result when create is False.
+        """
+        result = {}
+        missing = set()
+        for code in codes:
+            key = self._keys.get(code)
+            if key is None:
+                missing.add(code)
+            else:
+                result[code] = key
+        if not missing:
+            return result
+        if create:
+            insert_ignore(
+                db, self._model.__table__, [{"code": code} for code in missing]
+            )
+            db.commit()
+        rows = (
+            db.query(self._model.id, self._model.code)
+            .filter(self._model.code.in_(missing))
+            .all()
+        )
+        for key, code in rows:
+            self._remember(code, key)
+            result[code] = key
+        return result
+
+    def code(self, db: Optional[Session], key: int) -> str:
+        """
+        Return the code for a key.
+        Raises:
+            KeyError: If the key is unknown and no session is available to look it up.
+        """
+        code = self._codes.get(key)
+        if code is not None:
+            return code
+        if db is not None:
+            code = db.query(self._model.code).filter(self._model.id == key).scalar()
+            if code is not None:
+                self._remember(code, key)
+                return code
+        raise KeyError(f"Unknown {self._model.__tablename__} key: {key}")
+
+    def preload(self, db: Session) -> None:
+        """Load the whole dimension table (used before bulk reads such as exports)."""
+        for key, code in db.query(self._model.id, self._model.code):
+            self._remember(code, key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+            self._codes.clear()
+
+
+stations = IdentifierCache(Station)
+services = IdentifierCache(Service)
@@ -0,0 +1,292 @@
+"""
+Write-behind ingestion of fetched timetable data.
+A cache-miss request parses the upstream response, plans over the rows in memory
+and hands them to WriteBehindQueue. A background thread drains the bounded queue,
+coalescing queued fetches into one store upsert, then records their coverage and
+departure rates and publishes route events. Coverage is only marked after the
+rows are written, so a window never looks cached before its rows are readable.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from queue import Empty, Full, Queue
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import deadline
+from app.settings import settings
+from app.uk_train_schedule import events
+from app.uk_train_schedule.crud import record_departure_rate
+from app.uk_train_schedule.store import StoredConnection, get_store
+
+logger = logging.getLogger(__name__)
+
+
+class FetchBatch(NamedTuple):
+    """
+    The rows of one upstream fetch and the window it covers.
+    - covered_end_minute: Last departure minute covered, or None if the fetch's
+      coverage should not be recorded
+    - departure_count: Departures returned upstream, for the observed rate
+    """
+
+    station_from: str
+    station_to: Optional[str]
+    rows: List[StoredConnection]
+    window_start_minute: Optional[int]
+    covered_end_minute: Optional[int]
+    departure_count: int
+
+
+def write_batches(db: Session, batches: Sequence[FetchBatch]) -> int:
+    """
+    Write fetched batches: all rows in one upsert, then each batch's coverage and
+    departure rate, then one route event per route touched. Runs without a
+    request deadline: the rows have already been fetched, and a write cut short
+    would only have to be fetched again.
+    Returns:
+        int: Rows inserted (-1 if the driver cannot tell)
+    """
+    with deadline.use(None):
+        return _write_batches(db, batches)
+
+
+def _write_batches(db: Session, batches: Sequence[FetchBatch]) -> int:
+    store = get_store()
+    rows = [row for batch in batches for row in batch.rows]
+    inserted = store.upsert(db, rows)
+    for batch in batches:
+        if batch.window_start_minute is None or batch.covered_end_minute is None:
+            continue
+        store.mark_covered(
+            db,
+            batch.station_from,
+            batch.station_to,
+            batch.window_start_minute,
+            batch.covered_end_minute,
+        )
+        covered_minutes = batch.covered_end_minute - batch.window_start_minute
+        if covered_minutes > 0:
+            record_departure_rate(
+                db,
+                batch.station_from,
+                batch.station_to,
+                batch.departure_count * 60 / covered_minutes,
+            )
+    if inserted:
+        # Publish every route written; upserts do not report rows per route
+        routes = {events.route_key(row.station_from, row.station_to) for row in rows}
+        events.publish_many(db, events.ROUTE_TOPIC, sorted(routes))
+    return inserted
+
+
+class IngestStats(NamedTuple):
+    """Counters for the write-behind queue since the process started."""
+
+    queued_batches: int
+    max_queued_batches: int
+    submitted_batches: int
+    written_batches: int
+    written_rows: int
+    writes: int
+    failed_batches: int
+    inline_batches: int
+    last_write_ms: float
+
+
+class _Pending(NamedTuple):
+    bind: Engine
+    batch: FetchBatch
+    done: threading.Event
+
+
+class WriteBehindQueue:
+    """
+    Bounded queue of fetched batches drained by one writer thread.
+    submit() blocks for at most put_timeout seconds when the queue is full
+    (backpressure); if still full, the batch is written on the caller's thread.
+    Batches are written through a session on the submitting session's engine.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        max_batch_rows: int = 5000,
+        put_timeout: float = 5.0,
+    ):
+        self.max_batch_rows = max_batch_rows
+        self.put_timeout = put_timeout
+        self._queue: "Queue[Optional[_Pending]]" = Queue(maxsize)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._counters: Dict[str, float] = defaultdict(int)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="timetable-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def submit(self, db: Session, batch: FetchBatch) -> threading.Event:
+        """
+        Queue a batch for writing. Returns an event set once it has been written
+        (or has failed; failures are logged).
+        """
+        pending = _Pending(db.get_bind(), batch, threading.Event())
+        self._count("submitted_batches")
+        self._ensure_started()
+        try:
+            self._queue.put(pending, timeout=self.put_timeout)
+        except Full:
+            logger.warning(
+                "Timetable write queue full; writing %s->%s inline",
+                batch.station_from,
+                batch.station_to or "all",
+            )
+            self._count("inline_batches")
+            self._write([pending])
+            return pending.done
+        with self._lock:
+            self._counters["max_queued_batches"] = max(
+                self._counters["max_queued_batches"], self._queue.qsize()
+            )
+        return pending.done
+
+    def _take(self) -> Optional[List[_Pending]]:
+        """
+        Block for the next batch, then coalesce whatever else is queued up to
+        max_batch_rows. Returns None when asked to stop.
+        """
+        first = self._queue.get()
+        if first is None:
+            self._queue.task_done()
+            return None
+        taken = [first]
+        rows = len(first.batch.rows)
+        while rows < self.max_batch_rows:
+            try:
+                pending = self._queue.get_nowait()
+            except Empty:
+                break
+            if pending is None:
+                # Put the stop marker back for the next _take
+                self._queue.task_done()
+                self._queue.put(None)
+                break
+            taken.append(pending)
+            rows += len(pending.batch.rows)
+        return taken
+
+    def _run(self) -> None:
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            try:
+                by_bind: Dict[Engine, List[_Pending]] = defaultdict(list)
+                for pending in taken:
+                    by_bind[pending.bind].append(pending)
+                for group in by_bind.values():
+                    self._write(group)
+            finally:
+                for _ in taken:
+                    self._queue.task_done()
+
+    def _write(self, group: List[_Pending]) -> None:
+        started = time.perf_counter()
+        db = sessionmaker(bind=group[0].bind)()
+        try:
+            inserted = write_batches(db, [pending.batch for pending in group])
+            self._count("written_batches", len(group))
+            self._count("written_rows", max(inserted, 0))
+            self._count("writes")
+        except Exception as exc:
+            db.rollback()
+            self._count("failed_batches", len(group))
+            logger.error("Failed writing %s timetable batches: %s", len(group), exc)
+        finally:
+            db.close()
+            with self._lock:
+                self._counters["last_write_ms"] = (time.perf_counter() - started) * 1000
+            for pending in group:
+                pending.done.set()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued batch has been written. Returns False on timeout.
+        """
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Write out everything queued and stop the writer thread.
+        Returns False if the queue could not be drained within timeout.
+        """
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return True
+        self._queue.put(None)
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def stats(self) -> IngestStats:
+        with self._lock:
+            counters = dict(self._counters)
+        return IngestStats(
+            queued_batches=self._queue.qsize(),
+            max_queued_batches=int(counters.get("max_queued_batches", 0)),
+            submitted_batches=int(counters.get("submitted_batches", 0)),
+            written_batches=int(counters.get("written_batches", 0)),
+            written_rows=int(counters.get("written_rows", 0)),
+            writes=int(counters.get("writes", 0)),
+            failed_batches=int(counters.get("failed_batches", 0)),
+            inline_batches=int(counters.get("inline_batches", 0)),
+            last_write_ms=round(counters.get("last_write_ms", 0.0), 3),
+        )
+
+
+_ingest_queue: Optional[WriteBehindQueue] = None
+_ingest_lock = threading.Lock()
+
+
+def get_ingest_queue() -> WriteBehindQueue:
+    """Return the process-wide write-behind queue."""
+    global _ingest_queue
+    if _ingest_queue is None:
+        with _ingest_lock:
+            if _ingest_queue is None:
+                _ingest_queue = WriteBehindQueue(
+                    settings.ingest_queue_size,
+                    settings.ingest_max_batch_rows,
+                    settings.ingest_put_timeout_seconds,
+                )
+    return _ingest_queue
+
+
+def _reset_after_fork() -> None:
+    # The writer thread does not survive fork; workers start their own queue
+    global _ingest_queue
+    _ingest_queue = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,79 @@
+"""
+Per-station minimum connection times, held in memory as an array indexed by
+station key so the routing engine can check a change of train in O(1).
+"""
+
+import threading
+from array import array
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.settings import settings
+from app.uk_train_schedule import events
+from app.uk_train_schedule.identifiers import stations
+from app.uk_train_schedule.models import InterchangeTime
+
+
+class InterchangeTimes:
+    """
+    Thread-safe cache of the interchange_times table.
+    The whole table is loaded on first use; stations without a row, including
+    stations added since the load, get the default.
+    """
+
+    def __init__(self, default: int):
+        self.default = default
+        self._minutes: Optional[array] = None
+        self._lock = threading.Lock()
+
+    def minutes_by_key(self, db: Session) -> array:
+        """
+        Minimum connection minutes indexed by station key (out-of-range keys use
+        the default).
+        """
+        minutes = self._minutes
+        if minutes is None:
+            with self._lock:
+                if self._minutes is None:
+                    rows = db.query(
+                        InterchangeTime.station_key, InterchangeTime.minutes
+                    ).all()
+                    size = max((key for key, _ in rows), default=0) + 1
+                    table = array("i", [self.default]) * size
+                    for key, value in rows:
+                        table[key] = value
+                    self._minutes = table
+                minutes = self._minutes
+        return minutes
+
+    def minutes(self, db: Session, station_key: Optional[int]) -> int:
+        """Minimum connection time at a station (the default for unknown keys)."""
+        table = self.minutes_by_key(db)
+        if station_key is None or station_key >= len(table):
+            return self.default
+        return table[station_key]
+
+    def set(self, db: Session, station_code: str, minutes: int) -> None:
+        """
+        Store a station's minimum connection time. Every worker reloads the table
+        on next use.
+        """
+        station_key = stations.key(db, station_code)
+        updated = (
+            db.query(InterchangeTime)
+            .filter(InterchangeTime.station_key == station_key)
+            .update({InterchangeTime.minutes: minutes})
+        )
+        if not updated:
+            db.add(InterchangeTime(station_key=station_key, minutes=minutes))
+        db.commit()
+        events.publish(db, events.INTERCHANGE_TOPIC, station_code)
+
+    def clear(self, *_) -> None:
+        with self._lock:
+            self._minutes = None
+
+
+interchange_times = InterchangeTimes(settings.min_connection_minutes)
+events.subscribe(events.INTERCHANGE_TOPIC, interchange_times.clear)
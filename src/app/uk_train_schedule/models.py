@@ -1,66 +1,280 @@
 """
-Defines TimetableEntry and related utilities.
+Defines TimetableEntry, ServiceRun, the station and service dimension tables, and related utilities.
 """
 
+from datetime import datetime
+
 from sqlalchemy import (
     Column,
-    DateTime,
+    Float,
+    ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     UniqueConstraint,
     create_engine,
 )
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import declarative_base, object_session
+
+from app.uk_train_schedule.timeconv import from_epoch_minute, to_epoch_minute
 
 Base = declarative_base()
 
 
+class Station(Base):
+    """
+    Station dimension: maps a station code to a small integer key.
+    - code: Three-letter station code
+    """
+
+    __tablename__ = "stations"
+    id = Column(Integer, primary_key=True, doc="Primary key")
+    code = Column(String, nullable=False, unique=True, doc="Station code")
+
+
+class Service(Base):
+    """
+    Service dimension: maps a TransportAPI service identifier to a small integer key.
+    - code: TransportAPI service identifier
+    """
+
+    __tablename__ = "services"
+    id = Column(Integer, primary_key=True, doc="Primary key")
+    code = Column(String, nullable=False, unique=True, doc="Service identifier")
+
+
 class TimetableEntry(Base):
     """
     Represents a single train journey between two stations.
     Each entry is uniquely identified by its id.
-    - service_id: Unique identifier for the train service
-    - station_from: Departure station code
-    - station_to: Arrival station code
-    - aimed_departure_time: Scheduled departure time in UTC
-    - aimed_arrival_time: Scheduled arrival time in UTC
+    - service_key: Key of the train service (services.id)
+    - station_from_key: Key of the departure station (stations.id)
+    - station_to_key: Key of the arrival station (stations.id)
+    - departure_minute: Scheduled departure time in minutes since the Unix epoch (UTC)
+    - arrival_minute: Scheduled arrival time in minutes since the Unix epoch (UTC)
+    service_id, station_from and station_to resolve the keys back to codes, and
+    aimed_departure_time and aimed_arrival_time expose the times as aware UTC
+    datetimes, for callers that need them.
     """
 
     __tablename__ = "timetable_entries"
     __table_args__ = (
         UniqueConstraint(
-            "service_id",
-            "station_from",
-            "station_to",
-            "aimed_departure_time",
+            "service_key",
+            "station_from_key",
+            "station_to_key",
+            "departure_minute",
             name="uix_service_station_departure_time",
         ),
+        Index(
+            "ix_timetable_route_departure",
+            "station_from_key",
+            "station_to_key",
+            "departure_minute",
+        ),
+        Index("ix_timetable_departure_board", "station_from_key", "departure_minute"),
+        Index("ix_timetable_departure", "departure_minute"),
     )
     id = Column(Integer, primary_key=True, doc="Primary key")
-    service_id = Column(
-        String,
-        nullable=False,
-        doc="Unique identifier for the train service",
+    service_key = Column(
+        Integer, ForeignKey("services.id"), nullable=False, doc="Train service key"
+    )
+    station_from_key = Column(
+        Integer, ForeignKey("stations.id"), nullable=False, doc="Departure station key"
+    )
+    station_to_key = Column(
+        Integer, ForeignKey("stations.id"), nullable=False, doc="Arrival station key"
+    )
+    departure_minute = Column(
+        Integer, nullable=False, doc="Scheduled departure time in epoch minutes (UTC)"
     )
+    arrival_minute = Column(
+        Integer, nullable=False, doc="Scheduled arrival time in epoch minutes (UTC)"
+    )
+
+    @property
+    def service_id(self) -> str:
+        """TransportAPI service identifier."""
+        from app.uk_train_schedule.identifiers import services
+
+        return services.code(object_session(self), self.service_key)
+
+    @property
+    def station_from(self) -> str:
+        """Departure station code."""
+        from app.uk_train_schedule.identifiers import stations
+
+        return stations.code(object_session(self), self.station_from_key)
+
+    @property
+    def station_to(self) -> str:
+        """Arrival station code."""
+        from app.uk_train_schedule.identifiers import stations
+
+        return stations.code(object_session(self), self.station_to_key)
+
+    @property
+    def aimed_departure_time(self) -> datetime:
+        """Scheduled departure time as an aware UTC datetime."""
+        return from_epoch_minute(self.departure_minute)
+
+    @aimed_departure_time.setter
+    def aimed_departure_time(self, value: datetime | int) -> None:
+        self.departure_minute = to_epoch_minute(value)
+
+    @property
+    def aimed_arrival_time(self) -> datetime:
+        """Scheduled arrival time as an aware UTC datetime."""
+        return from_epoch_minute(self.arrival_minute)
+
+    @aimed_arrival_time.setter
+    def aimed_arrival_time(self, value: datetime | int) -> None:
+        self.arrival_minute = to_epoch_minute(value)
+
+
+class ServiceRun(Base):
+    """
+    One run of a train service and its calling pattern, for the "services"
+    timetable store.
+    - service_key: Key of the train service (services.id)
+    - first_minute: Earliest known time at any stop (epoch minutes, UTC)
+    - last_minute: Latest known time at any stop (epoch minutes, UTC)
+    - last_departure_minute: Latest known departure (epoch minutes, UTC)
+    - stops: Ordered station keys and delta-encoded times (see service_runs)
+    """
+
+    __tablename__ = "service_runs"
+    __table_args__ = (
+        Index("ix_service_runs_service", "service_key", "first_minute"),
+        Index("ix_service_runs_last_departure", "last_departure_minute"),
+    )
+    id = Column(Integer, primary_key=True, doc="Primary key")
+    service_key = Column(
+        Integer, ForeignKey("services.id"), nullable=False, doc="Train service key"
+    )
+    first_minute = Column(Integer, nullable=False, doc="Earliest time (epoch minutes)")
+    last_minute = Column(Integer, nullable=False, doc="Latest time (epoch minutes)")
+    last_departure_minute = Column(
+        Integer, nullable=False, doc="Latest departure (epoch minutes)"
+    )
+    stops = Column(LargeBinary, nullable=False, doc="Encoded calling pattern")
+
+
+class ServiceStop(Base):
+    """
+    Inverted index of service_runs: a station's position in a run, with the
+    times known there. A time is null where TransportAPI has not reported it
+    (departures are only known at stations whose board was fetched).
+    - run_id: Run (service_runs.id)
+    - station_key: Key of the station (stations.id)
+    - position: Index of the stop in the run's calling pattern
+    - arrival_minute: Scheduled arrival in epoch minutes (UTC), if known
+    - departure_minute: Scheduled departure in epoch minutes (UTC), if known
+    """
+
+    __tablename__ = "service_stops"
+    __table_args__ = (
+        Index("ix_service_stops_departure", "station_key", "departure_minute"),
+        Index("ix_service_stops_departure_minute", "departure_minute"),
+        Index("ix_service_stops_run", "run_id", "station_key"),
+    )
+    id = Column(Integer, primary_key=True, doc="Primary key")
+    run_id = Column(
+        Integer, ForeignKey("service_runs.id"), nullable=False, doc="Run id"
+    )
+    station_key = Column(
+        Integer, ForeignKey("stations.id"), nullable=False, doc="Station key"
+    )
+    position = Column(Integer, nullable=False, doc="Stop index within the run")
+    arrival_minute = Column(Integer, doc="Scheduled arrival (epoch minutes)")
+    departure_minute = Column(Integer, doc="Scheduled departure (epoch minutes)")
+
+
+class CacheEvent(Base):
+    """
+    Cache invalidation notice shared between worker processes.
+    Rows are append-only; each worker polls for ids it has not seen yet.
+    - topic: Kind of cached data affected (e.g. "route")
+    - key: Identifier within the topic (e.g. "LBG:SAJ")
+    - origin: Publishing process ("hostname:pid")
+    """
+
+    __tablename__ = "cache_events"
+    id = Column(Integer, primary_key=True, autoincrement=True, doc="Primary key")
+    topic = Column(String, nullable=False, doc="Kind of cached data affected")
+    key = Column(String, nullable=False, doc="Identifier within the topic")
+    origin = Column(String, nullable=False, doc="Publishing process")
+
+
+class FetchCoverage(Base):
+    """
+    A departure window already fetched from TransportAPI and stored.
+    - station_from: Departure station code
+    - calling_at: Calling-point filter used for the fetch ("" when unfiltered)
+    - start_minute: First departure minute covered (epoch minutes, UTC)
+    - end_minute: Last departure minute covered (epoch minutes, UTC)
+    """
+
+    __tablename__ = "fetch_coverage"
+    __table_args__ = (
+        Index("ix_fetch_coverage_lookup", "station_from", "calling_at", "start_minute"),
+    )
+    id = Column(Integer, primary_key=True, doc="Primary key")
     station_from = Column(String, nullable=False, doc="Departure station code")
-    station_to = Column(String, nullable=False, doc="Arrival station code")
-    aimed_departure_time = Column(
-        DateTime(timezone=True), nullable=False, doc="Scheduled departure time in UTC"
+    calling_at = Column(String, nullable=False, default="", doc="Calling-point filter")
+    start_minute = Column(Integer, nullable=False, doc="Window start (epoch minutes)")
+    end_minute = Column(Integer, nullable=False, doc="Window end (epoch minutes)")
+
+
+class DepartureRate(Base):
+    """
+    Observed departures per hour for an upstream fetch key, used to size fetches.
+    - station_from: Departure station code
+    - calling_at: Calling-point filter ("" when unfiltered)
+    - departures_per_hour: Exponentially weighted average of observed rates
+    - samples: Number of fetches observed
+    """
+
+    __tablename__ = "departure_rates"
+    station_from = Column(String, primary_key=True, doc="Departure station code")
+    calling_at = Column(
+        String, primary_key=True, default="", doc="Calling-point filter"
     )
-    aimed_arrival_time = Column(
-        DateTime(timezone=True), nullable=False, doc="Scheduled arrival time in UTC"
+    departures_per_hour = Column(Float, nullable=False, doc="Average departures/hour")
+    samples = Column(Integer, nullable=False, default=0, doc="Fetches observed")
+
+
+class InterchangeTime(Base):
+    """
+    Minimum connection time between different trains at a station.
+    Stations without a row use settings.min_connection_minutes.
+    - station_key: Key of the station (stations.id)
+    - minutes: Minimum minutes between arriving and departing on another service
+    """
+
+    __tablename__ = "interchange_times"
+    station_key = Column(
+        Integer, ForeignKey("stations.id"), primary_key=True, doc="Station key"
     )
+    minutes = Column(Integer, nullable=False, doc="Minimum connection time (minutes)")
 
 
-def create_all_tables(db_url=None):
+def create_all_tables(db_url=None, reset: bool = False):
     """
-    Create all tables in the database if they do not exist
+    Create all tables in the database if they do not exist.
+    Uses the shared application engine unless db_url is given.
+    With reset, existing tables are dropped first (the timetable cache is rebuilt
+    from TransportAPI on demand).
     """
     if db_url is None:
-        from app.settings import settings
+        from database.session import get_engine
 
-        db_url = settings.db_url
-    engine = create_engine(db_url)
+        engine = get_engine()
+    else:
+        engine = create_engine(db_url)
+    if reset:
+        Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)
 
 
@@ -0,0 +1,167 @@
+"""
+Query plan regression checks for the data access layer.
+Each PlanCase runs one crud (or service_runs) read against a populated database
+with parameters taken from its data, and names the indexes its plan must use.
+check_query_plans times the case, captures the statements it issues and
+explains them; a case fails when a statement reads a table in full or an
+expected index is missing from the plans, e.g. after an ORM change or a
+dropped index turned an index lookup into a scan.
+"""
+
+import statistics
+import time
+from typing import Any, Callable, FrozenSet, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.uk_train_schedule import crud, service_runs
+from app.uk_train_schedule.identifiers import services, stations
+from app.uk_train_schedule.models import TimetableEntry
+from database.query_plans import capture_statements, explain, full_scans, indexes_used
+
+
+class PlanSample(NamedTuple):
+    """Query parameters taken from the data, so lookups find rows."""
+
+    station_from: str
+    station_to: str
+    minute: int
+
+
+class PlanCase(NamedTuple):
+    name: str
+    run: Callable[[Session, PlanSample], Any]
+    indexes: FrozenSet[str]
+
+
+class PlanReport(NamedTuple):
+    name: str
+    plan: List[str]
+    indexes: FrozenSet[str]
+    missing: FrozenSet[str]
+    full_scans: FrozenSet[str]
+    median_ms: float
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.plan) and not self.missing and not self.full_scans
+
+
+PLAN_CASES: Sequence[PlanCase] = (
+    PlanCase(
+        "get_earliest_timetable_entry",
+        lambda db, s: crud.get_earliest_timetable_entry(
+            db, s.station_from, s.station_to, s.minute
+        ),
+        frozenset({"ix_timetable_route_departure"}),
+    ),
+    PlanCase(
+        "get_connections_in_window",
+        lambda db, s: crud.get_connections_in_window(
+            db, s.station_from, s.station_to, s.minute, s.minute + 120
+        ),
+        frozenset({"ix_timetable_route_departure"}),
+    ),
+    PlanCase(
+        "get_connections_departing",
+        lambda db, s: crud.get_connections_departing(db, s.minute, s.minute + 60),
+        frozenset({"ix_timetable_departure"}),
+    ),
+    PlanCase(
+        "get_departures",
+        lambda db, s: crud.get_departures(db, s.station_from, s.minute),
+        frozenset({"ix_timetable_departure_board"}),
+    ),
+    PlanCase(
+        "get_departures_page",
+        lambda db, s: crud.get_departures(db, s.station_from, s.minute, 1),
+        frozenset({"ix_timetable_departure_board"}),
+    ),
+    PlanCase(
+        "get_departures_calling_at",
+        lambda db, s: crud.get_departures(
+            db, s.station_from, s.minute, calling_at=s.station_to
+        ),
+        frozenset({"ix_timetable_route_departure"}),
+    ),
+    PlanCase(
+        "is_window_covered",
+        lambda db, s: crud.is_window_covered(
+            db, s.station_from, s.station_to, s.minute, s.minute + 60
+        ),
+        frozenset({"ix_fetch_coverage_lookup"}),
+    ),
+    PlanCase(
+        "get_departure_rate",
+        lambda db, s: crud.get_departure_rate(db, s.station_from, s.station_to),
+        frozenset(),
+    ),
+    PlanCase(
+        "service_runs.get_connections_in_window",
+        lambda db, s: service_runs.get_connections_in_window(
+            db, s.station_from, s.station_to, s.minute, s.minute + 120
+        ),
+        frozenset({"ix_service_stops_departure", "ix_service_stops_run"}),
+    ),
+    PlanCase(
+        "service_runs.get_connections_departing",
+        lambda db, s: service_runs.get_connections_departing(
+            db, s.minute, s.minute + 60
+        ),
+        frozenset({"ix_service_stops_departure_minute", "ix_service_stops_run"}),
+    ),
+    PlanCase(
+        "service_runs.get_departures",
+        lambda db, s: service_runs.get_departures(db, s.station_from, s.minute),
+        frozenset({"ix_service_stops_departure", "ix_service_stops_run"}),
+    ),
+)
+
+
+def plan_sample(db: Session) -> PlanSample:
+    """
+    Parameters for the cases: the route and departure of a stored entry.
+    Raises:
+        ValueError: If timetable_entries is empty.
+    """
+    entry = db.query(TimetableEntry).order_by(TimetableEntry.id).first()
+    if entry is None:
+        raise ValueError("No timetable entries to check query plans against")
+    return PlanSample(entry.station_from, entry.station_to, entry.departure_minute)
+
+
+def check_query_plans(
+    db: Session,
+    cases: Sequence[PlanCase] = PLAN_CASES,
+    sample: Optional[PlanSample] = None,
+    repeat: int = 5,
+) -> List[PlanReport]:
+    """
+    Run, time and explain each case. Identifier caches are preloaded first so
+    only the query under test is captured; latency is the median of repeat runs.
+    """
+    sample = sample or plan_sample(db)
+    stations.preload(db)
+    services.preload(db)
+    reports = []
+    for case in cases:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            case.run(db, sample)
+            timings.append((time.perf_counter() - started) * 1000)
+        with capture_statements(db) as statements:
+            case.run(db, sample)
+        plan = [line for statement in statements for line in explain(db, statement)]
+        used = indexes_used(plan)
+        reports.append(
+            PlanReport(
+                case.name,
+                plan,
+                frozenset(used),
+                case.indexes - used,
+                frozenset(full_scans(plan)),
+                round(statistics.median(timings), 3),
+            )
+        )
+    return reports
@@ -0,0 +1,274 @@
+"""
+RAPTOR (round-based public transit routing) over flat trip arrays.
+Connections are grouped into trips (one per run of a service) and trips with
+the same stop sequence into routes. Round k finds the earliest arrivals using k trains,
+so the rounds that improve the destination arrival give the Pareto-optimal
+journeys for (arrival time, number of changes). Lower bounds on the ride time
+to the destination (e.g. from the transfer graph) prune arrivals that cannot
+beat the best destination arrival found so far.
+Stations and services are opaque ids: the caller decides whether they are codes,
+database keys or snapshot indices.
+"""
+
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from functools import cached_property
+from typing import (
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from app.uk_train_schedule.service_runs import MAX_DWELL_MINUTES
+
+INFINITY = 2**31 - 1
+
+
+class RaptorLeg(NamedTuple):
+    """One train ridden on a journey, times in epoch minutes (UTC)."""
+
+    station_from: Hashable
+    station_to: Hashable
+    service: Hashable
+    departure_minute: int
+    arrival_minute: int
+
+
+class RaptorJourney(NamedTuple):
+    """A Pareto-optimal journey."""
+
+    arrival_minute: int
+    changes: int
+    legs: List[RaptorLeg]
+
+
+class RaptorTimetable:
+    """
+    Route-grouped trip arrays.
+    - route_stops[route_stop_offsets[r]:route_stop_offsets[r + 1]]: stops of route r
+    - trips of route r are route_trip_offsets[r] .. route_trip_offsets[r + 1] - 1,
+      sorted by departure; trip t's times at stop position i are
+      arrivals/departures[trip_time_offsets[t] + i]
+    - stop_route_offsets/stop_routes/stop_route_positions: CSR index of the routes
+      serving each stop and the stop's position on the route
+    """
+
+    def __init__(self, rows: Iterable[Sequence]):
+        """
+        Build from (departure, arrival, station_from, station_to, service) rows,
+        each a ride on service from station_from to a later calling point.
+        A service's rows form one trip per run: a row departing more than
+        MAX_DWELL_MINUTES after the run's last arrival starts the next run (the
+        same service id on another day).
+        """
+        by_service: Dict[Hashable, List[Sequence]] = defaultdict(list)
+        for row in rows:
+            by_service[row[4]].append(row)
+        stops: Dict[Hashable, int] = {}
+        # (service, first departure) -> stop -> [arrival, departure]
+        calls: Dict[Tuple[Hashable, int], Dict[int, List[int]]] = {}
+        for service, service_rows in by_service.items():
+            service_rows.sort(key=lambda row: row[0])
+            run_end = None
+            for departure, arrival, station_from, station_to, _ in service_rows:
+                if run_end is None or departure > run_end + MAX_DWELL_MINUTES:
+                    times = calls[(service, departure)] = {}
+                    run_end = arrival
+                run_end = max(run_end, arrival)
+                origin = stops.setdefault(station_from, len(stops))
+                target = stops.setdefault(station_to, len(stops))
+                call = times.setdefault(origin, [departure, departure])
+                call[1] = departure
+                call[0] = min(call[0], departure)
+                call = times.setdefault(target, [arrival, arrival])
+                call[0] = arrival
+        self.stations: List[Hashable] = list(stops)
+        self.station_index = stops
+
+        routes: Dict[tuple, List[tuple]] = defaultdict(list)
+        for (service, _), times in calls.items():
+            sequence = sorted(times.items(), key=lambda item: (item[1][1], item[1][0]))
+            routes[tuple(stop for stop, _ in sequence)].append(
+                (sequence[0][1][1], service, [call for _, call in sequence])
+            )
+
+        self.route_stop_offsets = array("i", [0])
+        self.route_stops = array("i")
+        self.route_trip_offsets = array("i", [0])
+        self.trip_time_offsets = array("i")
+        self.arrivals = array("i")
+        self.departures = array("i")
+        self.trip_services: List[Hashable] = []
+        serving: List[List[tuple]] = [[] for _ in self.stations]
+        for route, (sequence, trips) in enumerate(routes.items()):
+            for position, stop in enumerate(sequence):
+                if not serving[stop] or serving[stop][-1][0] != route:
+                    serving[stop].append((route, position))
+            self.route_stops.extend(sequence)
+            self.route_stop_offsets.append(len(self.route_stops))
+            for _, service, times in sorted(trips, key=lambda trip: trip[0]):
+                self.trip_time_offsets.append(len(self.arrivals))
+                self.trip_services.append(service)
+                for arrival, departure in times:
+                    self.arrivals.append(arrival)
+                    self.departures.append(departure)
+            self.route_trip_offsets.append(len(self.trip_services))
+
+        self.stop_route_offsets = array("i", [0])
+        self.stop_routes = array("i")
+        self.stop_route_positions = array("i")
+        for routes_at_stop in serving:
+            for route, position in routes_at_stop:
+                self.stop_routes.append(route)
+                self.stop_route_positions.append(position)
+            self.stop_route_offsets.append(len(self.stop_routes))
+
+    def __len__(self) -> int:
+        return len(self.trip_services)
+
+    @cached_property
+    def segments(self) -> List[Tuple[int, int, int]]:
+        """
+        (stop, next stop, fastest ride minutes) for each pair of consecutive
+        stops on a route; every journey is a chain of these plus waiting time.
+        """
+        route_stops, offsets = self.route_stops, self.trip_time_offsets
+        segments = []
+        for route in range(len(self.route_stop_offsets) - 1):
+            base = self.route_stop_offsets[route]
+            trips = range(
+                self.route_trip_offsets[route], self.route_trip_offsets[route + 1]
+            )
+            for i in range(base, self.route_stop_offsets[route + 1] - 1):
+                position = i - base
+                ride = min(
+                    self.arrivals[offsets[trip] + position + 1]
+                    - self.departures[offsets[trip] + position]
+                    for trip in trips
+                )
+                segments.append((route_stops[i], route_stops[i + 1], ride))
+        return segments
+
+    def _earliest_trip(self, route: int, position: int, ready: int) -> Optional[int]:
+        """First trip of route departing the stop at position no earlier than ready."""
+        first = self.route_trip_offsets[route]
+        last = self.route_trip_offsets[route + 1]
+        offsets = self.trip_time_offsets
+        departures = self.departures
+        trip = bisect_left(
+            range(first, last),
+            ready,
+            key=lambda t: departures[offsets[t] + position],
+        )
+        return first + trip if trip < last - first else None
+
+    def journeys(
+        self,
+        station_from: Hashable,
+        station_to: Hashable,
+        start_minute: int,
+        max_changes: int,
+        min_connection: Optional[Sequence[int]] = None,
+        lower_bounds: Optional[Sequence[int]] = None,
+    ) -> List[RaptorJourney]:
+        """
+        Pareto-optimal journeys, fewest changes first, each arriving strictly
+        earlier than the one before.
+        min_connection (indexed like self.stations) is the minimum time needed to
+        change trains at each station; boarding at the origin needs none.
+        lower_bounds (indexed like self.stations) are minutes to
+        station_to; an arrival is not improved when even its bound cannot beat the
+        best arrival at the destination.
+        """
+        origin = self.station_index.get(station_from)
+        destination = self.station_index.get(station_to)
+        if origin is None or destination is None or origin == destination:
+            return []
+        n = len(self.stations)
+        best = [INFINITY] * n
+        best[origin] = start_minute
+        previous = [INFINITY] * n
+        previous[origin] = start_minute
+        marked = {origin}
+        # rounds[k][stop] = (trip, boarding position, alighting position, route)
+        rounds: List[Dict[int, tuple]] = [{}]
+        journeys = []
+        route_stops, stop_offsets = self.route_stops, self.route_stop_offsets
+        offsets, arrivals, departures = (
+            self.trip_time_offsets,
+            self.arrivals,
+            self.departures,
+        )
+        for k in range(1, max_changes + 2):
+            queue: Dict[int, int] = {}
+            for stop in marked:
+                for i in range(
+                    self.stop_route_offsets[stop], self.stop_route_offsets[stop + 1]
+                ):
+                    route = self.stop_routes[i]
+                    position = self.stop_route_positions[i]
+                    if position < queue.get(route, INFINITY):
+                        queue[route] = position
+            current = [INFINITY] * n
+            back: Dict[int, tuple] = {}
+            marked = set()
+            for route, first_position in queue.items():
+                base = stop_offsets[route]
+                trip = None
+                boarded_at = 0
+                for position in range(first_position, stop_offsets[route + 1] - base):
+                    stop = route_stops[base + position]
+                    if trip is not None:
+                        arrival = arrivals[offsets[trip] + position]
+                        bound = 0 if lower_bounds is None else lower_bounds[stop]
+                        if arrival < best[stop] and arrival + bound < best[destination]:
+                            current[stop] = best[stop] = arrival
+                            back[stop] = (trip, boarded_at, position, route)
+                            marked.add(stop)
+                    ready = previous[stop]
+                    if ready == INFINITY:
+                        continue
+                    if k > 1 and min_connection is not None:
+                        ready += min_connection[stop]
+                    if trip is None or ready <= departures[offsets[trip] + position]:
+                        earlier = self._earliest_trip(route, position, ready)
+                        if earlier is not None and (trip is None or earlier < trip):
+                            trip = earlier
+                            boarded_at = position
+            rounds.append(back)
+            if current[destination] < INFINITY:
+                journeys.append(
+                    RaptorJourney(
+                        current[destination], k - 1, self._legs(rounds, destination)
+                    )
+                )
+            if not marked:
+                break
+            previous = current
+        return journeys
+
+    def _legs(self, rounds: List[Dict[int, tuple]], stop: int) -> List[RaptorLeg]:
+        legs = []
+        for back in reversed(rounds[1:]):
+            trip, boarded_at, alighted_at, route = back[stop]
+            base = self.route_stop_offsets[route]
+            boarding_stop = self.route_stops[base + boarded_at]
+            times = self.trip_time_offsets[trip]
+            legs.append(
+                RaptorLeg(
+                    self.stations[boarding_stop],
+                    self.stations[stop],
+                    self.trip_services[trip],
+                    self.departures[times + boarded_at],
+                    self.arrivals[times + alighted_at],
+                )
+            )
+            stop = boarding_stop
+        legs.reverse()
+        return legs
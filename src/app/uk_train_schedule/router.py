@@ -3,15 +3,120 @@ Journey planning API router for UK Train Timetable.
 Defines endpoints for journey planning and integrates with controller logic.
 """
 
-from fastapi import APIRouter, Depends
+import json
+import logging
+from datetime import datetime
+from typing import Annotated, AsyncIterator, Iterator, Optional
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
-from database.session import get_db
+from app import deadline
+from app.admission import Priority, admission_dependency
+from app.settings import settings
+from database.session import create_session, get_db
+
+from . import events
+from .cache import CachedJourney, journey_cache, journey_key
+from .controller import (
+    JourneyStage,
+    TransportAPIException,
+    find_earliest_journey,
+    get_departure_board,
+    get_journey_options,
+    iter_journey_stages,
+    journey_legs,
+)
+from .schema import (
+    DepartureBoardEntry,
+    DepartureBoardResponse,
+    JourneyLegResponse,
+    JourneyOption,
+    JourneyOptionsRequest,
+    JourneyOptionsResponse,
+    JourneyRequest,
+    JourneyResponse,
+)
+from .timeconv import LONDON, from_epoch_minute, localize, to_epoch_minute
+
+logger = logging.getLogger(__name__)
+
+
+def sync_cache_events(db: Session = Depends(get_db)) -> None:
+    """
+    Apply cache invalidations published by other worker processes (throttled).
+    """
+    events.poll(db)
+
+
+async def journey_priority(request: Request) -> Priority:
+    """
+    Admission class of a journey request: CACHED when the journey endpoint
+    already holds its result, else UNCACHED (streams and options always plan).
+    """
+    if request.url.path.rstrip("/") != "/v1/journey":
+        return Priority.UNCACHED
+    try:
+        if request.method == "GET":
+            data = dict(request.query_params)
+            data["station_codes"] = request.query_params.getlist("station_codes")
+        else:
+            data = await request.json()
+        req = JourneyRequest.model_validate(data)
+    except (ValueError, ValidationError):
+        # Rejected by validation once admitted
+        return Priority.UNCACHED
+    key = journey_key(req.station_codes, localize(req.start_time), req.max_wait)
+    if journey_cache.get(key) is not None:
+        return Priority.CACHED
+    return Priority.UNCACHED
+
+
+# request_deadline comes first so later dependencies run under the deadline, and
+# admission before anything that needs a thread or a database connection
+router = APIRouter(
+    prefix="/v1/journey",
+    tags=["journey"],
+    dependencies=[
+        Depends(deadline.request_deadline),
+        Depends(admission_dependency(journey_priority)),
+        Depends(sync_cache_events),
+    ],
+)
 
-from .controller import TransportAPIException, find_earliest_journey
-from .schema import JourneyRequest, JourneyResponse
 
-router = APIRouter(prefix="/v1/journey", tags=["journey"])
+def _cached_journey(req: JourneyRequest, db: Session) -> CachedJourney:
+    """
+    Return the journey result for a request, computing it only on a cache miss.
+    """
+    start = localize(req.start_time)
+    key = journey_key(req.station_codes, start, req.max_wait)
+    cached = journey_cache.get(key)
+    if cached is not None:
+        return cached
+    generation = journey_cache.generation
+    arrival = find_earliest_journey(db, req.station_codes, start, req.max_wait)
+    return journey_cache.put(key, arrival, generation)
+
+
+def _set_cache_headers(response: Response, cached: CachedJourney) -> None:
+    response.headers["ETag"] = cached.etag
+    response.headers["Cache-Control"] = (
+        f"public, max-age={settings.journey_cache_max_age}"
+    )
 
 
 # Note: This is a POST endpoint because the request body contains a list of station
@@ -28,11 +133,12 @@ router = APIRouter(prefix="/v1/journey", tags=["journey"])
     Returns the earliest possible arrival time at the destination.
     """,
 )
-def journey(req: JourneyRequest, db: Session = Depends(get_db)):
+def journey(req: JourneyRequest, response: Response, db: Session = Depends(get_db)):
     """
     Plan a journey using the provided station codes, start time, and max wait.
     Args:
         req (JourneyRequest): Journey planning request
+        response (Response): Outgoing response (ETag and Cache-Control are set)
         db (Session): SQLAlchemy session (dependency)
     Returns:
         JourneyResponse: Arrival time at destination
@@ -40,9 +146,318 @@ def journey(req: JourneyRequest, db: Session = Depends(get_db)):
         TransportAPIException: If journey planning fails
     """
     try:
-        arrival = find_earliest_journey(
-            db, req.station_codes, req.start_time, req.max_wait
-        )
-        return JourneyResponse(arrival_time=arrival)
+        cached = _cached_journey(req, db)
+        _set_cache_headers(response, cached)
+        return JourneyResponse(arrival_time=cached.arrival_time)
     except TransportAPIException as exc:
         raise exc
+
+
+# The GET form of the journey endpoint exists so that clients and CDNs can cache
+# and revalidate results (If-None-Match -> 304) using the same request fields as
+# query parameters, e.g. ?station_codes=LBG&station_codes=SAJ&max_wait=15
+@router.get(
+    "/",
+    response_model=JourneyResponse,
+    status_code=200,
+    summary="Plan a journey (cacheable)",
+    description="""
+    Same as POST /v1/journey/ with the request fields as query parameters.
+    Responses carry an ETag; send it back in If-None-Match to get a 304.
+    """,
+    responses={304: {"description": "Journey result unchanged"}},
+)
+def journey_get(
+    req: Annotated[JourneyRequest, Query()],
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Cacheable journey planning with conditional GET support.
+    Args:
+        req (JourneyRequest): Journey planning request (query parameters)
+        response (Response): Outgoing response (ETag and Cache-Control are set)
+        if_none_match (Optional[str]): ETag(s) the client already holds
+        db (Session): SQLAlchemy session (dependency)
+    Returns:
+        JourneyResponse | Response: Arrival time, or an empty 304 if unchanged
+    """
+    cached = _cached_journey(req, db)
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or cached.etag in [tag.strip() for tag in if_none_match.split(",")]
+    ):
+        not_modified = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+        _set_cache_headers(not_modified, cached)
+        return not_modified
+    _set_cache_headers(response, cached)
+    return JourneyResponse(arrival_time=cached.arrival_time)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_stages(req: JourneyRequest, start_minute: int) -> Iterator[JourneyStage]:
+    # Owns its session, so it is closed by whichever thread finishes the generator
+    db = create_session()
+    try:
+        yield from iter_journey_stages(
+            db, req.station_codes, start_minute, req.max_wait
+        )
+    finally:
+        db.close()
+
+
+def _next_stage(
+    stages: Iterator[JourneyStage], request_deadline: Optional[deadline.Deadline]
+) -> Optional[JourneyStage]:
+    with deadline.use(request_deadline):
+        return next(stages, None)
+
+
+async def _journey_events(
+    req: JourneyRequest,
+    request: Request,
+    request_deadline: Optional[deadline.Deadline] = None,
+) -> AsyncIterator[str]:
+    """
+    Server-sent events for a journey: a "leg" event as each leg is resolved, then
+    a "journey" summary (or an "error" event). Each leg is resolved on the thread
+    pool, under request_deadline, only after the client is confirmed to still be
+    connected.
+    """
+    start = localize(req.start_time)
+    start_minute = to_epoch_minute(start)
+    generation = journey_cache.generation
+    stages = _stream_stages(req, start_minute)
+
+    def render(minute: int) -> str:
+        return from_epoch_minute(minute, start.tzinfo).isoformat()
+
+    try:
+        labels = None
+        while True:
+            if await request.is_disconnected():
+                if request_deadline is not None:
+                    request_deadline.cancel()
+                logger.info(
+                    "Journey stream for %s cancelled by the client", req.station_codes
+                )
+                return
+            try:
+                stage = await run_in_threadpool(_next_stage, stages, request_deadline)
+            except HTTPException as exc:
+                yield _sse(
+                    "error", {"status_code": exc.status_code, "detail": exc.detail}
+                )
+                return
+            if stage is None:
+                break
+            labels = stage.labels
+            # Earliest arrival so far; the summary may ride a later train to
+            # reach the destination sooner
+            earliest = labels[0]
+            yield _sse(
+                "leg",
+                {
+                    "station_from": stage.station_from,
+                    "station_to": stage.station_to,
+                    "service_id": earliest.service_key,
+                    "departure_time": render(earliest.departure_minute),
+                    "arrival_time": render(earliest.arrival_minute),
+                },
+            )
+        legs = journey_legs(req.station_codes, labels)
+        arrival_time = render(legs[-1].arrival_minute)
+        journey_cache.put(
+            journey_key(req.station_codes, start, req.max_wait),
+            arrival_time,
+            generation,
+        )
+        yield _sse(
+            "journey",
+            {
+                "arrival_time": arrival_time,
+                "legs": [
+                    {
+                        "station_from": leg.station_from,
+                        "station_to": leg.station_to,
+                        "service_id": leg.service_id,
+                        "departure_time": render(leg.departure_minute),
+                        "arrival_time": render(leg.arrival_minute),
+                    }
+                    for leg in legs
+                ],
+            },
+        )
+    finally:
+        try:
+            stages.close()
+        except ValueError:
+            # Cancelled while a worker thread is resolving a leg; the generator
+            # stops after that leg and closes its session when collected
+            pass
+
+
+@router.post(
+    "/stream",
+    status_code=200,
+    summary="Plan a journey, streaming legs",
+    description="""
+    Same request as POST /v1/journey/. Responds with server-sent events: a `leg`
+    event as each leg is resolved (the earliest arrival found at its station),
+    then a `journey` event with the arrival time and the trains of the
+    earliest-arriving journey, or an `error` event (504 once the request
+    deadline has passed). Disconnecting stops the remaining legs from being
+    fetched.
+    """,
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def journey_stream(req: JourneyRequest, request: Request):
+    """
+    Stream journey planning progress as server-sent events.
+    Args:
+        req (JourneyRequest): Journey planning request
+        request (Request): Incoming request (used to detect disconnects)
+    Returns:
+        StreamingResponse: text/event-stream of leg, journey and error events
+    """
+    # The body is streamed after the endpoint returns, so the request's deadline
+    # is handed to the stream rather than left in this context
+    return StreamingResponse(
+        _journey_events(req, request, deadline.current()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/options",
+    response_model=JourneyOptionsResponse,
+    status_code=200,
+    summary="Journey options",
+    description="""
+    Find journeys between two stations with any route, trading arrival time
+    against changes of train. Returns the Pareto-optimal options: the fastest
+    journey for each number of changes that arrives earlier than every option
+    with fewer changes.
+    """,
+)
+def journey_options(req: JourneyOptionsRequest, db: Session = Depends(get_db)):
+    """
+    Fastest and fewest-changes journey options between two stations.
+    Args:
+        req (JourneyOptionsRequest): Origin, destination, start time and max changes
+        db (Session): SQLAlchemy session (dependency)
+    Returns:
+        JourneyOptionsResponse: Options, fewest changes first
+    """
+    start = localize(req.start_time)
+    options = get_journey_options(
+        db, req.origin, req.destination, to_epoch_minute(start), req.max_changes
+    )
+
+    def render(minute: int) -> str:
+        return from_epoch_minute(minute, start.tzinfo).isoformat()
+
+    return JourneyOptionsResponse(
+        options=[
+            JourneyOption(
+                arrival_time=render(option.arrival_minute),
+                changes=option.changes,
+                legs=[
+                    JourneyLegResponse(
+                        service_id=leg.service,
+                        station_from=leg.station_from,
+                        station_to=leg.station_to,
+                        departure_time=render(leg.departure_minute),
+                        arrival_time=render(leg.arrival_minute),
+                    )
+                    for leg in option.legs
+                ],
+            )
+            for option in options
+        ]
+    )
+
+
+station_router = APIRouter(
+    prefix="/v1/stations",
+    tags=["stations"],
+    dependencies=[Depends(deadline.request_deadline), Depends(sync_cache_events)],
+)
+
+
+def _decode_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        minute, entry_id = cursor.split(":")
+        return int(minute), int(entry_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from None
+
+
+@station_router.get(
+    "/{code}/departures",
+    response_model=DepartureBoardResponse,
+    status_code=200,
+    summary="Station departure board",
+    description="""
+    List departures from a station in departure order, served from the timetable
+    cache. Pages are keyset-paginated: pass the returned next_cursor as cursor.
+    """,
+)
+def departures(
+    code: str = Path(..., pattern=r"^[A-Z]{3}$", description="Station code"),
+    after: Optional[datetime] = Query(
+        None, description="Earliest departure (ISO 8601), default now"
+    ),
+    limit: int = Query(20, ge=1, le=100, description="Maximum departures returned"),
+    calling_at: Optional[str] = Query(
+        None, pattern=r"^[A-Z]{3}$", description="Only services calling here"
+    ),
+    cursor: Optional[str] = Query(None, description="next_cursor from a previous page"),
+    db: Session = Depends(get_db),
+):
+    """
+    Departure board for a station.
+    Args:
+        code (str): Departure station code
+        after (Optional[datetime]): Earliest departure time
+        limit (int): Page size
+        calling_at (Optional[str]): Calling-point filter
+        cursor (Optional[str]): Keyset cursor from a previous page
+        db (Session): SQLAlchemy session (dependency)
+    Returns:
+        DepartureBoardResponse: Departures and the cursor for the next page
+    """
+    if cursor:
+        after_minute, after_id = _decode_cursor(cursor)
+    else:
+        after_minute = to_epoch_minute(after or datetime.now(LONDON))
+        after_id = None
+    entries = get_departure_board(db, code, after_minute, after_id, limit, calling_at)
+    next_cursor = None
+    if len(entries) == limit:
+        next_cursor = f"{entries[-1].departure_minute}:{entries[-1].id}"
+    return DepartureBoardResponse(
+        station_code=code,
+        departures=[
+            DepartureBoardEntry(
+                service_id=entry.service_id,
+                destination=entry.station_to,
+                aimed_departure_time=from_epoch_minute(
+                    entry.departure_minute, LONDON
+                ).isoformat(),
+                aimed_arrival_time=from_epoch_minute(
+                    entry.arrival_minute, LONDON
+                ).isoformat(),
+            )
+            for entry in entries
+        ],
+        next_cursor=next_cursor,
+    )
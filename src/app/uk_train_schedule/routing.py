@@ -0,0 +1,95 @@
+"""
+Routing engine for journeys along a fixed sequence of stations.
+Works on flat (departure_minute, arrival_minute, service_key) tuples rather than
+ORM objects. Each leg relaxes every candidate departure within max_wait of any
+reachable arrival, so a later but faster train can win over the first departure.
+Changes of train respect the station's minimum connection time; staying on the
+same service does not count as a change.
+"""
+
+from bisect import bisect_right
+from typing import Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+# (departure_minute, arrival_minute, service), sorted by departure; service is any
+# hashable service identifier (a services key or a TransportAPI service id)
+ConnectionRow = Tuple[int, int, Hashable]
+
+
+class JourneyLeg(NamedTuple):
+    """One train taken on a planned journey, times in epoch minutes (UTC)."""
+
+    station_from: str
+    station_to: str
+    service_id: str
+    departure_minute: int
+    arrival_minute: int
+
+
+class Label(NamedTuple):
+    """
+    A reachable arrival at a station and the leg that produced it.
+    parent links back to the label at the previous station (None at the origin).
+    """
+
+    arrival_minute: int
+    service_key: Optional[Hashable]
+    departure_minute: Optional[int]
+    parent: Optional["Label"]
+
+
+def origin_labels(start_minute: int) -> List[Label]:
+    """Initial labels for a journey starting at start_minute."""
+    return [Label(start_minute, None, None, None)]
+
+
+def leg_window(labels: Sequence[Label], max_wait: int) -> Tuple[int, int]:
+    """
+    Departure window [start, end] covering every candidate for the next leg.
+    labels must be sorted by arrival.
+    """
+    return labels[0].arrival_minute, labels[-1].arrival_minute + max_wait
+
+
+def relax_leg(
+    labels: Sequence[Label],
+    connections: Sequence[ConnectionRow],
+    max_wait: int,
+    min_connection: int = 0,
+) -> List[Label]:
+    """
+    Extend labels across one leg.
+    A connection continuing the service of a label needs no change and may be
+    taken whenever that train has arrived. Otherwise a change of train needs a
+    label arriving at least min_connection and at most max_wait minutes before
+    the departure; the latest such label is taken as parent. Boarding at the
+    origin is not a change.
+    Returns:
+        List[Label]: One label per distinct (arrival, service), sorted by arrival
+    """
+    if labels and labels[0].parent is None:
+        min_connection = 0
+    arrivals = [label.arrival_minute for label in labels]
+    by_service = {label.service_key: label for label in labels}
+    reached: Dict[Tuple[int, int], Label] = {}
+    for departure, arrival, service_key in connections:
+        key = (arrival, service_key)
+        if key in reached:
+            continue
+        parent = by_service.get(service_key)
+        if parent is None or parent.arrival_minute > departure:
+            index = bisect_right(arrivals, departure - min_connection) - 1
+            if index < 0 or departure - arrivals[index] > max_wait:
+                continue
+            parent = labels[index]
+        reached[key] = Label(arrival, service_key, departure, parent)
+    return sorted(reached.values(), key=lambda label: label.arrival_minute)
+
+
+def backtrack(label: Label) -> List[Label]:
+    """Labels from the first leg to the given final label, in journey order."""
+    chain = []
+    while label.parent is not None:
+        chain.append(label)
+        label = label.parent
+    chain.reverse()
+    return chain
@@ -1,62 +1,108 @@
 """
 Pydantic schemas for journey planning API.
 Includes request and response models with validation.
+Request constraints are declared as types (pattern, length and range
+constraints) so pydantic-core checks them without calling Python code. The only
+Python run per validation is a wrap validator per request model, which drops an
+empty start_time and rewrites failures into this API's error messages.
 """
 
-import re
 from datetime import datetime
-from typing import List, Optional
+from typing import Annotated, Any, ClassVar, Dict, List, Optional, Tuple
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import (
+    BaseModel,
+    Field,
+    StringConstraints,
+    ValidationError,
+    model_validator,
+)
+from pydantic_core import PydanticCustomError
 
+from app.uk_train_schedule.timeconv import LONDON
 
-class JourneyRequest(BaseModel):
+# Three uppercase letters, checked by pydantic-core
+StationCode = Annotated[str, StringConstraints(pattern=r"^[A-Z]{3}$")]
+
+INVALID_STATION_CODE = "Invalid station code: {code}. Must be three uppercase letters."
+INVALID_START_TIME = "start_time must be a valid ISO 8601 datetime string."
+
+
+class _RequestModel(BaseModel):
+    """
+    Base for request models. error_messages maps (field, pydantic error type) to
+    the message reported instead of pydantic's default; "{code}" is replaced
+    by the rejected value.
+    """
+
+    error_messages: ClassVar[Dict[Tuple[str, str], str]] = {}
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def _api_errors(cls, data: Any, handler):
+        if isinstance(data, dict) and data.get("start_time") == "":
+            # An empty start time means "now", as if it were omitted
+            data = {k: v for k, v in data.items() if k != "start_time"}
+        try:
+            return handler(data)
+        except ValidationError as exc:
+            raise ValidationError.from_exception_data(
+                exc.title, [cls._api_error(error) for error in exc.errors()]
+            ) from None
+
+    @classmethod
+    def _api_error(cls, error: Dict[str, Any]) -> Dict[str, Any]:
+        field = str(error["loc"][0]) if error["loc"] else ""
+        message = None
+        if error["type"] != "missing":
+            message = cls.error_messages.get(
+                (field, error["type"])
+            ) or cls.error_messages.get((field, "*"))
+        if message is None:
+            details = {
+                "type": error["type"],
+                "loc": error["loc"],
+                "input": error["input"],
+            }
+            if "ctx" in error:
+                details["ctx"] = error["ctx"]
+            return details
+        return {
+            "type": PydanticCustomError(
+                "value_error", message.replace("{code}", str(error["input"]))
+            ),
+            "loc": error["loc"],
+            "input": error["input"],
+        }
+
+
+class JourneyRequest(_RequestModel):
     """
     Request schema for journey planning.
     Args:
         station_codes (List[str]): List of three-letter station codes in journey order.
-        start_time (str): Journey start time in ISO 8601 format.
+        start_time (datetime): Journey start time (ISO 8601; naive is UK local time).
         max_wait (int): Maximum wait time at any station in minutes.
     """
 
-    station_codes: List[str] = Field(
+    error_messages: ClassVar[Dict[Tuple[str, str], str]] = {
+        ("station_codes", "too_short"): "At least two station codes are required.",
+        ("station_codes", "*"): INVALID_STATION_CODE,
+        ("start_time", "*"): INVALID_START_TIME,
+        ("max_wait", "*"): "max_wait must be between 1 and 600 minutes.",
+    }
+
+    station_codes: Annotated[List[StationCode], Field(min_length=2)] = Field(
         ..., description="List of three-letter station codes in journey order."
     )
-    start_time: str = Field(
-        default_factory=lambda: datetime.now().isoformat(),
+    start_time: datetime = Field(
+        default_factory=lambda: datetime.now(LONDON),
         description="Journey start time in ISO 8601 format.",
     )
-    max_wait: int = Field(
+    max_wait: Annotated[int, Field(ge=1, le=600)] = Field(
         ..., description="Maximum wait time at any station in minutes."
     )
 
-    @field_validator("station_codes")
-    def validate_station_codes(v):
-        if not v or len(v) < 2:
-            raise ValueError("At least two station codes are required.")
-        for code in v:
-            if not re.fullmatch(r"[A-Z]{3}", code):
-                raise ValueError(
-                    f"Invalid station code: {code}. Must be three uppercase letters."
-                )
-        return v
-
-    @field_validator("start_time")
-    def validate_start_time(v):
-        if not v:
-            v = datetime.now().isoformat()
-        try:
-            datetime.fromisoformat(v)
-        except Exception:
-            raise ValueError("start_time must be a valid ISO 8601 datetime string.")
-        return v
-
-    @field_validator("max_wait")
-    def validate_max_wait(v):
-        if v <= 0 or v > 600:
-            raise ValueError("max_wait must be between 1 and 600 minutes.")
-        return v
-
 
 class JourneyResponse(BaseModel):
     """
@@ -69,3 +115,106 @@ class JourneyResponse(BaseModel):
         None,
         description="Final arrival time at the destination station (ISO 8601 format).",
     )
+
+
+class DepartureBoardEntry(BaseModel):
+    """
+    A single departure on a station departure board.
+    Args:
+        service_id (str): TransportAPI service identifier.
+        destination (str): Calling point the arrival time refers to.
+        aimed_departure_time (str): Scheduled departure (ISO 8601, UK local time).
+        aimed_arrival_time (str): Scheduled arrival at destination (ISO 8601, UK local time).
+    """
+
+    service_id: str
+    destination: str
+    aimed_departure_time: str
+    aimed_arrival_time: str
+
+
+class DepartureBoardResponse(BaseModel):
+    """
+    Response schema for a station departure board.
+    Args:
+        station_code (str): Departure station code.
+        departures (List[DepartureBoardEntry]): Departures in departure-time order.
+        next_cursor (Optional[str]): Cursor for the next page, if there may be more.
+    """
+
+    station_code: str
+    departures: List[DepartureBoardEntry]
+    next_cursor: Optional[str] = Field(
+        None, description="Pass as `cursor` to fetch the next page."
+    )
+
+
+class JourneyOptionsRequest(_RequestModel):
+    """
+    Request schema for free-routed journey options.
+    Args:
+        origin (str): Departure station code.
+        destination (str): Arrival station code.
+        start_time (datetime): Journey start time (ISO 8601; naive is UK local time).
+        max_changes (int): Maximum number of changes of train.
+    """
+
+    error_messages: ClassVar[Dict[Tuple[str, str], str]] = {
+        ("origin", "*"): INVALID_STATION_CODE,
+        ("destination", "*"): INVALID_STATION_CODE,
+        ("start_time", "*"): INVALID_START_TIME,
+        ("max_changes", "*"): "max_changes must be between 0 and 5.",
+    }
+
+    origin: StationCode = Field(..., description="Departure station code.")
+    destination: StationCode = Field(..., description="Arrival station code.")
+    start_time: datetime = Field(
+        default_factory=lambda: datetime.now(LONDON),
+        description="Journey start time in ISO 8601 format.",
+    )
+    max_changes: Annotated[int, Field(ge=0, le=5)] = Field(
+        3, description="Maximum number of changes of train."
+    )
+
+
+class JourneyLegResponse(BaseModel):
+    """
+    A single train ridden on a journey option.
+    Args:
+        service_id (str): TransportAPI service identifier.
+        station_from (str): Boarding station code.
+        station_to (str): Alighting station code.
+        departure_time (str): Scheduled departure (ISO 8601).
+        arrival_time (str): Scheduled arrival (ISO 8601).
+    """
+
+    service_id: str
+    station_from: str
+    station_to: str
+    departure_time: str
+    arrival_time: str
+
+
+class JourneyOption(BaseModel):
+    """
+    A Pareto-optimal journey option.
+    Args:
+        arrival_time (str): Arrival time at the destination (ISO 8601).
+        changes (int): Number of changes of train.
+        legs (List[JourneyLegResponse]): Trains ridden, in order.
+    """
+
+    arrival_time: str
+    changes: int
+    legs: List[JourneyLegResponse]
+
+
+class JourneyOptionsResponse(BaseModel):
+    """
+    Response schema for journey options.
+    Args:
+        options (List[JourneyOption]): Fewest changes first; each later option
+            arrives earlier with more changes.
+    """
+
+    options: List[JourneyOption]
@@ -0,0 +1,512 @@
+"""
+Per-service calling patterns for the "services" timetable store.
+Each train run is one service_runs row holding its ordered stops and their times
+in a compact blob, and service_stops indexes it by station: station ->
+(run, stop position, times there). Any (from, to) ride on a run is found by an
+indexed self-join of service_stops, so storage grows with the number of stops
+rather than with the number of station pairs.
+TransportAPI reports a departure time only at the station whose board was
+fetched, and arrival times at the calling points after it. A run therefore
+starts from one fetched board and grows as boards fetched at its other stations
+are matched to it: same service, the same times at every shared station, and a
+departure no more than MAX_DWELL_MINUTES after the arrival at that station.
+"""
+
+import struct
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import and_, delete, func, select, tuple_
+from sqlalchemy.orm import Session, aliased
+
+from app.uk_train_schedule.identifiers import services, stations
+from app.uk_train_schedule.models import FetchCoverage, ServiceRun, ServiceStop
+
+# Longest a train is taken to wait at a station between arriving and departing
+MAX_DWELL_MINUTES = 15
+# Encoded in place of a time TransportAPI has not reported
+UNKNOWN = -32768
+
+
+class Stop(NamedTuple):
+    """A station in a run's calling pattern; unknown times are None."""
+
+    station_key: int
+    arrival_minute: Optional[int]
+    departure_minute: Optional[int]
+
+
+def _stop_order(stop: Stop) -> Tuple[int, int]:
+    first = stop.arrival_minute
+    if first is None:
+        first = stop.departure_minute
+    last = stop.departure_minute
+    return (first, first if last is None else last)
+
+
+def encode_stops(base_minute: int, stops: Sequence[Stop]) -> bytes:
+    """
+    Encode a calling pattern: the stop count (uint16), the station keys (int32)
+    and then, per stop, arrival and departure as int16 deltas from the previous
+    known time (base_minute for the first), UNKNOWN where not reported.
+    """
+    deltas = []
+    previous = base_minute
+    for stop in stops:
+        for minute in (stop.arrival_minute, stop.departure_minute):
+            if minute is None:
+                deltas.append(UNKNOWN)
+            else:
+                deltas.append(minute - previous)
+                previous = minute
+    count = len(stops)
+    return struct.pack(
+        f"<H{count}i{2 * count}h",
+        count,
+        *(stop.station_key for stop in stops),
+        *deltas,
+    )
+
+
+def decode_stops(base_minute: int, blob: bytes) -> List[Stop]:
+    """Inverse of encode_stops."""
+    (count,) = struct.unpack_from("<H", blob)
+    values = struct.unpack_from(f"<{count}i{2 * count}h", blob, 2)
+    keys, deltas = values[:count], values[count:]
+    times: List[Optional[int]] = []
+    previous = base_minute
+    for delta in deltas:
+        if delta == UNKNOWN:
+            times.append(None)
+        else:
+            previous += delta
+            times.append(previous)
+    return [Stop(key, times[2 * i], times[2 * i + 1]) for i, key in enumerate(keys)]
+
+
+def merge_stops(run: Sequence[Stop], trip: Sequence[Stop]) -> Optional[List[Stop]]:
+    """
+    The calling pattern of run extended with trip's stops, or None if trip is
+    not the same train: it must share a station with run, agree on every time
+    both report, and depart no earlier than it arrives (nor more than
+    MAX_DWELL_MINUTES later).
+    """
+    merged = {stop.station_key: stop for stop in run}
+    matched = False
+    for stop in trip:
+        known = merged.get(stop.station_key)
+        if known is None:
+            merged[stop.station_key] = stop
+            continue
+        for ours, theirs in (
+            (known.arrival_minute, stop.arrival_minute),
+            (known.departure_minute, stop.departure_minute),
+        ):
+            if ours is not None and theirs is not None:
+                if ours != theirs:
+                    return None
+                matched = True
+        combined = Stop(
+            stop.station_key,
+            (
+                known.arrival_minute
+                if known.arrival_minute is not None
+                else stop.arrival_minute
+            ),
+            (
+                known.departure_minute
+                if known.departure_minute is not None
+                else stop.departure_minute
+            ),
+        )
+        if (
+            combined.arrival_minute is not None
+            and combined.departure_minute is not None
+        ):
+            dwell = combined.departure_minute - combined.arrival_minute
+            if not 0 <= dwell <= MAX_DWELL_MINUTES:
+                return None
+            matched = True
+        merged[stop.station_key] = combined
+    if not matched:
+        return None
+    return sorted(merged.values(), key=_stop_order)
+
+
+def connection_count(stops: Sequence[Stop]) -> int:
+    """Number of (from, to) rides on a run: departures times later arrivals."""
+    count = arrivals = 0
+    for stop in reversed(stops):
+        if stop.departure_minute is not None:
+            count += arrivals
+        if stop.arrival_minute is not None:
+            arrivals += 1
+    return count
+
+
+def _arrivals_after(stops: Sequence[Stop], station_key: int, departure: int):
+    """(station_key, arrival) pairs reachable from a departure on a run."""
+    for following, stop in enumerate(stops, 1):
+        if stop.station_key == station_key and stop.departure_minute == departure:
+            return {
+                (later.station_key, later.arrival_minute)
+                for later in stops[following:]
+                if later.arrival_minute is not None
+            }
+    return set()
+
+
+def _stop_span(stops: Sequence[Stop]) -> Tuple[int, int]:
+    """Earliest and latest known time on a run."""
+    times = [minute for stop in stops for minute in _stop_order(stop)]
+    return min(times), max(times)
+
+
+def _candidate_runs(
+    db: Session, trips: Sequence[Tuple[int, List[Stop]]]
+) -> Tuple[Dict[int, List[List]], Dict[int, Dict[int, ServiceStop]]]:
+    """
+    Stored runs that (service_key, stops) trips could belong to, in one query:
+    service_key -> [[run, stops]], and their service_stops rows by run id and
+    station in a second.
+    """
+    first = min(_stop_span(trip)[0] for _, trip in trips)
+    last = max(_stop_span(trip)[1] for _, trip in trips)
+    nearby = and_(
+        ServiceRun.service_key.in_({service_key for service_key, _ in trips}),
+        ServiceRun.first_minute <= last + MAX_DWELL_MINUTES,
+        ServiceRun.last_minute >= first - MAX_DWELL_MINUTES,
+    )
+    runs: Dict[int, List[List]] = defaultdict(list)
+    for run in db.query(ServiceRun).filter(nearby).order_by(ServiceRun.id):
+        runs[run.service_key].append([run, decode_stops(run.first_minute, run.stops)])
+    rows: Dict[int, Dict[int, ServiceStop]] = defaultdict(dict)
+    if runs:
+        for row in db.query(ServiceStop).filter(
+            ServiceStop.run_id.in_(select(ServiceRun.id).where(nearby))
+        ):
+            rows[row.run_id][row.station_key] = row
+    return runs, rows
+
+
+def _matching_run(
+    candidates: List[List], trip: Sequence[Stop]
+) -> Tuple[Optional[List], Optional[List[Stop]]]:
+    """The [run, stops] candidate trip belongs to, and its stops merged with trip."""
+    first, last = _stop_span(trip)
+    for candidate in candidates:
+        run_first, run_last = _stop_span(candidate[1])
+        if (
+            run_first <= last + MAX_DWELL_MINUTES
+            and run_last >= first - MAX_DWELL_MINUTES
+        ):
+            merged = merge_stops(candidate[1], trip)
+            if merged is not None:
+                return candidate, merged
+    return None, None
+
+
+def _set_run(run: ServiceRun, stops: List[Stop]) -> None:
+    """Store a run's calling pattern on its row."""
+    departures = [
+        stop.departure_minute for stop in stops if stop.departure_minute is not None
+    ]
+    run.first_minute, run.last_minute = _stop_span(stops)
+    run.last_departure_minute = max(departures)
+    run.stops = encode_stops(run.first_minute, stops)
+
+
+def _stop_rows(
+    run: ServiceRun, stops: List[Stop], existing: Dict[int, ServiceStop]
+) -> List[Dict[str, Optional[int]]]:
+    """
+    Bring a run's service_stops rows (existing, by station) in line with stops,
+    returning the values of the rows still to be inserted.
+    """
+    added = []
+    # Existing rows are updated in place so their ids, used as departure board
+    # cursors, stay stable as a run grows
+    for position, stop in enumerate(stops):
+        values = {
+            "position": position,
+            "arrival_minute": stop.arrival_minute,
+            "departure_minute": stop.departure_minute,
+        }
+        row = existing.get(stop.station_key)
+        if row is None:
+            added.append({"run_id": run.id, "station_key": stop.station_key, **values})
+            continue
+        for name, value in values.items():
+            setattr(row, name, value)
+    return added
+
+
+def upsert_service_runs(db: Session, rows: Sequence[Tuple]) -> int:
+    """
+    Merge (departure, arrival, from, to, service_id) rows into service runs.
+    Rows sharing a service, origin and departure are one fetched train; each is
+    merged into the run it matches or starts a new one. Candidate runs are
+    loaded in one query and merged in memory, so trips of the same train in one
+    upsert meet before anything is written; runs are flushed once to number new
+    ones, and new stops inserted in one executemany.
+    Returns:
+        int: Number of rows that were not already known
+    """
+    trips: Dict[Tuple[str, str, int], Set[Tuple[int, str]]] = defaultdict(set)
+    for departure, arrival, station_from, station_to, service_id in rows:
+        if station_to != station_from:
+            trips[(service_id, station_from, departure)].add((arrival, station_to))
+    if not trips:
+        return 0
+    station_keys = stations.keys(
+        db,
+        {
+            code
+            for _, _, station_from, station_to, _ in rows
+            for code in (station_from, station_to)
+        },
+    )
+    service_keys = services.keys(db, {service_id for service_id, _, _ in trips})
+    parsed = []
+    for (service_id, station_from, departure), calls in trips.items():
+        origin = station_keys[station_from]
+        trip = [Stop(origin, None, departure)]
+        seen = {origin}
+        for arrival, station_to in sorted(calls):
+            if station_keys[station_to] not in seen:
+                seen.add(station_keys[station_to])
+                trip.append(Stop(station_keys[station_to], arrival, None))
+        parsed.append((service_keys[service_id], trip))
+    runs, stop_rows = _candidate_runs(db, parsed)
+    # run -> its stops once every trip is merged
+    changed: Dict[ServiceRun, List[Stop]] = {}
+    inserted = 0
+    for service_key, trip in parsed:
+        origin, departure = trip[0].station_key, trip[0].departure_minute
+        candidate, merged = _matching_run(runs[service_key], trip)
+        if candidate is None:
+            run = ServiceRun(service_key=service_key)
+            db.add(run)
+            candidate = [run, []]
+            runs[service_key].append(candidate)
+            merged = sorted(trip, key=_stop_order)
+        known = _arrivals_after(candidate[1], origin, departure)
+        inserted += sum(
+            (stop.station_key, stop.arrival_minute) not in known for stop in trip[1:]
+        )
+        if merged != candidate[1]:
+            candidate[1] = changed[candidate[0]] = merged
+    for run, stops in changed.items():
+        _set_run(run, stops)
+    db.flush()
+    added = [
+        values
+        for run, stops in changed.items()
+        for values in _stop_rows(run, stops, stop_rows.get(run.id, {}))
+    ]
+    if added:
+        db.execute(ServiceStop.__table__.insert(), added)
+    db.commit()
+    return inserted
+
+
+def get_connections_in_window(
+    db: Session,
+    station_from: str,
+    station_to: str,
+    start_minute: int,
+    end_minute: int,
+) -> List[Tuple[int, int, int]]:
+    """
+    Rides from station_from to station_to departing in [start_minute, end_minute].
+    Returns:
+        List[Tuple[int, int, int]]: (departure_minute, arrival_minute, service_key)
+            rows ordered by departure
+    """
+    station_keys = stations.keys(db, (station_from, station_to), create=False)
+    if station_from not in station_keys or station_to not in station_keys:
+        return []
+    board, call = aliased(ServiceStop), aliased(ServiceStop)
+    rows = (
+        db.query(board.departure_minute, call.arrival_minute, ServiceRun.service_key)
+        .join(
+            call,
+            and_(
+                call.run_id == board.run_id,
+                call.station_key == station_keys[station_to],
+                call.position > board.position,
+            ),
+        )
+        .join(ServiceRun, ServiceRun.id == board.run_id)
+        .filter(
+            board.station_key == station_keys[station_from],
+            board.departure_minute >= start_minute,
+            board.departure_minute <= end_minute,
+            call.arrival_minute.isnot(None),
+        )
+        .order_by(board.departure_minute, call.arrival_minute)
+        .all()
+    )
+    return [tuple(row) for row in rows]
+
+
+def get_connections_departing(
+    db: Session, start_minute: int, end_minute: int
+) -> List[Tuple[int, int, str, str, str]]:
+    """
+    Every ride departing in [start_minute, end_minute), by departure.
+    Returns:
+        List[Tuple[int, int, str, str, str]]: (departure_minute, arrival_minute,
+            station_from, station_to, service_id) rows
+    """
+    board, call = aliased(ServiceStop), aliased(ServiceStop)
+    rows = (
+        db.query(
+            board.departure_minute,
+            call.arrival_minute,
+            board.station_key,
+            call.station_key,
+            ServiceRun.service_key,
+        )
+        .join(
+            call,
+            and_(call.run_id == board.run_id, call.position > board.position),
+        )
+        .join(ServiceRun, ServiceRun.id == board.run_id)
+        .filter(
+            board.departure_minute >= start_minute,
+            board.departure_minute < end_minute,
+            call.arrival_minute.isnot(None),
+        )
+        .order_by(board.departure_minute, call.arrival_minute)
+        .all()
+    )
+    return [
+        (
+            departure,
+            arrival,
+            stations.code(db, from_key),
+            stations.code(db, to_key),
+            services.code(db, service_key),
+        )
+        for departure, arrival, from_key, to_key, service_key in rows
+    ]
+
+
+def get_fastest_rides(db: Session) -> List[Tuple[str, str, int]]:
+    """
+    The fastest stored ride between every pair of stations on a common run
+    (a full aggregation over service_stops, for offline jobs).
+    Returns:
+        List[Tuple[str, str, int]]: (station_from, station_to, minutes) rows
+    """
+    stations.preload(db)
+    board, call = aliased(ServiceStop), aliased(ServiceStop)
+    rows = (
+        db.query(
+            board.station_key,
+            call.station_key,
+            func.min(call.arrival_minute - board.departure_minute),
+        )
+        .join(
+            call,
+            and_(call.run_id == board.run_id, call.position > board.position),
+        )
+        .filter(board.departure_minute.isnot(None), call.arrival_minute.isnot(None))
+        .group_by(board.station_key, call.station_key)
+    )
+    return [
+        (stations.code(db, from_key), stations.code(db, to_key), ride)
+        for from_key, to_key, ride in rows
+    ]
+
+
+def get_departures(
+    db: Session,
+    station_from: str,
+    after_minute: int,
+    after_id: Optional[int] = None,
+    limit: int = 20,
+    calling_at: Optional[str] = None,
+) -> List[Tuple[int, int, int, str, str, str]]:
+    """
+    Keyset-paginated departures from a station, ordered by (departure_minute, id)
+    where id is the service_stops row of the departure (see crud.get_departures).
+    With calling_at, only runs calling there afterwards are returned, with the
+    arrival there; otherwise each run shows its furthest known calling point.
+    Returns:
+        List[Tuple[int, int, int, str, str, str]]: (id, departure_minute,
+            arrival_minute, station_from, station_to, service_id) rows
+    """
+    from_key = stations.key(db, station_from, create=False)
+    if from_key is None:
+        return []
+    board, call = aliased(ServiceStop), aliased(ServiceStop)
+    query = (
+        db.query(
+            board.id,
+            board.departure_minute,
+            call.arrival_minute,
+            call.station_key,
+            ServiceRun.service_key,
+        )
+        .join(call, and_(call.run_id == board.run_id, call.position > board.position))
+        .join(ServiceRun, ServiceRun.id == board.run_id)
+        .filter(board.station_key == from_key, call.arrival_minute.isnot(None))
+    )
+    if after_id is None:
+        query = query.filter(board.departure_minute >= after_minute)
+    else:
+        query = query.filter(
+            tuple_(board.departure_minute, board.id) > tuple_(after_minute, after_id)
+        )
+    if calling_at:
+        to_key = stations.key(db, calling_at, create=False)
+        if to_key is None:
+            return []
+        query = query.filter(call.station_key == to_key)
+    else:
+        later = aliased(ServiceStop)
+        furthest = (
+            select(func.max(later.position))
+            .where(later.run_id == board.run_id, later.arrival_minute.isnot(None))
+            .scalar_subquery()
+        )
+        query = query.filter(call.position == furthest)
+    rows = query.order_by(board.departure_minute, board.id).limit(limit).all()
+    return [
+        (
+            row_id,
+            departure,
+            arrival,
+            station_from,
+            stations.code(db, to_key),
+            services.code(db, service_key),
+        )
+        for row_id, departure, arrival, to_key, service_key in rows
+    ]
+
+
+def evict_service_runs(db: Session, before_minute: int) -> int:
+    """
+    Delete runs with no departure at or after before_minute, and the fetch
+    coverage that ends before it.
+    Returns:
+        int: Number of rides deleted with them
+    """
+    expired = ServiceRun.last_departure_minute < before_minute
+    deleted = sum(
+        connection_count(decode_stops(first_minute, blob))
+        for first_minute, blob in db.query(
+            ServiceRun.first_minute, ServiceRun.stops
+        ).filter(expired)
+    )
+    db.execute(
+        delete(ServiceStop).where(
+            ServiceStop.run_id.in_(select(ServiceRun.id).where(expired))
+        )
+    )
+    db.execute(delete(ServiceRun).where(expired))
+    db.execute(delete(FetchCoverage).where(FetchCoverage.end_minute < before_minute))
+    db.commit()
+    return deleted
@@ -0,0 +1,349 @@
+"""
+Prebuilt, memory-mapped timetable snapshots.
+A snapshot is a flat binary file holding one day's connections as fixed-width
+records sorted by departure, a station-code index and a service-id string table.
+Processes map the file read-only and query it in place, so forked workers share
+the same page-cache memory and startup does not touch the database.
+"""
+
+import logging
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from datetime import date, datetime
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.uk_train_schedule.store import get_store
+from app.uk_train_schedule.timeconv import LONDON, service_day
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"UKTTSNAP"
+VERSION = 1
+# magic, version, records, stations, services, window start/end, 8 section offsets
+_HEADER = struct.Struct("<8sIIIIii8Q")
+# departure_minute, arrival_minute, station_from, station_to, service (all int32)
+RECORD_FIELDS = 5
+RECORD_SIZE = RECORD_FIELDS * 4
+STATION_CODE_SIZE = 4
+
+
+class Connection(NamedTuple):
+    """A single scheduled hop between two stations, times in epoch minutes (UTC)."""
+
+    departure_minute: int
+    arrival_minute: int
+    station_from: str
+    station_to: str
+    service_id: str
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _int32_bytes(values: List[int]) -> bytes:
+    return struct.pack(f"<{len(values)}i", *values)
+
+
+def export_snapshot(db: Session, path: str, start_minute: int, end_minute: int) -> int:
+    """
+    Write all connections departing in [start_minute, end_minute) in the
+    timetable store to a snapshot file.
+    The file is written beside the target and renamed into place, so processes
+    that already mapped the previous snapshot keep a consistent view.
+    Returns:
+        int: Number of connections written
+    """
+    rows = get_store().connections_departing(db, start_minute, end_minute)
+    return write_snapshot(path, rows, start_minute, end_minute)
+
+
+def write_snapshot(path: str, rows, start_minute: int, end_minute: int) -> int:
+    """
+    Serialise (departure, arrival, from, to, service) rows sorted by departure.
+    """
+    stations = sorted({row[2] for row in rows} | {row[3] for row in rows})
+    station_index = {code: i for i, code in enumerate(stations)}
+    services = sorted({row[4] for row in rows})
+    service_index = {service: i for i, service in enumerate(services)}
+
+    records = []
+    by_origin: List[List[int]] = [[] for _ in stations]
+    for i, (dep, arr, station_from, station_to, service) in enumerate(rows):
+        origin = station_index[station_from]
+        records.extend(
+            (dep, arr, origin, station_index[station_to], service_index[service])
+        )
+        by_origin[origin].append(i)
+    origin_offsets = [0]
+    origin_records: List[int] = []
+    for indices in by_origin:
+        origin_records.extend(indices)
+        origin_offsets.append(len(origin_records))
+
+    service_offsets = [0]
+    blob = bytearray()
+    for service in services:
+        blob += service.encode("utf-8")
+        service_offsets.append(len(blob))
+
+    sections = [
+        _int32_bytes(records),
+        b"".join(
+            code.encode("ascii").ljust(STATION_CODE_SIZE, b"\0") for code in stations
+        ),
+        _int32_bytes(origin_offsets),
+        _int32_bytes(origin_records),
+        _int32_bytes(service_offsets),
+        bytes(blob),
+    ]
+    offsets = []
+    position = _align(_HEADER.size)
+    for section in sections:
+        offsets.append(position)
+        position = _align(position + len(section))
+    offsets.extend([position] * (8 - len(offsets)))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(
+            _HEADER.pack(
+                MAGIC,
+                VERSION,
+                len(rows),
+                len(stations),
+                len(services),
+                start_minute,
+                end_minute,
+                *offsets,
+            )
+        )
+        for offset, section in zip(offsets, sections):
+            fh.seek(offset)
+            fh.write(section)
+        fh.truncate(position)
+    os.replace(tmp_path, path)
+    logger.info("Wrote snapshot %s with %s connections", path, len(rows))
+    return len(rows)
+
+
+class TimetableSnapshot:
+    """
+    Read-only view over a memory-mapped snapshot file.
+    All accessors read straight from the mapping through memoryview casts.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _HEADER.unpack_from(self._mmap, 0)
+        magic, version = header[0], header[1]
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {VERSION} timetable snapshot")
+        self.path = path
+        (
+            self.record_count,
+            self.station_count,
+            self.service_count,
+            self.start_minute,
+            self.end_minute,
+        ) = header[2:7]
+        offsets = header[7:]
+        self._view = view = memoryview(self._mmap)
+        # Each section runs from its offset to the next one
+        (
+            records,
+            self._station_codes,
+            origin_offsets,
+            origin_records,
+            service_offsets,
+            self._service_blob,
+        ) = (view[start:end] for start, end in zip(offsets, offsets[1:7]))
+        self._records = records.cast("i")
+        self._origin_offsets = origin_offsets.cast("i")
+        self._origin_records = origin_records.cast("i")
+        self._service_offsets = service_offsets.cast("i")
+        self._records_offset = offsets[0]
+
+    def __len__(self) -> int:
+        return self.record_count
+
+    def __enter__(self) -> "TimetableSnapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for view in (
+            self._records,
+            self._station_codes,
+            self._origin_offsets,
+            self._origin_records,
+            self._service_offsets,
+            self._service_blob,
+            self._view,
+        ):
+            view.release()
+        self._mmap.close()
+
+    def station_code(self, index: int) -> str:
+        start, end = index * STATION_CODE_SIZE, (index + 1) * STATION_CODE_SIZE
+        raw = bytes(self._station_codes[start:end])
+        return raw.rstrip(b"\0").decode("ascii")
+
+    def station_index(self, code: str) -> Optional[int]:
+        """Binary search the sorted station table; None if the code is absent."""
+        index = bisect_left(range(self.station_count), code, key=self.station_code)
+        if index < self.station_count and self.station_code(index) == code:
+            return index
+        return None
+
+    def service_id(self, index: int) -> str:
+        start = self._service_offsets[index]
+        end = self._service_offsets[index + 1]
+        return bytes(self._service_blob[start:end]).decode("utf-8")
+
+    def record(self, index: int) -> Connection:
+        base = index * RECORD_FIELDS
+        r = self._records
+        return Connection(
+            r[base],
+            r[base + 1],
+            self.station_code(r[base + 2]),
+            self.station_code(r[base + 3]),
+            self.service_id(r[base + 4]),
+        )
+
+    def decode(self, raw: Tuple[int, int, int, int, int]) -> Connection:
+        """Decode a raw record yielded by scan()."""
+        departure, arrival, station_from, station_to, service = raw
+        return Connection(
+            departure,
+            arrival,
+            self.station_code(station_from),
+            self.station_code(station_to),
+            self.service_id(service),
+        )
+
+    def departures(
+        self,
+        station_from: str,
+        after_minute: int,
+        station_to: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Connection]:
+        """
+        Yield connections leaving station_from at or after after_minute, in
+        departure order, optionally only those arriving at station_to.
+        """
+        origin = self.station_index(station_from)
+        if origin is None:
+            return
+        destination = None
+        if station_to is not None:
+            destination = self.station_index(station_to)
+            if destination is None:
+                return
+        lo = self._origin_offsets[origin]
+        hi = self._origin_offsets[origin + 1]
+        order = self._origin_records
+        records = self._records
+        position = bisect_left(
+            range(lo, hi),
+            after_minute,
+            key=lambda i: records[order[i] * RECORD_FIELDS],
+        )
+        emitted = 0
+        for i in range(lo + position, hi):
+            index = order[i]
+            if (
+                destination is not None
+                and records[index * RECORD_FIELDS + 3] != destination
+            ):
+                continue
+            yield self.record(index)
+            emitted += 1
+            if limit is not None and emitted >= limit:
+                return
+
+    def scan(self, after_minute: int) -> Iterator[Tuple[int, int, int, int, int]]:
+        """
+        Yield raw (departure, arrival, from index, to index, service index) records
+        departing at or after after_minute, in departure order, without decoding
+        station codes or service ids.
+        """
+        records = self._records
+        start = bisect_left(
+            range(self.record_count),
+            after_minute,
+            key=lambda i: records[i * RECORD_FIELDS],
+        )
+        for base in range(
+            start * RECORD_FIELDS, self.record_count * RECORD_FIELDS, RECORD_FIELDS
+        ):
+            yield (
+                records[base],
+                records[base + 1],
+                records[base + 2],
+                records[base + 3],
+                records[base + 4],
+            )
+
+    def __iter__(self) -> Iterator[Connection]:
+        for index in range(self.record_count):
+            yield self.record(index)
+
+    def as_numpy(self):
+        """
+        Zero-copy structured NumPy view of the connection records (requires numpy).
+        """
+        import numpy as np
+
+        dtype = np.dtype(
+            [
+                ("departure_minute", "<i4"),
+                ("arrival_minute", "<i4"),
+                ("station_from", "<i4"),
+                ("station_to", "<i4"),
+                ("service", "<i4"),
+            ]
+        )
+        return np.frombuffer(
+            self._mmap,
+            dtype=dtype,
+            count=self.record_count,
+            offset=self._records_offset,
+        )
+
+
+def day_window(day: date) -> tuple[int, int]:
+    """
+    Epoch-minute bounds [start, end) of a UK service date.
+    """
+    start = service_day(day).epoch_minute("00:00")
+    return start, service_day(day).next().epoch_minute("00:00")
+
+
+def today() -> date:
+    """Current date in the UK."""
+    return datetime.now(LONDON).date()
+
+
+def get_snapshot() -> Optional[TimetableSnapshot]:
+    """
+    Return the process-wide snapshot mapped from settings.snapshot_path, or None
+    if no snapshot has been exported. Mapping before forking workers lets every
+    worker share the parent's mapping. The snapshot is replaced when the
+    timetable is reloaded (see snapshot_manager); callers keep the one they got
+    for the rest of their work.
+    """
+    from app.uk_train_schedule.snapshot_manager import get_snapshot_manager
+
+    generation = get_snapshot_manager().current()
+    return generation.snapshot if generation else None
@@ -0,0 +1,405 @@
+"""
+Hot reload of the timetable snapshot without stalling requests.
+SnapshotManager is double-buffered: the active generation (the mapped snapshot
+and the RaptorTimetable built over it) keeps serving while the next one is
+exported from the timetable store on a background thread, validated, and
+swapped in by replacing a single reference. A request holds on to the generation it
+started with, so in-flight work finishes on the old data; the old mapping is
+released when its last reference is dropped.
+Reloads are requested in processes that serve a snapshot by TIMETABLE_TOPIC
+events (bulk imports) and, after settings.snapshot_reload_delay_seconds so that
+a burst of fetches shares one build, by ROUTE_TOPIC events (fetched routes
+written). They coalesce: requests made while a build waits are absorbed by it,
+and requests made during a build schedule one more build after it. Across processes, builds take turns under a file lock, and
+a process that finds the snapshot was rebuilt by another since it asked maps
+that file instead of exporting it again, so every worker receiving the event
+costs one export rather than one each.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.settings import settings
+from app.uk_train_schedule import events
+from app.uk_train_schedule.raptor import RaptorTimetable
+from app.uk_train_schedule.snapshot import (
+    TimetableSnapshot,
+    day_window,
+    export_snapshot,
+    today,
+)
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotGeneration(NamedTuple):
+    """A swapped-in snapshot and the routing structure built over it."""
+
+    number: int
+    snapshot: TimetableSnapshot
+    timetable: RaptorTimetable
+    build_seconds: float
+    size_bytes: int
+
+
+class SnapshotStats(NamedTuple):
+    generation: int
+    connections: int
+    stations: int
+    size_bytes: int
+    start_minute: int
+    end_minute: int
+    build_seconds: float
+    builds: int
+    adopted: int
+    failures: int
+    building: bool
+
+
+def validate_snapshot(
+    snapshot: TimetableSnapshot, connections: int, start_minute: int, end_minute: int
+) -> None:
+    """
+    Check a freshly written snapshot before it is served: its header matches
+    what was exported, records are sorted by departure within the window, and
+    every station and service reference is in range.
+    Raises:
+        ValueError: Describing the first problem found.
+    """
+    if (snapshot.start_minute, snapshot.end_minute) != (start_minute, end_minute):
+        raise ValueError(
+            f"Snapshot window {snapshot.start_minute}-{snapshot.end_minute} "
+            f"differs from {start_minute}-{end_minute}"
+        )
+    if len(snapshot) != connections:
+        raise ValueError(
+            f"Snapshot holds {len(snapshot)} connections, {connections} exported"
+        )
+    previous = start_minute
+    for departure, arrival, station_from, station_to, service in snapshot.scan(
+        start_minute
+    ):
+        if not previous <= departure < end_minute or arrival < departure:
+            raise ValueError(f"Snapshot record out of order at minute {departure}")
+        if not (
+            0 <= station_from < snapshot.station_count
+            and 0 <= station_to < snapshot.station_count
+            and 0 <= service < snapshot.service_count
+        ):
+            raise ValueError(f"Snapshot record at minute {departure} is corrupt")
+        previous = departure
+
+
+@contextmanager
+def _exclusive(path: str) -> Iterator[None]:
+    """Hold an exclusive lock on path across processes (a no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _file_id(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+class SnapshotManager:
+    """
+    Owns the process's snapshot generations.
+    current() is lock-free: it reads the reference the builder last published.
+    """
+
+    # A rebuild of the same window may shrink to this fraction of the served
+    # snapshot; a smaller one is taken to be a broken database and rejected
+    min_ratio = 0.5
+
+    def __init__(
+        self,
+        path: str,
+        session_factory: Optional[Callable[[], Session]] = None,
+        window: Callable[[], Tuple[int, int]] = lambda: day_window(today()),
+    ):
+        self.path = path
+        self._session_factory = session_factory
+        self._window = window
+        self._current: Optional[SnapshotGeneration] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._builder: Optional[threading.Thread] = None
+        self._pending = False
+        # The builder has not started its build yet
+        self._waiting = False
+        # time.time_ns() of the latest reload request
+        self._requested_ns = 0
+        # Device and inode of the file the current generation maps
+        self._file: Optional[Tuple[int, int]] = None
+        self._builds = 0
+        self._adopted = 0
+        self._failures = 0
+
+    def _reset_after_fork(self) -> None:
+        # The builder thread does not survive a fork; the mapping does
+        self._lock = threading.Lock()
+        self._builder = None
+        self._pending = False
+        self._waiting = False
+
+    def current(self) -> Optional[SnapshotGeneration]:
+        """
+        The generation to serve, mapping the snapshot file on first use; None
+        if there is no snapshot.
+        """
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+                    self._loaded = True
+        return self._current
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        started = time.perf_counter()
+        try:
+            snapshot = TimetableSnapshot(self.path)
+        except (OSError, ValueError) as exc:
+            logger.error("Failed to map snapshot %s: %s", self.path, exc)
+            return
+        self._file = _file_id(self.path)
+        self._publish(snapshot, time.perf_counter() - started)
+        logger.info("Mapped snapshot %s (%s connections)", self.path, len(snapshot))
+
+    def _publish(
+        self, snapshot: TimetableSnapshot, build_seconds: float
+    ) -> SnapshotGeneration:
+        generation = SnapshotGeneration(
+            (self._current.number + 1) if self._current else 1,
+            snapshot,
+            RaptorTimetable(snapshot),
+            build_seconds,
+            os.path.getsize(snapshot.path),
+        )
+        # The swap: readers see either the old generation or the new one
+        self._current = generation
+        return generation
+
+    def rebuild(self, requested_ns: Optional[int] = None) -> SnapshotGeneration:
+        """
+        Bring the served generation up to date with data written before
+        requested_ns (time.time_ns(), now by default), on the calling thread.
+        Under the cross-process build lock, a snapshot file another process
+        started building after requested_ns is mapped as is; otherwise a new one
+        is exported, validated and swapped in. The previous generation stays in
+        use until then, and after it for requests that already hold it.
+        Raises:
+            ValueError: If the new snapshot fails validation (it is discarded).
+        """
+        if requested_ns is None:
+            requested_ns = time.time_ns()
+        self.current()
+        with _exclusive(f"{self.path}.lock"):
+            generation = self._adopt(requested_ns)
+            if generation is None:
+                generation = self._build()
+        return generation
+
+    def _adopt(self, requested_ns: int) -> Optional[SnapshotGeneration]:
+        """
+        Map the snapshot file if its build started after requested_ns (builds
+        stamp the file's mtime with their start) and it covers this window.
+        """
+        try:
+            if os.stat(self.path).st_mtime_ns < requested_ns:
+                return None
+        except FileNotFoundError:
+            return None
+        file = _file_id(self.path)
+        if file == self._file and self._current is not None:
+            return self._current
+        started = time.perf_counter()
+        try:
+            snapshot = TimetableSnapshot(self.path)
+        except (OSError, ValueError) as exc:
+            logger.warning("Not adopting snapshot %s: %s", self.path, exc)
+            return None
+        if (snapshot.start_minute, snapshot.end_minute) != self._window():
+            snapshot.close()
+            return None
+        self._file = file
+        generation = self._publish(snapshot, time.perf_counter() - started)
+        self._adopted += 1
+        logger.info(
+            "Swapped in snapshot generation %s (%s connections) built by another "
+            "process",
+            generation.number,
+            len(snapshot),
+        )
+        return generation
+
+    def _build(self) -> SnapshotGeneration:
+        start_minute, end_minute = self._window()
+        next_path = f"{self.path}.{os.getpid()}.next"
+        started_ns = time.time_ns()
+        started = time.perf_counter()
+        try:
+            session_factory = self._session_factory
+            if session_factory is None:
+                from database.session import create_session as session_factory
+            with session_factory() as db:
+                count = export_snapshot(db, next_path, start_minute, end_minute)
+            snapshot = TimetableSnapshot(next_path)
+            try:
+                validate_snapshot(snapshot, count, start_minute, end_minute)
+                served = self._current
+                if (
+                    served is not None
+                    and (served.snapshot.start_minute, served.snapshot.end_minute)
+                    == (start_minute, end_minute)
+                    and count < len(served.snapshot) * self.min_ratio
+                ):
+                    raise ValueError(
+                        f"Snapshot shrank from {len(served.snapshot)} to {count} "
+                        "connections"
+                    )
+                if count == 0:
+                    # Serving it would hide every connection in its window
+                    raise ValueError("Snapshot has no connections")
+                # Other processes compare the build's start with their request
+                os.utime(next_path, ns=(started_ns, started_ns))
+                # Mappings follow the file, so the path can take the new data
+                # for processes started later
+                os.replace(next_path, self.path)
+                snapshot.path = self.path
+                self._file = _file_id(self.path)
+                generation = self._publish(snapshot, time.perf_counter() - started)
+            except BaseException:
+                snapshot.close()
+                raise
+        except BaseException:
+            self._failures += 1
+            if os.path.exists(next_path):
+                os.unlink(next_path)
+            raise
+        self._builds += 1
+        logger.info(
+            "Swapped in snapshot generation %s (%s connections, %s bytes) built in %.2fs",
+            generation.number,
+            count,
+            generation.size_bytes,
+            generation.build_seconds,
+        )
+        return generation
+
+    def request_reload(self, delay: float = 0.0) -> None:
+        """
+        Rebuild on a background thread after delay seconds. Requests made before
+        the build starts are absorbed by it; if a build is already running, run
+        one more after it so it picks up data written in the meantime.
+        """
+        with self._lock:
+            self._requested_ns = time.time_ns()
+            if self._builder is not None and self._builder.is_alive():
+                if not self._waiting:
+                    self._pending = True
+                return
+            self._waiting = True
+            self._builder = threading.Thread(
+                target=self._build_loop,
+                args=(delay,),
+                name="snapshot-builder",
+                daemon=True,
+            )
+            self._builder.start()
+
+    def _build_loop(self, delay: float) -> None:
+        while True:
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                self._waiting = False
+                requested_ns = self._requested_ns
+            try:
+                self.rebuild(requested_ns)
+            except Exception as exc:
+                logger.error(
+                    "Snapshot rebuild failed, keeping the current one: %s", exc
+                )
+            with self._lock:
+                if not self._pending:
+                    self._builder = None
+                    return
+                self._pending = False
+                self._waiting = True
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Block until the background build, if any, has finished."""
+        builder = self._builder
+        if builder is not None:
+            builder.join(timeout)
+
+    def stats(self) -> SnapshotStats:
+        generation = self._current
+        snapshot = generation.snapshot if generation else None
+        return SnapshotStats(
+            generation=generation.number if generation else 0,
+            connections=len(snapshot) if snapshot else 0,
+            stations=snapshot.station_count if snapshot else 0,
+            size_bytes=generation.size_bytes if generation else 0,
+            start_minute=snapshot.start_minute if snapshot else 0,
+            end_minute=snapshot.end_minute if snapshot else 0,
+            build_seconds=round(generation.build_seconds, 3) if generation else 0.0,
+            builds=self._builds,
+            adopted=self._adopted,
+            failures=self._failures,
+            building=self._builder is not None,
+        )
+
+
+_manager: Optional[SnapshotManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_snapshot_manager() -> SnapshotManager:
+    """Return the process-wide manager for settings.snapshot_path."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = SnapshotManager(settings.snapshot_path)
+                os.register_at_fork(after_in_child=_manager._reset_after_fork)
+    return _manager
+
+
+def _on_timetable_replaced(key: str) -> None:
+    # Only processes serving a snapshot keep one up to date
+    if _manager is not None and _manager.current() is not None:
+        _manager.request_reload()
+
+
+def _on_route_written(key: str) -> None:
+    if _manager is not None and _manager.current() is not None:
+        _manager.request_reload(settings.snapshot_reload_delay_seconds)
+
+
+events.subscribe(events.TIMETABLE_TOPIC, _on_timetable_replaced)
+events.subscribe(events.ROUTE_TOPIC, _on_route_written)
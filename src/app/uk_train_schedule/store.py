@@ -0,0 +1,437 @@
+"""
+Pluggable storage for cached timetable data.
+TimetableStore is what the controller needs from a timetable cache: range
+lookups, bulk upserts, fetch coverage and eviction. The SQLAlchemy stores keep
+data in timetable_entries and fetch_coverage (with per-dialect write tuning);
+ServiceRunTimetableStore keeps one row per train run with its calling pattern
+(see service_runs); MemoryTimetableStore keeps it in process memory for
+single-process deployments.
+Cache events, departure rates and interchange times always live in the database.
+The backend is chosen by settings.timetable_store ("sql", "services" or "memory").
+"""
+
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Protocol, Sequence, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.settings import settings
+from app.uk_train_schedule import crud, service_runs
+
+logger = logging.getLogger(__name__)
+
+
+class StoredConnection(NamedTuple):
+    """A ride on a service between two stations, times in epoch minutes (UTC)."""
+
+    departure_minute: int
+    arrival_minute: int
+    station_from: str
+    station_to: str
+    service_id: str
+
+
+class Departure(NamedTuple):
+    """A departure board row; id orders rows departing in the same minute."""
+
+    id: int
+    departure_minute: int
+    arrival_minute: int
+    station_from: str
+    station_to: str
+    service_id: str
+
+
+class TimetableStore(Protocol):
+    """
+    Timetable cache operations. db is the request's session; stores that do not
+    keep timetable rows in the database ignore it.
+    """
+
+    def connections(
+        self,
+        db: Session,
+        station_from: str,
+        station_to: str,
+        start_minute: int,
+        end_minute: int,
+    ) -> List[Tuple[int, int, str]]:
+        """(departure, arrival, service_id) for a route in [start, end], by departure."""
+
+    def connections_departing(
+        self, db: Session, start_minute: int, end_minute: int
+    ) -> List[StoredConnection]:
+        """Every connection departing in [start, end), by departure."""
+
+    def departures(
+        self,
+        db: Session,
+        station_from: str,
+        after_minute: int,
+        after_id: Optional[int],
+        limit: int,
+        calling_at: Optional[str] = None,
+    ) -> List[Departure]:
+        """Keyset-paginated departure board (see crud.get_departures)."""
+
+    def upsert(self, db: Session, rows: Sequence[StoredConnection]) -> int:
+        """Insert rows, skipping ones already stored. Returns the number inserted."""
+
+    def is_covered(
+        self,
+        db: Session,
+        station_from: str,
+        calling_at: Optional[str],
+        start_minute: int,
+        end_minute: int,
+    ) -> bool:
+        """Whether departures in [start, end] have been fetched."""
+
+    def mark_covered(
+        self,
+        db: Session,
+        station_from: str,
+        calling_at: Optional[str],
+        start_minute: int,
+        end_minute: int,
+    ) -> None:
+        """Record that departures in [start, end] have been fetched."""
+
+    def evict(self, db: Session, before_minute: int) -> int:
+        """Drop connections departing and coverage ending before before_minute."""
+
+    def fastest_rides(self, db: Session) -> List[Tuple[str, str, int]]:
+        """(station_from, station_to, minutes) of the fastest stored ride per pair."""
+
+
+class SqlAlchemyTimetableStore:
+    """
+    Timetable cache in timetable_entries and fetch_coverage.
+    """
+
+    # Rows per executemany batch
+    batch_size = 500
+
+    def connections(self, db, station_from, station_to, start_minute, end_minute):
+        return [
+            (departure, arrival, crud.services.code(db, service_key))
+            for departure, arrival, service_key in crud.get_connections_in_window(
+                db, station_from, station_to, start_minute, end_minute
+            )
+        ]
+
+    def connections_departing(self, db, start_minute, end_minute):
+        return [
+            StoredConnection(*row)
+            for row in crud.get_connections_departing(db, start_minute, end_minute)
+        ]
+
+    def departures(
+        self, db, station_from, after_minute, after_id, limit, calling_at=None
+    ):
+        return [
+            Departure(
+                entry.id,
+                entry.departure_minute,
+                entry.arrival_minute,
+                entry.station_from,
+                entry.station_to,
+                entry.service_id,
+            )
+            for entry in crud.get_departures(
+                db, station_from, after_minute, after_id, limit, calling_at
+            )
+        ]
+
+    def _begin_bulk_write(self, db: Session) -> None:
+        """Hook for per-dialect session settings before a bulk write."""
+
+    def upsert(self, db, rows):
+        if not rows:
+            return 0
+        self._begin_bulk_write(db)
+        inserted = self._insert(db, rows)
+        db.commit()
+        return inserted
+
+    def _insert(self, db: Session, rows: Sequence[StoredConnection]) -> int:
+        """Write rows in the upsert's transaction; returns the number inserted."""
+        return crud.bulk_insert_timetable_entries(db, rows, self.batch_size)
+
+    def is_covered(self, db, station_from, calling_at, start_minute, end_minute):
+        return crud.is_window_covered(
+            db, station_from, calling_at, start_minute, end_minute
+        )
+
+    def mark_covered(self, db, station_from, calling_at, start_minute, end_minute):
+        crud.mark_window_covered(db, station_from, calling_at, start_minute, end_minute)
+
+    def evict(self, db, before_minute):
+        return crud.evict_timetable_entries(db, before_minute)
+
+    def fastest_rides(self, db):
+        return crud.get_fastest_rides(db)
+
+
+class SqliteTimetableStore(SqlAlchemyTimetableStore):
+    """
+    SQLite: rows go to sqlite3's executemany as key tuples through one compiled
+    statement, skipping SQLAlchemy's per-row parameter processing. The driver
+    runs in process, so there are no round trips to save and batches are only
+    bounded to cap memory.
+    """
+
+    batch_size = 5000
+
+    def _insert(self, db, rows):
+        return crud.bulk_insert_timetable_entries(db, rows, self.batch_size, raw=True)
+
+
+class PostgresTimetableStore(SqlAlchemyTimetableStore):
+    """
+    PostgreSQL: large batches, committed without waiting for the WAL flush.
+    Losing the last moments of cache writes in a crash only means refetching them.
+    """
+
+    batch_size = 5000
+
+    def _begin_bulk_write(self, db):
+        db.execute(text("SET LOCAL synchronous_commit TO OFF"))
+
+
+class ServiceRunTimetableStore:
+    """
+    Timetable cache in service_runs and service_stops: each train run is stored
+    once with its calling pattern and indexed by station, so a service calling
+    at n stations takes n index rows instead of a row per station pair.
+    """
+
+    def connections(self, db, station_from, station_to, start_minute, end_minute):
+        return [
+            (departure, arrival, crud.services.code(db, service_key))
+            for departure, arrival, service_key in service_runs.get_connections_in_window(
+                db, station_from, station_to, start_minute, end_minute
+            )
+        ]
+
+    def connections_departing(self, db, start_minute, end_minute):
+        return [
+            StoredConnection(*row)
+            for row in service_runs.get_connections_departing(
+                db, start_minute, end_minute
+            )
+        ]
+
+    def departures(
+        self, db, station_from, after_minute, after_id, limit, calling_at=None
+    ):
+        return [
+            Departure(*row)
+            for row in service_runs.get_departures(
+                db, station_from, after_minute, after_id, limit, calling_at
+            )
+        ]
+
+    def upsert(self, db, rows):
+        if not rows:
+            return 0
+        return service_runs.upsert_service_runs(db, rows)
+
+    def is_covered(self, db, station_from, calling_at, start_minute, end_minute):
+        return crud.is_window_covered(
+            db, station_from, calling_at, start_minute, end_minute
+        )
+
+    def mark_covered(self, db, station_from, calling_at, start_minute, end_minute):
+        crud.mark_window_covered(db, station_from, calling_at, start_minute, end_minute)
+
+    def evict(self, db, before_minute):
+        return service_runs.evict_service_runs(db, before_minute)
+
+    def fastest_rides(self, db):
+        return service_runs.get_fastest_rides(db)
+
+
+class MemoryTimetableStore:
+    """
+    Timetable cache held in process memory, for single-process deployments
+    (each worker process would hold its own copy). Rows are kept sorted per route
+    and per origin so lookups are binary searches.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._next_id = 1
+            self._keys: Set[Tuple[str, str, str, int]] = set()
+            # (from, to) -> sorted (departure, arrival, service_id)
+            self._routes: Dict[Tuple[str, str], List[Tuple[int, int, str]]] = (
+                defaultdict(list)
+            )
+            # from -> sorted (departure, id, arrival, to, service_id)
+            self._origins: Dict[str, List[Tuple[int, int, int, str, str]]] = (
+                defaultdict(list)
+            )
+            # (from, service, departure) -> furthest arrival
+            self._furthest: Dict[Tuple[str, str, int], int] = {}
+            # (from, calling_at) -> [(start, end)]
+            self._coverage: Dict[Tuple[str, str], List[Tuple[int, int]]] = defaultdict(
+                list
+            )
+
+    def connections(self, db, station_from, station_to, start_minute, end_minute):
+        with self._lock:
+            rows = self._routes.get((station_from, station_to), [])
+            lo = bisect_left(rows, (start_minute,))
+            hi = bisect_right(rows, (end_minute, float("inf")))
+            return rows[lo:hi]
+
+    def connections_departing(self, db, start_minute, end_minute):
+        result = []
+        with self._lock:
+            for station_from, rows in self._origins.items():
+                lo = bisect_left(rows, (start_minute,))
+                hi = bisect_left(rows, (end_minute,))
+                result.extend(
+                    StoredConnection(departure, arrival, station_from, to, service)
+                    for departure, _, arrival, to, service in rows[lo:hi]
+                )
+        result.sort()
+        return result
+
+    def departures(
+        self, db, station_from, after_minute, after_id, limit, calling_at=None
+    ):
+        result = []
+        with self._lock:
+            rows = self._origins.get(station_from, [])
+            if after_id is None:
+                position = bisect_left(rows, (after_minute,))
+            else:
+                position = bisect_right(rows, (after_minute, after_id, float("inf")))
+            for departure, row_id, arrival, to, service in rows[position:]:
+                if calling_at:
+                    if to != calling_at:
+                        continue
+                elif self._furthest[(station_from, service, departure)] > arrival:
+                    continue
+                result.append(
+                    Departure(row_id, departure, arrival, station_from, to, service)
+                )
+                if len(result) >= limit:
+                    break
+        return result
+
+    def upsert(self, db, rows):
+        inserted = 0
+        with self._lock:
+            for departure, arrival, station_from, station_to, service in rows:
+                key = (service, station_from, station_to, departure)
+                if key in self._keys:
+                    continue
+                self._keys.add(key)
+                insort(
+                    self._routes[(station_from, station_to)],
+                    (departure, arrival, service),
+                )
+                insort(
+                    self._origins[station_from],
+                    (departure, self._next_id, arrival, station_to, service),
+                )
+                self._next_id += 1
+                furthest = (station_from, service, departure)
+                self._furthest[furthest] = max(
+                    arrival, self._furthest.get(furthest, arrival)
+                )
+                inserted += 1
+        return inserted
+
+    def is_covered(self, db, station_from, calling_at, start_minute, end_minute):
+        filters = [""] if not calling_at else [calling_at, ""]
+        with self._lock:
+            return any(
+                start <= start_minute and end >= end_minute
+                for key in filters
+                for start, end in self._coverage.get((station_from, key), [])
+            )
+
+    def mark_covered(self, db, station_from, calling_at, start_minute, end_minute):
+        with self._lock:
+            self._coverage[(station_from, calling_at or "")].append(
+                (start_minute, end_minute)
+            )
+
+    def evict(self, db, before_minute):
+        with self._lock:
+            kept = [
+                StoredConnection(departure, arrival, station_from, to, service)
+                for station_from, rows in self._origins.items()
+                for departure, _, arrival, to, service in rows
+                if departure >= before_minute
+            ]
+            evicted = len(self._keys) - len(kept)
+            coverage = {
+                key: [window for window in windows if window[1] >= before_minute]
+                for key, windows in self._coverage.items()
+            }
+            self.clear()
+            self.upsert(None, kept)
+            self._coverage.update(coverage)
+        return evicted
+
+    def fastest_rides(self, db):
+        with self._lock:
+            return [
+                (
+                    station_from,
+                    station_to,
+                    min(arrival - departure for departure, arrival, _ in rows),
+                )
+                for (station_from, station_to), rows in self._routes.items()
+                if rows
+            ]
+
+
+_store: Optional[TimetableStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> TimetableStore:
+    """
+    Return the process-wide timetable store selected by settings.timetable_store.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _create_store(settings.timetable_store)
+    return _store
+
+
+def _create_store(backend: str) -> TimetableStore:
+    if backend == "memory":
+        if settings.workers != 1:
+            logger.warning(
+                "The memory timetable store is per process; each worker keeps its "
+                "own cache"
+            )
+        return MemoryTimetableStore()
+    if backend == "services":
+        return ServiceRunTimetableStore()
+    if backend != "sql":
+        raise ValueError(f"Unknown timetable_store backend: {backend}")
+    from database.session import get_engine
+
+    dialect = get_engine().dialect.name
+    if dialect == "sqlite":
+        return SqliteTimetableStore()
+    if dialect == "postgresql":
+        return PostgresTimetableStore()
+    return SqlAlchemyTimetableStore()
@@ -0,0 +1,113 @@
+"""
+Time conversion helpers for timetable ingestion and queries.
+TransportAPI reports wall-clock "HH:MM" times in UK local time for a service date;
+the cache stores them as integer minutes since the Unix epoch (UTC).
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+LONDON = ZoneInfo("Europe/London")
+MINUTES_PER_DAY = 24 * 60
+_EPOCH_DATE = date(1970, 1, 1)
+
+# Lookup table for every valid "HH:MM" string, avoiding strptime per row
+_HHMM_MINUTES = {
+    f"{hour:02d}:{minute:02d}": hour * 60 + minute
+    for hour in range(24)
+    for minute in range(60)
+}
+
+
+def hhmm_to_minutes(value: str) -> int:
+    """
+    Convert an "HH:MM" string into minutes since midnight.
+    Raises:
+        ValueError: If the value is not a valid "HH:MM" time.
+    """
+    try:
+        return _HHMM_MINUTES[value]
+    except (KeyError, TypeError):
+        raise ValueError(f"Invalid HH:MM time: {value!r}") from None
+
+
+def localize(value: datetime) -> datetime:
+    """
+    Attach Europe/London to naive datetimes; aware datetimes are returned unchanged.
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=LONDON)
+    return value
+
+
+def to_epoch_minute(value: datetime | int) -> int:
+    """
+    Convert a datetime into whole minutes since the Unix epoch (UTC).
+    Naive datetimes are interpreted as UK local time. Integers pass through unchanged.
+    """
+    if isinstance(value, int):
+        return value
+    return int(localize(value).timestamp()) // 60
+
+
+def from_epoch_minute(minute: int, tz=timezone.utc) -> datetime:
+    """
+    Convert minutes since the Unix epoch into an aware datetime in the given timezone.
+    """
+    return datetime.fromtimestamp(minute * 60, tz)
+
+
+class ServiceDay:
+    """
+    Converts "HH:MM" local times on a single service date into epoch minutes.
+    The UTC offset is resolved once per date; only DST changeover days fall back
+    to a per-minute table built from the timezone database.
+    """
+
+    __slots__ = ("date", "_utc_base", "_table")
+
+    def __init__(self, service_date: date):
+        self.date = service_date
+        midnight = datetime.combine(service_date, time(), tzinfo=LONDON)
+        next_midnight = datetime.combine(
+            service_date + timedelta(days=1), time(), tzinfo=LONDON
+        )
+        local_base = (service_date - _EPOCH_DATE).days * MINUTES_PER_DAY
+        start_offset = midnight.utcoffset()
+        if start_offset == next_midnight.utcoffset():
+            self._utc_base = local_base - int(start_offset.total_seconds()) // 60
+            self._table = None
+        else:
+            self._utc_base = 0
+            self._table = [
+                to_epoch_minute(
+                    datetime.combine(service_date, time(m // 60, m % 60), tzinfo=LONDON)
+                )
+                for m in range(MINUTES_PER_DAY)
+            ]
+
+    def epoch_minute(self, hhmm: str) -> int:
+        """
+        Convert an "HH:MM" local time on this date into epoch minutes (UTC).
+        """
+        minute_of_day = hhmm_to_minutes(hhmm)
+        if self._table is None:
+            return self._utc_base + minute_of_day
+        return self._table[minute_of_day]
+
+    def next(self) -> "ServiceDay":
+        """
+        Return the ServiceDay for the following date (for services running past midnight).
+        """
+        return service_day(self.date + timedelta(days=1))
+
+
+@lru_cache(maxsize=64)
+def service_day(value: date | str) -> ServiceDay:
+    """
+    Return a cached ServiceDay for a date or "YYYY-MM-DD" string.
+    """
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return ServiceDay(value)
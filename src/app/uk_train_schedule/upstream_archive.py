@@ -0,0 +1,104 @@
+"""
+On-disk archive of raw TransportAPI responses for offline replay.
+With settings.upstream_mode = "record", every successful station_timetables
+response is stored gzip-compressed under a key derived from the URL and query
+parameters (credentials excluded, so recordings are portable between
+accounts). With "replay", responses are served from the archive and the network
+is never used; a request that was not recorded fails like an upstream error.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from app.settings import settings
+
+UPSTREAM_MODES = ("live", "record", "replay")
+# Query parameters that identify the caller rather than the request
+CREDENTIAL_PARAMS = frozenset({"app_id", "app_key"})
+
+
+def archive_key(url: str, params: Mapping[str, Any]) -> str:
+    """Stable key for a request: SHA-256 of the URL and sorted parameters."""
+    canonical = json.dumps(
+        [
+            url,
+            sorted(
+                (name, str(value))
+                for name, value in params.items()
+                if name not in CREDENTIAL_PARAMS
+            ),
+        ],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseArchive:
+    """
+    Directory of gzip-compressed JSON responses, fanned out by key prefix.
+    Writes go to a temporary file that is renamed into place, so a replaying
+    reader never sees a partial response.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def _file(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json.gz"
+
+    def get(self, url: str, params: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+        """The recorded response for a request, or None if there is none."""
+        try:
+            with gzip.open(self._file(archive_key(url, params)), "rb") as file:
+                return json.loads(file.read())
+        except FileNotFoundError:
+            return None
+
+    def put(self, url: str, params: Mapping[str, Any], data: Dict[str, Any]) -> Path:
+        """Record a response, replacing any earlier recording of the request."""
+        target = self._file(archive_key(url, params))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(
+                fileobj=raw, mode="wb", mtime=0
+            ) as file:
+                file.write(json.dumps(data, separators=(",", ":")).encode())
+            os.replace(temporary, target)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        return target
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.path.glob("*/*.json.gz"))
+
+
+_archive: Optional[ResponseArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_archive() -> Optional[ResponseArchive]:
+    """
+    The archive used by the current settings.upstream_mode, or None when live.
+    Raises:
+        ValueError: If upstream_mode is not one of UPSTREAM_MODES.
+    """
+    global _archive
+    mode = settings.upstream_mode
+    if mode not in UPSTREAM_MODES:
+        raise ValueError(f"Unknown upstream_mode: {mode!r}")
+    if mode == "live":
+        return None
+    path = Path(settings.upstream_archive_path)
+    if _archive is None or _archive.path != path:
+        with _archive_lock:
+            if _archive is None or _archive.path != path:
+                _archive = ResponseArchive(path)
+    return _archive
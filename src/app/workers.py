@@ -0,0 +1,86 @@
+"""
+Pre-forking process supervisor for running the API on multiple cores.
+The application is imported once in the parent (preload) and each worker is
+forked from it, sharing a single listening socket.
+"""
+
+import logging
+import os
+import signal
+import socket
+from typing import Dict
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _serve_worker(app, sock: socket.socket) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_config=None)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def run_workers(app, host: str, port: int, workers: int) -> None:
+    """
+    Serve a preloaded ASGI app from N forked worker processes.
+    Workers that exit unexpectedly are replaced until the supervisor receives
+    SIGTERM or SIGINT, which is forwarded to every worker.
+    Args:
+        app: Imported ASGI application
+        host (str): Interface to bind
+        port (int): Port to bind
+        workers (int): Number of worker processes
+    """
+    sock = _bind_socket(host, port)
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve_worker(app, sock)
+            finally:
+                os._exit(0)
+        children[pid] = slot
+        logger.info("Started worker %s (pid %s)", slot, pid)
+
+    def shutdown(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    logger.info("Listening on %s:%s with %s workers", host, port, workers)
+    for slot in range(workers):
+        spawn(slot)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            logger.warning(
+                "Worker %s (pid %s) exited with %s; restarting", slot, pid, status
+            )
+            spawn(slot)
+    sock.close()
@@ -0,0 +1,58 @@
+"""
+Dialect-aware statement helpers shared by the data access layer.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import Table, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def _insert_ignore_statement(db: Session, table: Table):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return insert(table).prefix_with("IGNORE")
+
+
+def insert_ignore(db: Session, table: Table, rows: List[Dict]) -> int:
+    """
+    Insert rows, silently skipping any that violate a unique constraint.
+    Uses ON CONFLICT DO NOTHING on SQLite and PostgreSQL, so duplicates neither
+    abort the surrounding transaction nor need a round trip per row.
+    Returns:
+        int: Number of rows actually inserted (-1 if the driver cannot tell)
+    """
+    if not rows:
+        return 0
+    return db.execute(_insert_ignore_statement(db, table), rows).rowcount
+
+
+def insert_ignore_tuples(
+    db: Session, table: Table, columns: Sequence[str], rows: List[Tuple]
+) -> int:
+    """
+    insert_ignore for rows given as tuples of the named columns, for bulk loads.
+    The statement is compiled once and the rows handed to the driver's
+    executemany as they are, skipping per-row parameter processing.
+    Returns:
+        int: Number of rows actually inserted (-1 if the driver cannot tell)
+    """
+    if not rows:
+        return 0
+    # inline: no RETURNING of generated keys, which executemany would discard
+    compiled = (
+        _insert_ignore_statement(db, table)
+        .inline()
+        .compile(dialect=db.get_bind().dialect, column_keys=list(columns))
+    )
+    if compiled.positional:
+        order = [columns.index(name) for name in compiled.positiontup]
+        if order != list(range(len(columns))):
+            rows = [tuple(row[i] for i in order) for row in rows]
+    else:
+        rows = [dict(zip(columns, row)) for row in rows]
+    return db.connection().exec_driver_sql(str(compiled), rows).rowcount
@@ -0,0 +1,87 @@
+"""
+Dialect-aware query plan inspection.
+capture_statements records the SQL a block of code executes; explain asks the
+database how it would run one of them (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on
+PostgreSQL), and indexes_used / full_scans read the answer.
+"""
+
+import re
+from contextlib import contextmanager
+from typing import Any, Iterator, List, NamedTuple, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_SQLITE_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(.*)$")
+_POSTGRES_INDEX = re.compile(
+    r"(?:Index (?:Only )?Scan(?: Backward)? using|Bitmap Index Scan on) (\w+)"
+)
+_POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+class CapturedStatement(NamedTuple):
+    """A statement as sent to the driver, with its parameters."""
+
+    sql: str
+    parameters: Any
+
+
+@contextmanager
+def capture_statements(db: Session) -> Iterator[List[CapturedStatement]]:
+    """
+    Collect the queries (SELECT, UPDATE, DELETE) executed on db's engine while
+    the block runs. Inserts are left out: they have no access path to check.
+    """
+    engine = db.get_bind()
+    captured: List[CapturedStatement] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(
+            ("SELECT", "UPDATE", "DELETE", "WITH")
+        ):
+            captured.append(CapturedStatement(statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def explain(db: Session, statement: CapturedStatement) -> List[str]:
+    """
+    The database's plan for a captured statement, one line per step.
+    The statement is not executed.
+    """
+    dialect = db.get_bind().dialect.name
+    connection = db.connection()
+    if dialect == "sqlite":
+        rows = connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement.sql}", statement.parameters
+        )
+        return [row[-1] for row in rows]
+    rows = connection.exec_driver_sql(f"EXPLAIN {statement.sql}", statement.parameters)
+    return [row[0] for row in rows]
+
+
+def indexes_used(plan: List[str]) -> Set[str]:
+    """Names of the indexes a plan reads."""
+    return {
+        name
+        for line in plan
+        for pattern in (_SQLITE_INDEX, _POSTGRES_INDEX)
+        for name in pattern.findall(line)
+    }
+
+
+def full_scans(plan: List[str]) -> Set[str]:
+    """Tables a plan reads in full, whether from the table or one of its indexes."""
+    tables = set()
+    for line in plan:
+        line = line.strip()
+        match = _SQLITE_SCAN.match(line)
+        if match and match.group(1) != "CONSTANT":
+            tables.add(match.group(1))
+        tables.update(_POSTGRES_SCAN.findall(line))
+    return tables
@@ -1,15 +1,79 @@
+import os
+import threading
+
 import sqlalchemy
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
 
+from app import deadline
 from app.settings import settings
 
-# Create the engine and sessionmaker once at import time (singleton pattern)
-engine = sqlalchemy.create_engine(settings.db_url, pool_pre_ping=True, future=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The engine is created on first use (not at import) and shared by the whole process
+_engine: Engine | None = None
+_engine_lock = threading.Lock()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets readers in other worker processes proceed during a write, and
+    # busy_timeout makes concurrent writers wait instead of failing immediately
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _check_deadline(conn, cursor, statement, parameters, context, executemany):
+    # Statements issued for a request that is past its deadline or abandoned by
+    # its client are not started (raises DeadlineExceeded/RequestCancelled)
+    deadline.check()
+
+
+def get_engine() -> Engine:
+    """
+    Return the process-wide engine, creating it on first use.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = sqlalchemy.create_engine(
+                    settings.db_url, pool_pre_ping=True, future=True
+                )
+                if engine.dialect.name == "sqlite":
+                    sqlalchemy.event.listen(engine, "connect", _configure_sqlite)
+                sqlalchemy.event.listen(
+                    engine, "before_cursor_execute", _check_deadline
+                )
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def create_session() -> Session:
+    """Open a new session bound to the shared engine."""
+    get_engine()
+    return SessionLocal()
+
+
+def dispose_engine() -> None:
+    """Close pooled connections (used on application shutdown)."""
+    if _engine is not None:
+        _engine.dispose()
+
+
+def _after_fork_in_child() -> None:
+    # Pooled connections must not be shared with forked worker processes
+    if _engine is not None:
+        _engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
 
 
 def get_db():
-    db = SessionLocal()
+    db = create_session()
     try:
         yield db
     finally:
@@ -1,13 +1,35 @@
 import logging
+import os
 
+from app.logs import configure_logging
 from app.router import app  # noqa: F401
+from app.settings import settings
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
-)
 
-if __name__ == "__main__":
-    import uvicorn
+def run() -> None:
+    """
+    Run the API: an auto-reloading single process in DEV, otherwise
+    settings.workers preloaded worker processes (0 means one per CPU).
+    """
+    configure_logging()
+    if settings.env == "DEV" and settings.workers <= 1:
+        import uvicorn
+
+        logging.info("Starting FastAPI app with Uvicorn...")
+        uvicorn.run("main:app", host=settings.host, port=settings.port, reload=True)
+    else:
+        from app.uk_train_schedule.graph import get_graph
+        from app.uk_train_schedule.snapshot import get_snapshot
+        from app.workers import run_workers
+
+        # Map the snapshot and graph before forking so workers share one
+        # page-cache copy
+        get_snapshot()
+        get_graph()
+        workers = settings.workers or os.cpu_count() or 1
+        logging.info("Starting FastAPI app with %s workers...", workers)
+        run_workers(app, settings.host, settings.port, workers)
 
-    logging.info("Starting FastAPI app with Uvicorn...")
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+
+if __name__ == "__main__":
+    run()
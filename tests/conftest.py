@@ -1,6 +1,68 @@
 import logging
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Keep test databases out of the working tree; must run before app.settings is imported
+os.environ.setdefault(
+    "db_url", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test_train_schedule.db')}"
+)
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
 )
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database_tables():
+    from app.uk_train_schedule.models import create_all_tables
+
+    create_all_tables()
+    yield
+
+
+@pytest.fixture(scope="session")
+def sqlite_database(tmp_path_factory):
+    """Creates a scratch SQLite database with all tables; returns its sessionmaker."""
+    from app.uk_train_schedule.models import Base
+
+    engines = []
+
+    def create():
+        path = tmp_path_factory.mktemp("sqlite") / "test.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        engines.append(engine)
+        return sessionmaker(bind=engine)
+
+    yield create
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def sqlite_db(sqlite_database):
+    """A session on a fresh, empty SQLite database."""
+    with sqlite_database()() as session:
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def clear_process_caches():
+    from app.uk_train_schedule.cache import journey_cache
+    from app.uk_train_schedule.identifiers import services, stations
+    from app.uk_train_schedule.interchange import interchange_times
+
+    journey_cache.clear()
+    interchange_times.clear()
+    stations.clear()
+    services.clear()
+    yield
+    from app.uk_train_schedule.ingest import get_ingest_queue
+
+    # Background timetable writes must not outlive the test's database
+    get_ingest_queue().flush()
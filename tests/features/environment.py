@@ -1,4 +1,11 @@
 import logging
+import os
+import tempfile
+
+# Keep the BDD database out of the working tree; must run before app.settings is imported
+os.environ.setdefault(
+    "db_url", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bdd_train_schedule.db')}"
+)
 
 
 def before_all(context):
@@ -7,3 +14,7 @@ def before_all(context):
         format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
         force=True,  # Overwrites any previous logging config
     )
+
+    from app.uk_train_schedule.models import create_all_tables
+
+    create_all_tables()
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app import admission
+from app.admission import AdmissionController, Overloaded, Priority
+from app.health.router import admission_stats
+from app.router import app
+from app.uk_train_schedule import router as journey_router
+from app.uk_train_schedule.cache import journey_cache, journey_key
+from app.uk_train_schedule.timeconv import localize
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(1, 1, 5)
+        await controller.acquire(Priority.UNCACHED)
+        queued = asyncio.ensure_future(controller.acquire(Priority.UNCACHED))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as exc:
+            await controller.acquire(Priority.UNCACHED)
+        assert exc.value.status_code == 503
+        assert int(exc.value.headers["Retry-After"]) >= 1
+        controller.release(0.01)
+        await queued
+        return controller.stats()
+
+    stats = run(scenario())
+    assert (stats.in_flight, stats.queued) == (1, 0)
+    assert (stats.admitted, stats.rejected) == (2, 1)
+
+
+def test_cached_requests_are_admitted_first_and_displace_uncached():
+    async def scenario():
+        controller = AdmissionController(1, 2, 5)
+        await controller.acquire(Priority.UNCACHED)
+        order = []
+
+        async def request(name, priority):
+            try:
+                await controller.acquire(priority)
+            except Overloaded:
+                order.append(f"{name} rejected")
+                return
+            order.append(name)
+            controller.release()
+
+        tasks = [asyncio.ensure_future(request("uncached-1", Priority.UNCACHED))]
+        tasks.append(asyncio.ensure_future(request("uncached-2", Priority.UNCACHED)))
+        await asyncio.sleep(0)
+        # the queue is full: the newest uncached request gives up its place
+        tasks.append(asyncio.ensure_future(request("cached", Priority.CACHED)))
+        await asyncio.sleep(0)
+        controller.release()
+        await asyncio.gather(*tasks)
+        return order, controller.stats()
+
+    order, stats = run(scenario())
+    assert order == ["uncached-2 rejected", "cached", "uncached-1"]
+    assert stats.shed == 1 and stats.in_flight == 0
+
+
+def test_queued_request_times_out():
+    async def scenario():
+        controller = AdmissionController(1, 4, 5)
+        await controller.acquire(Priority.CACHED)
+        with pytest.raises(Overloaded):
+            await controller.acquire(Priority.CACHED, timeout=0.01)
+        controller.release()
+        return controller.stats()
+
+    stats = run(scenario())
+    assert (stats.timed_out, stats.queued, stats.in_flight) == (1, 0, 0)
+
+
+def test_saturated_journey_endpoint_returns_503(monkeypatch):
+    controller = AdmissionController(1, 0, 5)
+    run(controller.acquire(Priority.UNCACHED))  # hold the only slot
+    monkeypatch.setattr(admission, "_admission", controller)
+    response = TestClient(app).post(
+        "/v1/journey/",
+        json={"station_codes": ["AAA", "BBB"], "max_wait": 10},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert admission_stats().rejected == 1
+
+
+def test_cached_journey_is_classified_cached():
+    query = "station_codes=QQA&station_codes=QQB&start_time=2025-06-16T10:00:00"
+
+    def request(max_wait):
+        return Request(
+            {
+                "type": "http",
+                "method": "GET",
+                "path": "/v1/journey/",
+                "query_string": f"{query}&max_wait={max_wait}".encode(),
+                "headers": [],
+            }
+        )
+
+    start = localize(datetime(2025, 6, 16, 10, 0))
+    key = journey_key(["QQA", "QQB"], start, 5)
+    journey_cache.put(key, "2025-06-16T10:30:00+01:00", journey_cache.generation)
+    priority = run(journey_router.journey_priority(request(5)))
+    assert priority == Priority.CACHED
+    assert run(journey_router.journey_priority(request(6))) == Priority.UNCACHED
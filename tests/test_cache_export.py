@@ -0,0 +1,110 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import func, select
+
+from app import cli
+from app.settings import settings
+from app.uk_train_schedule import cache_export, crud
+from app.uk_train_schedule.cache_export import export_cache, import_cache
+from app.uk_train_schedule.identifiers import services, stations
+from app.uk_train_schedule.models import DepartureRate, TimetableEntry
+
+ROWS = [
+    (100, 130, "AAA", "BBB", "s1"),
+    (100, 160, "AAA", "CCC", "s1"),
+    (110, 140, "AAA", "BBB", "s2"),
+    (120, 150, "BBB", "CCC", "s3"),
+    (200, 230, "AAA", "BBB", "s4"),
+]
+
+
+@pytest.fixture
+def source(sqlite_db):
+    crud.bulk_insert_timetable_entries(sqlite_db, ROWS)
+    crud.mark_window_covered(sqlite_db, "AAA", None, 100, 180)
+    crud.mark_window_covered(sqlite_db, "AAA", None, 180, 240)
+    crud.record_departure_rate(sqlite_db, "AAA", None, 12.5)
+    sqlite_db.commit()
+    return sqlite_db
+
+
+@pytest.fixture
+def target(sqlite_database):
+    stations.clear()
+    services.clear()
+    db = sqlite_database()()
+    # Different keys from the source database
+    stations.keys(db, ["ZZZ", "CCC"])
+    services.keys(db, ["s9"])
+    yield db
+    db.close()
+
+
+def connections(db):
+    return sorted(
+        (dep, arr, from_code, to_code, service)
+        for (dep, arr, from_code, to_code, service) in (
+            (
+                entry.departure_minute,
+                entry.arrival_minute,
+                entry.station_from,
+                entry.station_to,
+                entry.service_id,
+            )
+            for entry in db.query(TimetableEntry)
+        )
+    )
+
+
+def test_round_trip_across_databases(source, target, tmp_path):
+    path = str(tmp_path / "cache.ukcol")
+    with patch.object(cache_export, "CHUNK_ROWS", 2):
+        exported = export_cache(source, path)
+    assert exported == (5, 2, 1)
+    with patch("app.uk_train_schedule.events.publish") as publish:
+        imported = import_cache(target, path)
+    assert imported == exported
+    assert connections(target) == sorted(ROWS)
+    assert crud.is_window_covered(target, "AAA", None, 100, 180)
+    assert crud.is_window_covered(target, "AAA", None, 180, 240)
+    assert target.get(DepartureRate, ("AAA", "")).departures_per_hour == 12.5
+    assert publish.call_args.args[1:] == ("timetable", "cache.ukcol")
+    # importing again skips the rows already cached
+    import_cache(target, path)
+    assert target.scalar(select(func.count()).select_from(TimetableEntry)) == 5
+
+
+def test_window_export_keeps_only_covered_windows_inside(source, target, tmp_path):
+    path = str(tmp_path / "window.ukcol")
+    assert export_cache(source, path, 100, 180) == (4, 1, 1)
+    import_cache(target, path)
+    assert [row[0] for row in connections(target)] == [100, 100, 110, 120]
+    assert not crud.is_window_covered(target, "AAA", None, 180, 240)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not an export" * 4)
+    with pytest.raises(ValueError):
+        import_cache(None, str(path))
+
+
+@pytest.mark.parametrize("backend", ["memory", "services"])
+def test_rejects_stores_outside_timetable_entries(source, tmp_path, backend, capsys):
+    path = str(tmp_path / "cache.cols")
+    with patch.object(settings, "timetable_store", backend):
+        with pytest.raises(ValueError, match="timetable_store=sql"):
+            export_cache(source, path)
+        with patch("database.session.create_session", return_value=source):
+            assert cli.main(["export-cache", path]) == 2
+            assert cli.main(["import-cache", path]) == 2
+    assert "timetable_store=sql" in capsys.readouterr().err
+
+
+def test_parquet_round_trip(source, target, tmp_path):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "cache.parquet")
+    assert export_cache(source, path) == (5, 2, 1)
+    assert import_cache(target, path) == (5, 2, 1)
+    assert connections(target) == sorted(ROWS)
@@ -4,7 +4,7 @@ Covers all major controller functions, error handling, and edge cases.
 Follows best practices for logging, patching, and assertions.
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Any, Generator
 from unittest.mock import MagicMock, patch
 
@@ -13,6 +13,7 @@ import pytest
 from fastapi import status
 
 from app.uk_train_schedule import controller
+from app.uk_train_schedule.timeconv import to_epoch_minute
 
 
 @pytest.fixture
@@ -22,21 +23,6 @@ def db() -> Generator[Any, None, None]:
     return db
 
 
-def test_parse_time() -> None:
-    """Test parsing of date and time strings."""
-    dt = controller.parse_time("2025-06-16", "10:00")
-    assert dt == datetime(2025, 6, 16, 10, 0)
-
-
-def test_timetable_cache_hit_returns_none_on_exception(db: Any) -> None:
-    """Test _timetable_cache_hit returns None on DB exception."""
-    db.query.side_effect = Exception("fail")
-    result = controller._timetable_cache_hit(
-        db, "AAA", "BBB", datetime.now(), datetime.now()
-    )
-    assert result is None
-
-
 def test_fetch_timetable_from_api_malformed(monkeypatch: Any) -> None:
     """Test _fetch_timetable_from_api raises on malformed response."""
 
@@ -118,80 +104,106 @@ def test_fetch_timetable_from_api_unexpected_error(monkeypatch: Any) -> None:
     assert "Unexpected error" in str(exc.value.detail)
 
 
-def test_store_timetable_entries_handles_no_date(db: Any) -> None:
-    """Test _store_timetable_entries handles missing date field."""
-    controller._store_timetable_entries(db, {}, "AAA", "BBB")
-    db.add.assert_not_called()
-
-
-def test_fetch_or_store_timetable_cache_hit(db: Any) -> None:
-    """Test fetch_or_store_timetable does not add if cache hit."""
-    with patch.object(controller, "_timetable_cache_hit", return_value=True):
-        controller.fetch_or_store_timetable(
-            db, "AAA", "BBB", datetime.now().isoformat(), 10
-        )
-    db.add.assert_not_called()
+def test_fetch_and_store_handles_no_date(db: Any) -> None:
+    """Test _fetch_and_store stores nothing when the response has no date."""
+    with patch.object(
+        controller, "_fetch_plan", return_value=controller.FetchPlan(60, 100)
+    ), patch.object(
+        controller, "_fetch_timetable_from_api", return_value={}
+    ), patch.object(
+        controller, "get_ingest_queue"
+    ) as queue, patch.object(
+        controller, "write_batches"
+    ) as write:
+        assert controller._fetch_and_store(db, "AAA", "BBB", 1000, 10) == []
+    queue.assert_not_called()
+    write.assert_not_called()
+
+
+def test_fetch_or_store_connections_cache_hit(db: Any) -> None:
+    """Test fetch_or_store_connections reads a covered window from the store."""
+    store = MagicMock()
+    store.is_covered.return_value = True
+    store.connections.return_value = [(1000, 1030, "svc1")]
+    with patch.object(controller, "get_store", return_value=store), patch.object(
+        controller, "_fetch_timetable_from_api"
+    ) as fetch_api:
+        rows = controller.fetch_or_store_connections(db, "AAA", "BBB", 1000, 1010)
+    assert rows == [(1000, 1030, "svc1")]
+    store.connections.assert_called_once_with(db, "AAA", "BBB", 1000, 1010)
+    fetch_api.assert_not_called()
 
 
 def test_find_earliest_journey_no_trains(db: Any) -> None:
     """Test find_earliest_journey raises if no trains found."""
     db.reset_mock()
-    with patch(
-        "app.uk_train_schedule.controller.get_earliest_timetable_entry",
-        return_value=None,
+    with patch.object(controller, "fetch_or_store_connections", return_value=[]):
+        with pytest.raises(controller.TransportAPIException) as exc:
+            controller.find_earliest_journey(db, ["AAA", "BBB"], datetime.now(), 10)
+        assert exc.value.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_fetch_or_store_connections_miss_fetches_whole_minutes(db: Any) -> None:
+    """Test a cache miss fetches from the window start, at minute precision."""
+    start = to_epoch_minute(datetime(2025, 6, 16, 10, 0, 42, 123456))
+    store = MagicMock()
+    store.is_covered.return_value = False
+    store.connections.return_value = []
+    with patch.object(controller, "get_store", return_value=store), patch.object(
+        controller, "_fetch_plan", return_value=controller.FetchPlan(60, 100)
+    ), patch.object(
+        controller,
+        "_fetch_timetable_from_api",
+        return_value={"date": "2025-06-16", "departures": {"all": []}},
+    ) as fetch_api, patch.object(
+        controller, "_write_batch"
+    ), patch.object(
+        controller.settings, "write_behind", False
     ):
-        with patch.object(controller, "fetch_or_store_timetable", return_value=None):
-            with patch(
-                "app.uk_train_schedule.controller.get_earliest_timetable_entry",
-                return_value=None,
-            ):
-                with pytest.raises(controller.TransportAPIException) as exc:
-                    controller.find_earliest_journey(
-                        db, ["AAA", "BBB"], datetime.now().isoformat(), 10
-                    )
-                assert exc.value.status_code == status.HTTP_404_NOT_FOUND
-
-
-def test_fetch_or_store_timetable_truncates_minute(db: Any) -> None:
-    """Test fetch_or_store_timetable truncates to minute precision."""
-    with patch(
-        "app.uk_train_schedule.controller._timetable_cache_hit"
-    ) as cache_hit, patch(
-        "app.uk_train_schedule.controller._fetch_timetable_from_api"
-    ) as fetch_api, patch(
-        "app.uk_train_schedule.controller._store_timetable_entries"
-    ) as store_entries:
-        cache_hit.return_value = None
-        fetch_api.return_value = {"date": "2025-06-16", "departures": {"all": []}}
-        dt = datetime(2025, 6, 16, 10, 0, 42, 123456)
-        controller.fetch_or_store_timetable(
-            db, "AAA", "BBB", dt.replace(second=0, microsecond=0).isoformat(), 30
+        rows = controller.fetch_or_store_connections(
+            db, "AAA", "BBB", start, start + 30
         )
-        args, _ = fetch_api.call_args
-        assert args[2].second == 0
-        assert args[2].microsecond == 0
+    assert rows == []
+    args, _ = fetch_api.call_args
+    assert args[2] == datetime(2025, 6, 16, 10, 0, tzinfo=controller.LONDON)
+    assert args[2].second == 0
+    assert args[2].microsecond == 0
 
 
 def test_find_earliest_journey_truncates_minute(db: Any) -> None:
     """Test find_earliest_journey truncates to minute precision."""
-    from app.uk_train_schedule.models import TimetableEntry
-
     dt = datetime(2025, 6, 16, 10, 0, 42, 123456)
-    entry = TimetableEntry(
-        service_id="svc1",
-        station_from="AAA",
-        station_to="BBB",
-        aimed_departure_time=dt.replace(second=0, microsecond=0),
-        aimed_arrival_time=dt.replace(second=0, microsecond=0) + timedelta(minutes=10),
-    )
-    with patch(
-        "app.uk_train_schedule.controller.get_earliest_timetable_entry",
-        return_value=entry,
-    ), patch(
-        "app.uk_train_schedule.controller.fetch_or_store_timetable", return_value=entry
+    departure = to_epoch_minute(dt)
+    with patch.object(
+        controller,
+        "fetch_or_store_connections",
+        return_value=[(departure, departure + 10, "svc1")],
     ):
-        arrival = controller.find_earliest_journey(
-            db, ["AAA", "BBB"], dt.isoformat(), 30
-        )
+        arrival = controller.find_earliest_journey(db, ["AAA", "BBB"], dt, 30)
         # Should be truncated to minute
         assert arrival.endswith(":00")
+
+
+def test_find_earliest_journey_prefers_faster_later_train(db: Any) -> None:
+    """A later departure within max_wait is taken when it arrives earlier."""
+    start = 1000
+    windows = []
+
+    def connections(db, station_from, station_to, start_minute, end_minute):
+        windows.append((station_from, station_to, start_minute, end_minute))
+        if station_from == "AAA":
+            # slow train first, fast train five minutes later
+            return [(start, start + 60, "1"), (start + 5, start + 30, "2")]
+        return [(start + 35, start + 50, "3"), (start + 65, start + 70, "4")]
+
+    with patch.object(
+        controller, "fetch_or_store_connections", side_effect=connections
+    ):
+        legs = controller.plan_journey(db, ["AAA", "BBB", "CCC"], start, 15)
+    assert [leg.service_id for leg in legs] == ["2", "3"]
+    assert legs[-1].arrival_minute == start + 50
+    # one window per leg, spanning every reachable arrival plus max_wait
+    assert windows == [
+        ("AAA", "BBB", start, start + 15),
+        ("BBB", "CCC", start + 30, start + 75),
+    ]
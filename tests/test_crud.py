@@ -5,16 +5,21 @@ import pytest
 from sqlalchemy.exc import IntegrityError
 
 from app.uk_train_schedule import crud
+from app.uk_train_schedule.identifiers import services, stations
 from app.uk_train_schedule.models import TimetableEntry
 
 
 @pytest.fixture
 def db():
+    # Known codes resolve from the identifier caches without touching the mock
+    stations._remember("AAA", 1)
+    stations._remember("BBB", 2)
+    services._remember("svc1", 1)
     db = MagicMock()
     db.query().filter_by().first.return_value = TimetableEntry(
-        service_id="svc1",
-        station_from="AAA",
-        station_to="BBB",
+        service_key=1,
+        station_from_key=1,
+        station_to_key=2,
         aimed_departure_time=datetime(2025, 6, 16, 10, 0, tzinfo=timezone.utc),
         aimed_arrival_time=datetime(2025, 6, 16, 11, 0, tzinfo=timezone.utc),
     )
@@ -35,9 +40,9 @@ def test_post_timetable_entry_duplicate(db):
     db.add.side_effect = IntegrityError("mock", "mock", "mock")
     db.commit.side_effect = IntegrityError("mock", "mock", "mock")
     db.query().filter_by().first.return_value = TimetableEntry(
-        service_id="svc1",
-        station_from="AAA",
-        station_to="BBB",
+        service_key=1,
+        station_from_key=1,
+        station_to_key=2,
         aimed_departure_time=datetime(2025, 6, 16, 10, 0, tzinfo=timezone.utc),
         aimed_arrival_time=datetime(2025, 6, 16, 11, 0, tzinfo=timezone.utc),
     )
@@ -49,9 +54,9 @@ def test_post_timetable_entry_duplicate(db):
 
 def test_get_timetable_entries(db):
     db.query().filter().order_by().first.return_value = TimetableEntry(
-        service_id="svc1",
-        station_from="AAA",
-        station_to="BBB",
+        service_key=1,
+        station_from_key=1,
+        station_to_key=2,
         aimed_departure_time=datetime(2025, 6, 16, 10, 0, tzinfo=timezone.utc),
         aimed_arrival_time=datetime(2025, 6, 16, 11, 0, tzinfo=timezone.utc),
     )
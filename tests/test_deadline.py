@@ -0,0 +1,173 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app import deadline
+from app.deadline import Deadline, DeadlineExceeded, RequestCancelled
+from app.router import app
+from app.settings import settings
+from app.uk_train_schedule import controller
+from app.uk_train_schedule import router as journey_router
+from app.uk_train_schedule.schema import JourneyRequest
+from database.session import create_session
+
+
+def test_deadline_caps_timeouts_and_raises_when_spent():
+    assert Deadline(None).timeout(30) == 30
+    assert 9 < Deadline(10).timeout(30) <= 10
+    with pytest.raises(DeadlineExceeded) as exc:
+        Deadline(-1).check()
+    assert exc.value.status_code == 504
+    cancelled = Deadline(10)
+    cancelled.cancel()
+    with pytest.raises(RequestCancelled) as exc:
+        cancelled.timeout(30)
+    assert exc.value.status_code == 499
+
+
+def test_request_timeout_from_header_or_settings(monkeypatch):
+    monkeypatch.setattr(settings, "request_timeout_seconds", 20.0)
+    monkeypatch.setattr(settings, "max_request_timeout_seconds", 60.0)
+    assert deadline.request_timeout(None) == 20.0
+    assert deadline.request_timeout(5.0) == 5.0
+    assert deadline.request_timeout(600.0) == 60.0
+    monkeypatch.setattr(settings, "request_timeout_seconds", 0.0)
+    assert deadline.request_timeout(None) is None
+
+
+def test_fetch_timeout_is_remaining_budget(monkeypatch: Any):
+    timeouts = []
+
+    def fake_get(self, url, params=None, timeout=None):
+        timeouts.append(timeout)
+        return httpx.Response(
+            200, json={"departures": {"all": []}}, request=httpx.Request("GET", url)
+        )
+
+    monkeypatch.setattr(httpx.Client, "get", fake_get)
+    controller._fetch_timetable_from_api("AAA", "BBB", datetime.now())
+    with deadline.use(Deadline(5)):
+        controller._fetch_timetable_from_api("AAA", "BBB", datetime.now())
+    assert timeouts[0] == controller.FETCH_TIMEOUT_SECONDS
+    assert 4 < timeouts[1] <= 5
+    with deadline.use(Deadline(-1)), pytest.raises(DeadlineExceeded):
+        controller._fetch_timetable_from_api("AAA", "BBB", datetime.now())
+    assert len(timeouts) == 2
+
+
+def test_upstream_timeout_on_spent_budget_is_deadline_exceeded(monkeypatch: Any):
+    def slow_get(self, url, params=None, timeout=None):
+        time.sleep(timeout)
+        raise httpx.TimeoutException("timeout")
+
+    monkeypatch.setattr(httpx.Client, "get", slow_get)
+    with deadline.use(Deadline(0.05)), pytest.raises(DeadlineExceeded):
+        controller._fetch_timetable_from_api("AAA", "BBB", datetime.now())
+
+
+def test_statements_are_not_started_past_the_deadline():
+    db = create_session()
+    try:
+        with deadline.use(Deadline(-1)), pytest.raises(DeadlineExceeded):
+            db.execute(text("SELECT 1"))
+        db.rollback()
+        assert db.execute(text("SELECT 1")).scalar() == 1
+    finally:
+        db.close()
+
+
+def slow_connections(db, station_from, station_to, start_minute, end_minute):
+    time.sleep(0.3)
+    return [(start_minute + 5, start_minute + 20, f"{station_from}{station_to}")]
+
+
+def test_journey_past_deadline_returns_504():
+    with patch.object(
+        controller, "fetch_or_store_connections", side_effect=slow_connections
+    ) as fetch:
+        response = TestClient(app).post(
+            "/v1/journey/",
+            json={
+                "station_codes": ["AAA", "BBB", "CCC"],
+                "start_time": "2025-03-01T09:13:00",
+                "max_wait": 30,
+            },
+            headers={"X-Request-Timeout": "0.2"},
+        )
+    assert response.status_code == 504
+    assert response.json()["detail"] == "Request deadline exceeded"
+    # the second leg is never fetched
+    assert fetch.call_count == 1
+
+
+def test_stream_past_deadline_reports_504_event():
+    def slow_second_leg(db, station_from, *args):
+        if station_from != "BBB":
+            return [(args[1] + 5, args[1] + 20, station_from)]
+        return slow_connections(db, station_from, *args)
+
+    with patch.object(
+        controller, "fetch_or_store_connections", side_effect=slow_second_leg
+    ):
+        response = TestClient(app).post(
+            "/v1/journey/stream",
+            json={
+                "station_codes": ["AAA", "BBB", "CCC", "DDD"],
+                "start_time": "2025-03-01T09:17:00",
+                "max_wait": 30,
+            },
+            headers={"X-Request-Timeout": "0.2"},
+        )
+    assert response.status_code == 200
+    events = response.text.strip().split("\n\n")
+    # the slow second leg completes; the third is not started
+    assert [event.split("\n")[0] for event in events] == [
+        "event: leg",
+        "event: leg",
+        "event: error",
+    ]
+    assert '"status_code": 504' in events[2]
+
+
+def test_stream_disconnect_cancels_deadline():
+    class Disconnected:
+        async def is_disconnected(self):
+            return True
+
+    request_deadline = Deadline(30)
+    req = JourneyRequest(station_codes=["AAA", "BBB"], max_wait=10)
+
+    async def consume():
+        return [
+            chunk
+            async for chunk in journey_router._journey_events(
+                req, Disconnected(), request_deadline
+            )
+        ]
+
+    assert asyncio.run(consume()) == []
+    assert request_deadline.cancelled
+
+
+def test_disconnect_watcher_cancels_in_flight_work(monkeypatch):
+    monkeypatch.setattr(settings, "disconnect_poll_seconds", 0.01)
+
+    class DisconnectsLater:
+        checks = 0
+
+        async def is_disconnected(self):
+            self.checks += 1
+            return self.checks > 2
+
+    request_deadline = Deadline(30)
+    asyncio.run(deadline._watch_disconnect(DisconnectsLater(), request_deadline))
+    assert request_deadline.cancelled
+    with deadline.use(request_deadline), pytest.raises(RequestCancelled):
+        deadline.check()
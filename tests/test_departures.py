@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.router import app
+from app.uk_train_schedule import controller
+from database.session import get_db
+
+UPSTREAM = {
+    "date": "2025-06-04",
+    "departures": {
+        "all": [
+            {
+                "service": f"svc{i}",
+                "aimed_departure_time": f"07:{10 + i * 5:02d}",
+                "station_detail": {
+                    "calling_at": [
+                        {
+                            "station_code": "SAJ",
+                            "aimed_arrival_time": f"07:{15 + i * 5:02d}",
+                        },
+                        {
+                            "station_code": "BXY",
+                            "aimed_arrival_time": f"07:{30 + i * 5:02d}",
+                        },
+                    ]
+                },
+            }
+            for i in range(5)
+        ]
+    },
+}
+
+
+@pytest.fixture
+def client(sqlite_database):
+    Session = sqlite_database()
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+
+
+def test_departure_board_fetches_once_and_paginates(client):
+    with patch.object(
+        controller, "_fetch_timetable_from_api", return_value=UPSTREAM
+    ) as fetch:
+        params = {"after": "2025-06-04T07:00:00+01:00", "limit": 3}
+        first = client.get("/v1/stations/LBG/departures", params=params)
+        assert first.status_code == 200
+        page = first.json()
+        assert [d["service_id"] for d in page["departures"]] == ["svc0", "svc1", "svc2"]
+        assert page["departures"][0]["destination"] == "BXY"
+        assert (
+            page["departures"][0]["aimed_departure_time"] == "2025-06-04T07:10:00+01:00"
+        )
+        second = client.get(
+            "/v1/stations/LBG/departures",
+            params={"cursor": page["next_cursor"], "limit": 3},
+        )
+        assert [d["service_id"] for d in second.json()["departures"]] == [
+            "svc3",
+            "svc4",
+        ]
+        assert second.json()["next_cursor"] is None
+        filtered = client.get(
+            "/v1/stations/LBG/departures",
+            params={**params, "calling_at": "SAJ"},
+        )
+        assert filtered.json()["departures"][0]["aimed_arrival_time"].startswith(
+            "2025-06-04T07:15"
+        )
+    assert fetch.call_count == 1
+
+
+def test_departure_board_rejects_bad_cursor(client):
+    resp = client.get("/v1/stations/LBG/departures", params={"cursor": "nope"})
+    assert resp.status_code == 400
+
+
+def test_departure_board_validates_station_code(client):
+    resp = client.get("/v1/stations/lbg/departures")
+    assert resp.status_code == 422
@@ -0,0 +1,35 @@
+import pytest
+
+from app.uk_train_schedule import events
+from app.uk_train_schedule.models import CacheEvent
+
+
+@pytest.fixture
+def db(sqlite_db):
+    events._reset_after_fork()
+    return sqlite_db
+
+
+def test_publish_dispatches_locally(db, monkeypatch):
+    monkeypatch.setattr(events, "_subscribers", {"route": []})
+    seen = []
+    events.subscribe("route", seen.append)
+    events.publish(db, "route", events.route_key("AAA", "BBB"))
+    assert seen == ["AAA:BBB"]
+    assert db.query(CacheEvent).count() == 1
+
+
+def test_poll_dispatches_events_from_other_workers(db, monkeypatch):
+    monkeypatch.setattr(events, "_subscribers", {"route": []})
+    seen = []
+    events.subscribe("route", seen.append)
+    # The first poll only records the current head of the event log
+    db.add(CacheEvent(topic="route", key="OLD:OLD", origin="other:1"))
+    db.commit()
+    assert events.poll(db, force=True) == 0
+    db.add(CacheEvent(topic="route", key="AAA:BBB", origin="other:1"))
+    db.add(CacheEvent(topic="route", key="CCC:DDD", origin=events._origin()))
+    db.commit()
+    assert events.poll(db, force=True) == 1
+    assert seen == ["AAA:BBB"]
+    assert events.poll(db, force=True) == 0
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from app import cli
+from app.uk_train_schedule.executor import JourneyQuery, RoutingExecutor
+from app.uk_train_schedule.raptor import RaptorTimetable
+from app.uk_train_schedule.snapshot import TimetableSnapshot, write_snapshot
+
+# departure, arrival, from, to, service
+ROWS = [
+    (100, 200, "AAA", "DDD", "direct"),
+    (105, 120, "AAA", "BBB", "fast1"),
+    (125, 170, "BBB", "DDD", "fast2"),
+    (125, 140, "BBB", "CCC", "hop"),
+    (145, 150, "CCC", "DDD", "hop2"),
+    (300, 330, "DDD", "AAA", "back"),
+]
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = str(tmp_path / "timetable.snapshot")
+    write_snapshot(path, sorted(ROWS), 0, 1440)
+    return path
+
+
+def test_executor_matches_serial_routing_in_order(snapshot_path):
+    queries = [
+        JourneyQuery("AAA", "DDD", 90, 3),
+        JourneyQuery("DDD", "AAA", 90),
+        JourneyQuery("AAA", "CCC", 90, 1),
+        JourneyQuery("AAA", "ZZZ", 90),
+        JourneyQuery("AAA", "DDD", 90, 0),
+    ]
+    with TimetableSnapshot(snapshot_path) as snapshot:
+        timetable = RaptorTimetable(snapshot)
+    expected = [
+        timetable.journeys(q.origin, q.destination, q.start_minute, q.max_changes)
+        for q in queries
+    ]
+    with RoutingExecutor(snapshot_path, workers=2, chunk_size=2) as executor:
+        assert executor.map(queries) == expected
+        assert executor.map([]) == []
+    assert [len(options) for options in expected] == [3, 1, 1, 0, 1]
+
+
+def test_executor_applies_interchange_times(snapshot_path):
+    with RoutingExecutor(
+        snapshot_path, workers=1, min_connection=lambda code: 10
+    ) as executor:
+        (options,) = executor.map([JourneyQuery("AAA", "DDD", 90, 3)])
+    assert [option.changes for option in options] == [0]
+
+
+def test_precompute_itineraries_command(snapshot_path, tmp_path):
+    pairs = tmp_path / "pairs.csv"
+    pairs.write_text(
+        "# origin,destination[,start]\n"
+        "AAA,DDD\n"
+        "DDD,AAA,1970-01-01T04:00:00+00:00\n"
+    )
+    output = tmp_path / "itineraries.jsonl"
+    argv = [
+        "precompute-itineraries",
+        str(pairs),
+        "--output",
+        str(output),
+        "--start",
+        "1970-01-01T01:30:00+00:00",
+        "--snapshot",
+        snapshot_path,
+        "--workers",
+        "2",
+    ]
+    assert cli.main(argv) == 0
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [(r["origin"], len(r["options"])) for r in records] == [
+        ("AAA", 3),
+        ("DDD", 1),
+    ]
+    assert records[1]["options"][0]["legs"][0]["service_id"] == "back"
@@ -0,0 +1,127 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.settings import settings
+from app.uk_train_schedule import controller, crud
+from app.uk_train_schedule.timeconv import to_epoch_minute
+
+
+def test_unobserved_station_uses_upstream_defaults(sqlite_db):
+    plan = controller._fetch_plan(sqlite_db, "AAA", None, 15)
+    assert plan == controller.FetchPlan(
+        settings.upstream_window_minutes, controller.FETCH_LIMIT
+    )
+    assert controller._fetch_plan(sqlite_db, "AAA", None, 600).horizon_minutes == 600
+
+
+def test_busy_and_sparse_stations_get_different_windows(sqlite_db):
+    crud.record_departure_rate(sqlite_db, "WAT", None, 120.0)
+    crud.record_departure_rate(sqlite_db, "RUR", None, 1.0)
+    busy = controller._fetch_plan(sqlite_db, "WAT", None, 15)
+    sparse = controller._fetch_plan(sqlite_db, "RUR", None, 15)
+    assert busy.horizon_minutes == 50
+    assert busy.limit == 150
+    assert sparse.horizon_minutes == settings.fetch_max_horizon_minutes
+    assert sparse.limit == 36
+    # the caller's window is always spanned
+    assert controller._fetch_plan(sqlite_db, "WAT", None, 90).horizon_minutes == 90
+
+
+def test_departure_rate_is_a_weighted_average(sqlite_db):
+    assert crud.get_departure_rate(sqlite_db, "AAA", "BBB") is None
+    crud.record_departure_rate(sqlite_db, "AAA", "BBB", 10.0)
+    crud.record_departure_rate(sqlite_db, "AAA", "BBB", 20.0)
+    assert crud.get_departure_rate(sqlite_db, "AAA", "BBB") == pytest.approx(13.0)
+    assert crud.get_departure_rate(sqlite_db, "AAA", None) is None
+
+
+def test_store_records_coverage_and_rate_for_plan(sqlite_db):
+    data = {
+        "date": "2025-06-04",
+        "departures": {
+            "all": [
+                {
+                    "service": f"svc{i}",
+                    "aimed_departure_time": f"07:{i * 10:02d}",
+                    "station_detail": {
+                        "calling_at": [
+                            {"station_code": "BBB", "aimed_arrival_time": "08:30"}
+                        ]
+                    },
+                }
+                for i in range(4)
+            ]
+        },
+    }
+    start = to_epoch_minute(datetime(2025, 6, 4, 7, 0))
+    with patch.object(
+        controller, "_fetch_plan", return_value=controller.FetchPlan(240, 100)
+    ), patch.object(controller, "_fetch_timetable_from_api", return_value=data):
+        rows = controller._fetch_and_store(sqlite_db, "AAA", None, start, 60, True)
+    assert len(rows) == 4
+    assert crud.is_window_covered(sqlite_db, "AAA", None, start, start + 240)
+    assert crud.get_departure_rate(sqlite_db, "AAA", None) == pytest.approx(1.0)
+
+
+def test_fetch_sends_horizon_and_limit(monkeypatch):
+    response = MagicMock()
+    response.json.return_value = {"departures": {"all": []}}
+    client = MagicMock()
+    client.__enter__.return_value.get.return_value = response
+    with patch("httpx.Client", return_value=client):
+        controller._fetch_timetable_from_api(
+            "AAA",
+            None,
+            datetime(2025, 6, 4, 7, 0),
+            horizon_minutes=90,
+            limit=40,
+        )
+    params = client.__enter__.return_value.get.call_args.kwargs["params"]
+    assert params["to_offset"] == "PT01:30:00"
+    assert params["limit"] == 40
+    assert "calling_at" not in params
+
+
+def test_departures_past_midnight_are_on_the_next_date(sqlite_db):
+    data = {
+        "date": "2025-06-04",
+        "departures": {
+            "all": [
+                {
+                    "service": service,
+                    "aimed_departure_time": departs,
+                    "station_detail": {
+                        "calling_at": [
+                            {"station_code": "BBB", "aimed_arrival_time": arrives}
+                        ]
+                    },
+                }
+                for service, departs, arrives in [
+                    ("late", "23:50", "00:20"),
+                    ("night", "00:30", "01:10"),
+                ]
+            ]
+        },
+    }
+    start = to_epoch_minute(datetime(2025, 6, 4, 20, 0))
+    with patch.object(
+        controller, "_fetch_plan", return_value=controller.FetchPlan(1440, 100)
+    ), patch.object(controller, "_fetch_timetable_from_api", return_value=data):
+        rows = controller._fetch_and_store(sqlite_db, "AAA", None, start, 60, True)
+    assert [(row.departure_minute, row.arrival_minute) for row in rows] == [
+        (
+            to_epoch_minute(datetime(2025, 6, 4, 23, 50)),
+            to_epoch_minute(datetime(2025, 6, 5, 0, 20)),
+        ),
+        (
+            to_epoch_minute(datetime(2025, 6, 5, 0, 30)),
+            to_epoch_minute(datetime(2025, 6, 5, 1, 10)),
+        ),
+    ]
+    # A journey just after midnight finds the night train in the cache
+    night = to_epoch_minute(datetime(2025, 6, 5, 0, 15))
+    assert controller.fetch_or_store_connections(
+        sqlite_db, "AAA", "BBB", night, night + 60
+    ) == [rows[1][:2] + ("night",)]
@@ -0,0 +1,100 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.uk_train_schedule import controller, crud, store
+from app.uk_train_schedule.graph import (
+    UNREACHABLE,
+    TransferGraph,
+    build_graph,
+    timetable_bounds,
+)
+from app.uk_train_schedule.raptor import RaptorTimetable
+from app.uk_train_schedule.store import MemoryTimetableStore, StoredConnection
+
+ROWS = [
+    # service, from, to, departure, arrival
+    ("slow", "AAA", "CCC", 100, 190),
+    ("a1", "AAA", "BBB", 100, 120),
+    ("a1", "AAA", "CCC", 100, 160),
+    ("a1", "BBB", "CCC", 122, 160),
+    ("b1", "BBB", "CCC", 121, 140),
+    ("b2", "BBB", "CCC", 124, 150),
+    ("x1", "DDD", "EEE", 100, 110),
+]
+
+
+@pytest.fixture
+def db(sqlite_db):
+    for row in ROWS:
+        crud.post_timetable_entry(sqlite_db, *row)
+    return sqlite_db
+
+
+def test_build_graph_csr_and_lower_bounds(db, tmp_path):
+    path = str(tmp_path / "transfer.graph")
+    assert build_graph(db, path) == (5, 4)
+    with TransferGraph(path) as graph:
+        aaa, bbb, ccc = (graph.station_index(code) for code in ("AAA", "BBB", "CCC"))
+        assert graph.station_index("ZZZ") is None
+        assert dict(graph.neighbours(aaa)) == {bbb: 20, ccc: 60}
+        assert dict(graph.neighbours(bbb)) == {ccc: 19}
+        assert graph.lower_bound(aaa, ccc) == 39
+        assert graph.lower_bound(ccc, aaa) == UNREACHABLE
+        assert graph.lower_bounds_to(ccc)[aaa] == 39
+
+
+def test_build_graph_reads_the_timetable_store(sqlite_db, tmp_path):
+    memory = MemoryTimetableStore()
+    memory.upsert(
+        None,
+        [
+            StoredConnection(departure, arrival, station_from, station_to, service)
+            for service, station_from, station_to, departure, arrival in ROWS
+        ],
+    )
+    path = str(tmp_path / "transfer.graph")
+    with patch.object(store, "_store", memory):
+        assert build_graph(sqlite_db, path) == (5, 4)
+    with TransferGraph(path) as graph:
+        aaa, ccc = graph.station_index("AAA"), graph.station_index("CCC")
+        assert graph.lower_bound(aaa, ccc) == 39
+
+
+def timetable(rows):
+    return RaptorTimetable(
+        (departure, arrival, station_from, station_to, service)
+        for service, station_from, station_to, departure, arrival in rows
+    )
+
+
+def test_options_with_lower_bounds_match_unpruned(db, tmp_path):
+    path = str(tmp_path / "transfer.graph")
+    build_graph(db, path)
+    trips = timetable(ROWS)
+    with TransferGraph(path) as graph:
+        view = timetable_bounds(graph, trips)
+        assert view.admissible
+        # checked once per timetable, not per query
+        assert timetable_bounds(graph, trips) is view
+        bounds = view.to("CCC")
+        plain = trips.journeys("AAA", "CCC", 90, 2)
+        pruned = trips.journeys("AAA", "CCC", 90, 2, lower_bounds=bounds)
+        assert plain == pruned
+        assert [(j.arrival_minute, j.changes) for j in pruned] == [(160, 0), (140, 1)]
+        assert [leg.service for leg in pruned[-1].legs] == ["a1", "b1"]
+        # an unreachable station is never routed towards
+        assert bounds[trips.station_index["DDD"]] == UNREACHABLE
+        assert view.to("ZZZ") is None
+
+
+def test_stale_graph_bounds_are_not_used(db, tmp_path):
+    path = str(tmp_path / "transfer.graph")
+    build_graph(db, path)
+    # a faster train added after the graph was built
+    trips = timetable(ROWS + [("fast", "AAA", "CCC", 100, 110)])
+    with TransferGraph(path) as graph:
+        assert not timetable_bounds(graph, trips).admissible
+        with patch.object(controller, "get_graph", return_value=graph):
+            assert controller._lower_bounds(trips, "CCC") is None
+            assert controller._lower_bounds(timetable(ROWS), "CCC") is not None
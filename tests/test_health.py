@@ -1,5 +1,8 @@
-from app.health.router import health_check
+from unittest.mock import patch
+
+from app.health.router import health_check, snapshot_stats
 from app.health.schema import HealthResponse
+from app.uk_train_schedule import snapshot_manager
 
 
 def test_health_check_returns_healthresponse():
@@ -12,3 +15,11 @@ def test_health_check_returns_healthresponse():
     assert resp.python_version
     assert resp.os
     assert resp.env
+
+
+def test_snapshot_stats_without_snapshot(tmp_path):
+    manager = snapshot_manager.SnapshotManager(str(tmp_path / "missing.snapshot"))
+    with patch.object(snapshot_manager, "_manager", manager):
+        resp = snapshot_stats()
+    assert (resp.generation, resp.connections, resp.builds) == (0, 0, 0)
+    assert not resp.building
@@ -0,0 +1,37 @@
+import pytest
+
+from app.uk_train_schedule import crud
+from app.uk_train_schedule.identifiers import services, stations
+from app.uk_train_schedule.models import Station, TimetableEntry
+
+
+def test_keys_are_created_once_and_cached(sqlite_db):
+    keys = stations.keys(sqlite_db, ["AAA", "BBB"])
+    assert set(keys) == {"AAA", "BBB"}
+    assert stations.key(sqlite_db, "AAA") == keys["AAA"]
+    assert sqlite_db.query(Station).count() == 2
+    assert stations.key(sqlite_db, "ZZZ", create=False) is None
+    stations.clear()
+    assert stations.code(sqlite_db, keys["BBB"]) == "BBB"
+
+
+def test_code_raises_for_unknown_key_without_session():
+    with pytest.raises(KeyError):
+        stations.code(None, 999)
+
+
+def test_entries_store_integer_keys_and_resolve_codes(sqlite_db):
+    assert crud.post_timetable_entry(sqlite_db, "svc1", "AAA", "BBB", 100, 110)
+    assert not crud.post_timetable_entry(sqlite_db, "svc1", "AAA", "BBB", 100, 110)
+    stored = sqlite_db.query(TimetableEntry).one()
+    assert isinstance(stored.station_from_key, int)
+    assert stored.service_key == services.key(sqlite_db, "svc1")
+    stations.clear()
+    services.clear()
+    entry = crud.get_earliest_timetable_entry(sqlite_db, "AAA", "BBB", 90)
+    assert (entry.service_id, entry.station_from, entry.station_to) == (
+        "svc1",
+        "AAA",
+        "BBB",
+    )
+    assert crud.get_earliest_timetable_entry(sqlite_db, "AAA", "ZZZ", 90) is None
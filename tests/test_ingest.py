@@ -0,0 +1,127 @@
+import threading
+from datetime import datetime
+from unittest.mock import patch
+
+from app.health.router import ingest_stats
+from app.uk_train_schedule import controller, crud, ingest
+from app.uk_train_schedule.ingest import FetchBatch, WriteBehindQueue
+from app.uk_train_schedule.store import StoredConnection
+
+
+def batch(station_from, departures, start=0):
+    rows = [
+        StoredConnection(minute, minute + 30, station_from, "ZZZ", f"s{minute}")
+        for minute in departures
+    ]
+    return FetchBatch(station_from, None, rows, start, start + 120, len(rows))
+
+
+def test_writer_coalesces_and_marks_coverage_after_rows(sqlite_db):
+    queue = WriteBehindQueue(maxsize=10)
+    writing, release = threading.Event(), threading.Event()
+    original = ingest.write_batches
+    calls = []
+
+    def blocked_write(session, batches):
+        writing.set()
+        release.wait(5)
+        calls.append([b.station_from for b in batches])
+        return original(session, batches)
+
+    with patch.object(ingest, "write_batches", side_effect=blocked_write):
+        queue.submit(sqlite_db, batch("AAA", [10]))
+        assert writing.wait(5)
+        done = [
+            queue.submit(sqlite_db, batch(code, [20, 30])) for code in ("BBB", "CCC")
+        ]
+        release.set()
+        assert queue.flush(5)
+    assert all(event.is_set() for event in done)
+    # the first batch is written alone, the two queued behind it together
+    assert calls == [["AAA"], ["BBB", "CCC"]]
+    assert crud.is_window_covered(sqlite_db, "CCC", None, 0, 120)
+    assert crud.get_connections_in_window(sqlite_db, "CCC", "ZZZ", 0, 120)[0][:2] == (
+        20,
+        50,
+    )
+    stats = queue.stats()
+    assert (stats.submitted_batches, stats.written_batches, stats.writes) == (3, 3, 2)
+    assert stats.written_rows == 5
+    assert queue.stop(5)
+
+
+def test_full_queue_applies_backpressure(sqlite_db):
+    queue = WriteBehindQueue(maxsize=1, put_timeout=0.01)
+    writing, release = threading.Event(), threading.Event()
+    original = ingest.write_batches
+
+    def slow_write(session, batches):
+        if threading.current_thread().name == "timetable-writer":
+            writing.set()
+            release.wait(5)
+        return original(session, batches)
+
+    with patch.object(ingest, "write_batches", side_effect=slow_write):
+        queue.submit(sqlite_db, batch("AAA", [10]))
+        assert writing.wait(5)  # taken by the writer
+        queue.submit(sqlite_db, batch("BBB", [10]))  # fills the queue
+        inline = queue.submit(sqlite_db, batch("CCC", [10]))
+        assert inline.is_set()
+        assert crud.is_window_covered(sqlite_db, "CCC", None, 0, 120)
+        release.set()
+        assert queue.stop(5)
+    assert queue.stats().inline_batches == 1
+    assert crud.is_window_covered(sqlite_db, "BBB", None, 0, 120)
+
+
+def test_stop_drains_queue(sqlite_db):
+    queue = WriteBehindQueue()
+    for code in ("AAA", "BBB"):
+        queue.submit(sqlite_db, batch(code, [10]))
+    assert queue.stop(5)
+    assert crud.is_window_covered(sqlite_db, "BBB", None, 0, 120)
+    assert queue.flush(0)
+
+
+def test_journey_on_miss_uses_fetched_rows_before_they_are_written(sqlite_db):
+    data = {
+        "date": "2025-06-04",
+        "departures": {
+            "all": [
+                {
+                    "service": "svc",
+                    "aimed_departure_time": "07:00",
+                    "station_detail": {
+                        "calling_at": [
+                            {"station_code": "BBB", "aimed_arrival_time": "07:20"}
+                        ]
+                    },
+                }
+            ]
+        },
+    }
+    release = threading.Event()
+    original = ingest.write_batches
+
+    def blocked_write(session, batches):
+        release.wait(5)
+        return original(session, batches)
+
+    start = controller.to_epoch_minute(datetime(2025, 6, 4, 6, 55))
+    with patch.object(
+        controller, "_fetch_timetable_from_api", return_value=data
+    ), patch.object(ingest, "write_batches", side_effect=blocked_write):
+        legs = controller.plan_journey(sqlite_db, ["AAA", "BBB"], start, 10)
+        assert not crud.is_window_covered(sqlite_db, "AAA", "BBB", start, start + 10)
+        release.set()
+        assert ingest.get_ingest_queue().flush(5)
+    assert [(leg.service_id, leg.arrival_minute) for leg in legs] == [
+        ("svc", start + 25)
+    ]
+    assert crud.is_window_covered(sqlite_db, "AAA", "BBB", start, start + 10)
+
+
+def test_ingest_stats_endpoint():
+    response = ingest_stats()
+    assert response.queued_batches >= 0
+    assert response.inline_batches >= 0
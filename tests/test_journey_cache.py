@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.router import app
+from app.uk_train_schedule import events
+from app.uk_train_schedule.cache import JourneyResultCache, journey_key
+from app.uk_train_schedule.timeconv import LONDON
+
+START = datetime(2025, 6, 16, 10, 0, 42, tzinfo=LONDON)
+
+
+def test_journey_key_rounds_to_minute():
+    assert journey_key(["AAA", "BBB"], START, 30) == journey_key(
+        ["AAA", "BBB"], START.replace(second=0), 30
+    )
+
+
+def test_cache_invalidates_by_route():
+    cache = JourneyResultCache(maxsize=10)
+    first = journey_key(["AAA", "BBB", "CCC"], START, 30)
+    second = journey_key(["DDD", "EEE"], START, 30)
+    cache.put(first, "2025-06-16T11:00:00+01:00", cache.generation)
+    cache.put(second, "2025-06-16T12:00:00+01:00", cache.generation)
+    cache.invalidate_route(events.route_key("BBB", "CCC"))
+    assert cache.get(first) is None
+    assert cache.get(second) is not None
+
+
+def test_cache_skips_results_computed_before_invalidation():
+    cache = JourneyResultCache(maxsize=10)
+    key = journey_key(["AAA", "BBB"], START, 30)
+    generation = cache.generation
+    cache.invalidate_route(events.route_key("AAA", "BBB"))
+    cache.put(key, "2025-06-16T11:00:00+01:00", generation)
+    assert cache.get(key) is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = JourneyResultCache(maxsize=1)
+    first = journey_key(["AAA", "BBB"], START, 30)
+    second = journey_key(["CCC", "DDD"], START, 30)
+    cache.put(first, "a", cache.generation)
+    cache.put(second, "b", cache.generation)
+    assert cache.get(first) is None
+    assert cache.get(second).arrival_time == "b"
+
+
+@pytest.fixture
+def planner_calls(monkeypatch):
+    import app.uk_train_schedule.router as journey_router
+
+    calls = []
+
+    def fake_find_earliest_journey(db, codes, start, wait):
+        calls.append(codes)
+        return "2025-06-16T12:00:00+01:00"
+
+    monkeypatch.setattr(
+        journey_router, "find_earliest_journey", fake_find_earliest_journey
+    )
+    return calls
+
+
+def test_journey_get_conditional_request(planner_calls):
+    client = TestClient(app)
+    params = {
+        "station_codes": ["AAA", "BBB"],
+        "start_time": "2025-06-16T10:00:00",
+        "max_wait": 30,
+    }
+    first = client.get("/v1/journey/", params=params)
+    assert first.status_code == 200
+    assert first.json()["arrival_time"] == "2025-06-16T12:00:00+01:00"
+    etag = first.headers["ETag"]
+    assert "max-age" in first.headers["Cache-Control"]
+    second = client.get("/v1/journey/", params=params, headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["ETag"] == etag
+    assert len(planner_calls) == 1
+    events._dispatch(events.ROUTE_TOPIC, events.route_key("AAA", "BBB"))
+    third = client.get("/v1/journey/", params=params, headers={"If-None-Match": etag})
+    assert third.status_code == 304
+    assert len(planner_calls) == 2
+
+
+def test_journey_post_sets_etag(planner_calls):
+    client = TestClient(app)
+    payload = {
+        "station_codes": ["AAA", "BBB"],
+        "start_time": "2025-06-16T10:00:00",
+        "max_wait": 30,
+    }
+    first = client.post("/v1/journey/", json=payload)
+    second = client.post("/v1/journey/", json=payload)
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert len(planner_calls) == 1
+
+
+def test_journey_get_validates_query(planner_calls):
+    client = TestClient(app)
+    resp = client.get("/v1/journey/", params={"station_codes": ["AAA"], "max_wait": 30})
+    assert resp.status_code == 422
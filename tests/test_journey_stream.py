@@ -0,0 +1,100 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.router import app
+from app.uk_train_schedule import controller
+from app.uk_train_schedule import router as journey_router
+from app.uk_train_schedule.schema import JourneyRequest
+from app.uk_train_schedule.timeconv import to_epoch_minute
+
+REQUEST = JourneyRequest(
+    station_codes=["AAA", "BBB", "CCC"],
+    start_time="2025-06-16T10:00:00+01:00",
+    max_wait=15,
+)
+START = to_epoch_minute(REQUEST.start_time)
+
+
+def connections(db, station_from, station_to, start_minute, end_minute):
+    if station_from == "AAA":
+        # slow train first, fast train five minutes later
+        return [(START, START + 60, "slow"), (START + 5, START + 30, "fast")]
+    return [(START + 35, START + 50, "link")]
+
+
+def parse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_emits_legs_then_journey():
+    with patch.object(
+        controller, "fetch_or_store_connections", side_effect=connections
+    ):
+        response = TestClient(app).post(
+            "/v1/journey/stream", json=REQUEST.model_dump(mode="json")
+        )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse(response.text)
+    assert [event for event, _ in events] == ["leg", "leg", "journey"]
+    assert events[0][1] == {
+        "station_from": "AAA",
+        "station_to": "BBB",
+        "service_id": "fast",
+        "departure_time": "2025-06-16T10:05:00+01:00",
+        "arrival_time": "2025-06-16T10:30:00+01:00",
+    }
+    summary = events[-1][1]
+    assert summary["arrival_time"] == "2025-06-16T10:50:00+01:00"
+    assert [leg["service_id"] for leg in summary["legs"]] == ["fast", "link"]
+
+
+def test_stream_reports_missing_leg_as_error_event():
+    def no_link(db, station_from, station_to, start_minute, end_minute):
+        return connections(db, station_from, station_to, start_minute, end_minute)[
+            : 2 if station_from == "AAA" else 0
+        ]
+
+    with patch.object(controller, "fetch_or_store_connections", side_effect=no_link):
+        response = TestClient(app).post(
+            "/v1/journey/stream", json=REQUEST.model_dump(mode="json")
+        )
+    events = parse(response.text)
+    assert [event for event, _ in events] == ["leg", "error"]
+    assert events[1][1]["status_code"] == 404
+    assert "No trains found for BBB to CCC" in events[1][1]["detail"]
+
+
+class DisconnectingRequest:
+    """Reports a disconnect after the first leg has been sent."""
+
+    def __init__(self):
+        self.checks = 0
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.checks > 1
+
+
+def test_disconnect_cancels_remaining_legs():
+    async def consume():
+        return [
+            chunk
+            async for chunk in journey_router._journey_events(
+                REQUEST, DisconnectingRequest()
+            )
+        ]
+
+    with patch.object(
+        controller, "fetch_or_store_connections", side_effect=connections
+    ) as fetch:
+        chunks = asyncio.run(consume())
+    assert len(chunks) == 1 and chunks[0].startswith("event: leg")
+    assert fetch.call_count == 1
@@ -0,0 +1,87 @@
+import json
+import logging
+import queue
+
+import pytest
+
+from app import logs
+from app.settings import settings
+
+
+def record(name="app.test", level=logging.INFO, msg="hit %s", args=("AAA",), **extra):
+    entry = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    entry.__dict__.update(extra)
+    return entry
+
+
+def test_truncate_bounds_large_payloads():
+    payload = {f"key{i}": "x" * 10_000 for i in range(1000)}
+    text = str(logs.truncate(payload, 200))
+    assert len(text) < 250
+    assert text.endswith("more characters]")
+    assert str(logs.truncate("short")) == "short"
+    assert "%s" % logs.truncate("y" * 50, 10) == "y" * 10 + "... [40 more characters]"
+
+
+def test_sampling_filter_passes_one_in_n():
+    sampler = logs.SamplingFilter({"app.test": 10})
+    passed = [r for r in (record() for _ in range(25)) if sampler.filter(r)]
+    assert len(passed) == 3
+    assert [r.suppressed for r in passed] == [0, 9, 9]
+    assert sampler.filter(record(level=logging.WARNING))
+    assert all(sampler.filter(record(name="app.other")) for _ in range(5))
+    # Templates are sampled separately
+    assert sampler.filter(record(msg="miss %s"))
+
+
+def test_json_formatter_includes_extras():
+    line = logs.JsonFormatter().format(record(station="AAA", minute=42))
+    entry = json.loads(line)
+    assert entry["message"] == "hit AAA"
+    assert entry["logger"] == "app.test"
+    assert entry["level"] == "INFO"
+    assert entry["station"] == "AAA" and entry["minute"] == 42
+    assert "suppressed" not in entry
+
+
+def test_queue_handler_drops_when_full():
+    handler = logs.DroppingQueueHandler(queue.Queue(2))
+    for _ in range(5):
+        handler.handle(record())
+    assert handler.dropped == 3
+    queued = handler.queue.get_nowait()
+    # Left for the listener thread to format
+    assert queued.args == ("AAA",) and queued.msg == "hit %s"
+
+
+@pytest.fixture
+def root_logger(monkeypatch):
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield root
+    logs.stop_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_configure_logging_writes_json_through_the_queue(
+    root_logger, monkeypatch, capsys
+):
+    monkeypatch.setattr(settings, "log_format", "json")
+    monkeypatch.setattr(settings, "log_sampling", {"app.sampled": 3})
+    logs.configure_logging(force=True)
+    assert isinstance(root_logger.handlers[0], logs.DroppingQueueHandler)
+    logging.getLogger("app.test").info("fetched %s", "AAA", extra={"rows": 3})
+    for _ in range(6):
+        logging.getLogger("app.sampled").info("cache hit")
+    logs.stop_logging()
+    lines = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+    assert lines[0]["message"] == "fetched AAA" and lines[0]["rows"] == 3
+    assert [line.get("suppressed", 0) for line in lines[1:]] == [0, 2]
+    assert logs.dropped_records() == 0
+    # An already configured root logger is left alone
+    logs.configure_logging()
+    assert root_logger.handlers[0] is logs._handler
@@ -10,15 +10,15 @@ from app.uk_train_schedule.models import TimetableEntry
 
 def test_timetable_entry_instantiation():
     entry = TimetableEntry(
-        service_id="svc1",
-        station_from="AAA",
-        station_to="BBB",
+        service_key=1,
+        station_from_key=1,
+        station_to_key=2,
         aimed_departure_time=datetime(2025, 6, 16, 10, 0, tzinfo=timezone.utc),
         aimed_arrival_time=datetime(2025, 6, 16, 11, 0, tzinfo=timezone.utc),
     )
-    assert entry.service_id == "svc1"
-    assert entry.station_from == "AAA"
-    assert entry.station_to == "BBB"
+    assert entry.service_key == 1
+    assert entry.station_from_key == 1
+    assert entry.station_to_key == 2
     assert entry.aimed_departure_time.hour == 10
     assert entry.aimed_arrival_time.hour == 11
     assert entry.aimed_departure_time.second == 0
@@ -0,0 +1,97 @@
+import random
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+
+from app import cli
+from app.uk_train_schedule import crud, service_runs
+from app.uk_train_schedule.query_plans import PLAN_CASES, check_query_plans
+from database.query_plans import full_scans, indexes_used
+
+
+def station(i: int) -> str:
+    return "".join(chr(65 + (i // 26**p) % 26) for p in (2, 1, 0))
+
+
+@pytest.fixture(scope="module")
+def db(sqlite_database):
+    """A few thousand services calling at five of 300 stations, over four days."""
+    session = sqlite_database()()
+    rng = random.Random(0)
+    rows = []
+    for service in range(3000):
+        start = rng.randrange(4 * 1440)
+        calls = rng.sample(range(300), 5)
+        rows.extend(
+            (start + 5 * i, start + 5 * j - 1, station(calls[i]), station(calls[j]))
+            + (f"S{service}",)
+            for i in range(5)
+            for j in range(i + 1, 5)
+        )
+    crud.bulk_insert_timetable_entries(session, rows, 5000)
+    session.commit()
+    service_runs.upsert_service_runs(session, rows[:1000])
+    yield session
+    session.close()
+
+
+def test_crud_queries_use_their_indexes(db):
+    reports = check_query_plans(db, repeat=1)
+    assert [report.name for report in reports] == [case.name for case in PLAN_CASES]
+    for report in reports:
+        assert report.ok, (report.name, report.plan)
+    db.execute(text("ANALYZE"))
+    assert all(report.ok for report in check_query_plans(db, repeat=1))
+
+
+def test_dropped_index_is_reported(db):
+    db.execute(text("DROP INDEX ix_timetable_departure"))
+    db.commit()
+    # New connections: sqlite3 caches EXPLAIN statements across schema changes
+    db.get_bind().dispose()
+    try:
+        (report,) = check_query_plans(
+            db,
+            [case for case in PLAN_CASES if case.name == "get_connections_departing"],
+        )
+    finally:
+        db.execute(
+            text(
+                "CREATE INDEX ix_timetable_departure ON timetable_entries (departure_minute)"
+            )
+        )
+        db.commit()
+        db.get_bind().dispose()
+    assert not report.ok
+    assert report.missing == {"ix_timetable_departure"}
+
+
+def test_plan_parsing_for_both_dialects():
+    sqlite_plan = [
+        "SEARCH timetable_entries USING INDEX ix_timetable_route_departure (x=?)",
+        "SCAN service_runs USING COVERING INDEX ix_service_runs_service",
+        "SCAN CONSTANT ROW",
+    ]
+    assert indexes_used(sqlite_plan) == {
+        "ix_timetable_route_departure",
+        "ix_service_runs_service",
+    }
+    assert full_scans(sqlite_plan) == {"service_runs"}
+    postgres_plan = [
+        "Limit  (cost=0.42..8.44 rows=1 width=20)",
+        "  ->  Index Scan using ix_timetable_route_departure on timetable_entries",
+        "  ->  Bitmap Index Scan on ix_fetch_coverage_lookup  (cost=0.00..4.2)",
+        "  ->  Seq Scan on departure_rates  (cost=0.00..1.01 rows=1 width=8)",
+    ]
+    assert indexes_used(postgres_plan) == {
+        "ix_timetable_route_departure",
+        "ix_fetch_coverage_lookup",
+    }
+    assert full_scans(postgres_plan) == {"departure_rates"}
+
+
+def test_check_query_plans_command(db, capsys):
+    with patch("database.session.create_session", return_value=db):
+        assert cli.main(["check-query-plans", "--repeat", "1"]) == 0
+    assert "get_earliest_timetable_entry" in capsys.readouterr().out
@@ -0,0 +1,201 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.router import app
+from app.uk_train_schedule import controller, crud, snapshot_manager
+from app.uk_train_schedule.raptor import RaptorLeg, RaptorTimetable
+from app.uk_train_schedule.snapshot_manager import SnapshotManager
+from database.session import get_db
+
+# departure, arrival, from, to, service
+ROWS = [
+    # direct but slow
+    (100, 200, "AAA", "DDD", "direct"),
+    # one change at BBB
+    (105, 120, "AAA", "BBB", "fast1"),
+    (125, 170, "BBB", "DDD", "fast2"),
+    # two changes via BBB and CCC
+    (125, 140, "BBB", "CCC", "hop"),
+    (145, 150, "CCC", "DDD", "hop2"),
+    # a through service calling at BBB and CCC
+    (110, 130, "AAA", "BBB", "thru"),
+    (110, 160, "AAA", "CCC", "thru"),
+    (132, 160, "BBB", "CCC", "thru"),
+]
+
+
+def test_raptor_returns_pareto_options():
+    timetable = RaptorTimetable(ROWS)
+    options = timetable.journeys("AAA", "DDD", 90, max_changes=3)
+    assert [(o.changes, o.arrival_minute) for o in options] == [
+        (0, 200),
+        (1, 170),
+        (2, 150),
+    ]
+    assert options[2].legs == [
+        RaptorLeg("AAA", "BBB", "fast1", 105, 120),
+        RaptorLeg("BBB", "CCC", "hop", 125, 140),
+        RaptorLeg("CCC", "DDD", "hop2", 145, 150),
+    ]
+    assert len(timetable.journeys("AAA", "DDD", 90, max_changes=0)) == 1
+
+
+def test_raptor_minimum_connection_time():
+    timetable = RaptorTimetable(ROWS)
+    min_connection = [0] * len(timetable.stations)
+    min_connection[timetable.station_index["BBB"]] = 10
+    options = timetable.journeys("AAA", "DDD", 90, 3, min_connection)
+    # both connections at BBB are now too tight
+    assert [(o.changes, o.arrival_minute) for o in options] == [(0, 200)]
+
+
+def test_raptor_staying_aboard_is_not_a_change():
+    timetable = RaptorTimetable(ROWS)
+    options = timetable.journeys("AAA", "CCC", 90, 0)
+    assert options[0].legs == [RaptorLeg("AAA", "CCC", "thru", 110, 160)]
+    assert timetable.journeys("AAA", "ZZZ", 90, 3) == []
+
+
+def test_raptor_runs_on_different_days_are_separate_trips():
+    day = 1440
+    rows = [
+        (row[0] + offset, row[1] + offset) + row[2:]
+        for offset in (0, day)
+        for row in ROWS
+        if row[4] == "thru"
+    ]
+    timetable = RaptorTimetable(rows)
+    assert len(timetable) == 2
+    (today,) = timetable.journeys("AAA", "CCC", 90, 0)
+    assert today.legs == [RaptorLeg("AAA", "CCC", "thru", 110, 160)]
+    (tomorrow,) = timetable.journeys("AAA", "CCC", 120, 0)
+    assert tomorrow.legs == [RaptorLeg("AAA", "CCC", "thru", 110 + day, 160 + day)]
+    # boarding the second day's run at BBB
+    (later,) = timetable.journeys("BBB", "CCC", 140, 0)
+    assert later.arrival_minute == 160 + day
+
+
+@pytest.fixture
+def client(sqlite_database):
+    Session = sqlite_database()
+    with Session() as db:
+        for row in ROWS:
+            departure, arrival, station_from, station_to, service = row
+            crud.post_timetable_entry(
+                db, service, station_from, station_to, departure, arrival
+            )
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+
+
+def test_journey_options_endpoint(client):
+    empty = {"date": "1970-01-01", "departures": {"all": []}}
+    with patch.object(
+        controller, "_fetch_timetable_from_api", return_value=empty
+    ) as fetch:
+        response = client.post(
+            "/v1/journey/options",
+            json={
+                "origin": "AAA",
+                "destination": "DDD",
+                "start_time": "1970-01-01T01:30:00+00:00",
+                "max_changes": 1,
+            },
+        )
+    assert response.status_code == 200
+    fetch.assert_called_once()
+    options = response.json()["options"]
+    assert [(o["changes"], o["arrival_time"]) for o in options] == [
+        (0, "1970-01-01T03:20:00+00:00"),
+        (1, "1970-01-01T02:50:00+00:00"),
+    ]
+    assert options[1]["legs"][0]["service_id"] == "fast1"
+
+
+def test_journey_options_not_found_and_validation(client):
+    with patch.object(
+        controller,
+        "_fetch_timetable_from_api",
+        return_value={"date": "1970-01-01", "departures": {"all": []}},
+    ):
+        response = client.post(
+            "/v1/journey/options",
+            json={
+                "origin": "DDD",
+                "destination": "AAA",
+                "start_time": "1970-01-01T01:30:00+00:00",
+            },
+        )
+    assert response.status_code == 404
+    response = client.post(
+        "/v1/journey/options",
+        json={"origin": "AAA", "destination": "DDD", "max_changes": 9},
+    )
+    assert response.status_code == 422
+
+
+@pytest.fixture
+def snapshot_sessions(sqlite_database, tmp_path):
+    """A database holding the BBB->DDD leg, served from a mapped snapshot."""
+    Session = sqlite_database()
+    with Session() as db:
+        crud.post_timetable_entry(db, "fast2", "BBB", "DDD", 125, 170)
+    manager = SnapshotManager(
+        str(tmp_path / "timetable.snapshot"), Session, window=lambda: (0, 600)
+    )
+    manager.rebuild()
+    with patch.object(snapshot_manager, "_manager", manager):
+        yield Session
+
+
+def test_journey_options_route_fetched_departures_past_the_snapshot(
+    snapshot_sessions,
+):
+    # 1970-01-01 was in British Standard Time (UTC+1): 02:45 is minute 105
+    fetched = {
+        "date": "1970-01-01",
+        "departures": {
+            "all": [
+                {
+                    "service": "fast1",
+                    "aimed_departure_time": "02:45",
+                    "station_detail": {
+                        "calling_at": [
+                            {"station_code": "BBB", "aimed_arrival_time": "03:00"}
+                        ]
+                    },
+                }
+            ]
+        },
+    }
+    with snapshot_sessions() as db, patch.object(
+        controller, "_fetch_timetable_from_api", return_value=fetched
+    ) as fetch:
+        (option,) = controller.get_journey_options(db, "AAA", "DDD", 90, 1)
+    fetch.assert_called_once()
+    assert [leg.service for leg in option.legs] == ["fast1", "fast2"]
+
+
+def test_journey_options_use_the_snapshot_only_within_its_window(
+    snapshot_sessions,
+):
+    with snapshot_sessions() as db:
+        crud.mark_window_covered(db, "BBB", None, 0, 1440)
+        # written after the snapshot was built
+        crud.post_timetable_entry(db, "late", "BBB", "DDD", 700, 760)
+        (snapshot_option,) = controller.get_journey_options(db, "BBB", "DDD", 90, 0)
+        # the horizon from 400 runs past the snapshot's end at 600
+        (store_option,) = controller.get_journey_options(db, "BBB", "DDD", 400, 0)
+    assert snapshot_option.arrival_minute == 170
+    assert store_option.legs[0].service == "late"
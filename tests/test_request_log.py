@@ -0,0 +1,29 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.request_log import RequestLogMiddleware, read_request_log
+
+
+def test_requests_are_logged_with_body_and_status(tmp_path):
+    path = str(tmp_path / "requests.log")
+    app = FastAPI()
+    app.add_middleware(RequestLogMiddleware, path=path)
+
+    @app.post("/echo")
+    def echo(payload: dict):
+        return payload
+
+    client = TestClient(app)
+    client.post(
+        "/echo?x=1",
+        json={"station_codes": ["AAA", "BBB"]},
+        headers={"X-Request-Timeout": "5", "Authorization": "secret"},
+    )
+    client.get("/missing")
+    first, second = read_request_log(path)
+    assert (first["method"], first["path"], first["query"]) == ("POST", "/echo", "x=1")
+    assert first["body"] == '{"station_codes":["AAA","BBB"]}'
+    assert first["headers"]["x-request-timeout"] == "5"
+    assert "authorization" not in first["headers"]
+    assert first["status"] == 200 and first["ms"] >= 0
+    assert (second["path"], second["status"], second["body"]) == ("/missing", 404, "")
@@ -0,0 +1,23 @@
+import json
+
+from app import responses
+from app.responses import FastJSONResponse, default_response_class
+
+
+def test_fast_json_response_renders_json():
+    body = FastJSONResponse({"arrival_time": "2025-06-16T10:30:00+01:00", 1: [2]}).body
+    assert json.loads(body) == {"arrival_time": "2025-06-16T10:30:00+01:00", "1": [2]}
+
+
+def test_default_response_class(monkeypatch):
+    monkeypatch.setattr(responses, "_has_native_serialisation", lambda: False)
+    expected = FastJSONResponse if responses.orjson is not None else None
+    assert default_response_class() is expected
+    monkeypatch.setattr(responses, "_has_native_serialisation", lambda: True)
+    assert default_response_class() is None
+
+
+def test_fast_json_response_without_orjson(monkeypatch):
+    monkeypatch.setattr(responses, "orjson", None)
+    assert json.loads(FastJSONResponse({"a": 1}).body) == {"a": 1}
+    assert default_response_class() is None
@@ -0,0 +1,97 @@
+from unittest.mock import patch
+
+from app.uk_train_schedule import controller, crud, routing
+
+
+def test_relax_leg_keeps_every_reachable_arrival():
+    labels = routing.origin_labels(100)
+    connections = [(100, 160, 1), (105, 130, 2), (120, 125, 3)]
+    reached = routing.relax_leg(labels, connections, max_wait=10)
+    # the 120 departure is outside max_wait
+    assert [label.arrival_minute for label in reached] == [130, 160]
+    assert reached[0].service_key == 2
+
+
+def test_relax_leg_respects_wait_from_each_label():
+    labels = routing.relax_leg(
+        routing.origin_labels(0), [(0, 50, 1), (5, 20, 2)], max_wait=10
+    )
+    # 40 is reachable only from the 20 arrival; 58 only from the 50 arrival
+    reached = routing.relax_leg(labels, [(40, 90, 3), (58, 70, 4)], max_wait=20)
+    assert [(label.arrival_minute, label.parent.service_key) for label in reached] == [
+        (70, 1),
+        (90, 2),
+    ]
+    chain = routing.backtrack(reached[0])
+    assert [label.service_key for label in chain] == [1, 4]
+
+
+def test_relax_leg_no_connections():
+    assert routing.relax_leg(routing.origin_labels(0), [], 10) == []
+
+
+def test_leg_window():
+    labels = routing.relax_leg(
+        routing.origin_labels(0), [(0, 50, 1), (5, 20, 2)], max_wait=10
+    )
+    assert routing.leg_window(labels, 15) == (20, 65)
+
+
+def test_plan_journey_one_range_query_per_leg(sqlite_db):
+    for service, dep, arr in [("slow", 0, 60), ("fast", 5, 30), ("late", 30, 40)]:
+        crud.post_timetable_entry(sqlite_db, service, "AAA", "BBB", dep, arr)
+    crud.post_timetable_entry(sqlite_db, "link", "BBB", "CCC", 35, 45)
+    crud.mark_window_covered(sqlite_db, "AAA", None, 0, 500)
+    crud.mark_window_covered(sqlite_db, "BBB", None, 0, 500)
+
+    with patch.object(
+        crud,
+        "get_connections_in_window",
+        wraps=crud.get_connections_in_window,
+    ) as query, patch.object(controller, "_fetch_timetable_from_api") as fetch:
+        legs = controller.plan_journey(sqlite_db, ["AAA", "BBB", "CCC"], 0, 10)
+    fetch.assert_not_called()
+    assert query.call_count == 2
+    assert [(leg.service_id, leg.arrival_minute) for leg in legs] == [
+        ("fast", 30),
+        ("link", 45),
+    ]
+
+
+def test_relax_leg_applies_minimum_connection_time():
+    labels = routing.relax_leg(routing.origin_labels(0), [(0, 20, 1)], max_wait=10)
+    connections = [(20, 40, 2), (22, 45, 3)]
+    reached = routing.relax_leg(labels, connections, max_wait=10, min_connection=2)
+    assert [label.service_key for label in reached] == [3]
+
+
+def test_relax_leg_same_service_continuation_needs_no_change():
+    labels = routing.relax_leg(routing.origin_labels(0), [(0, 20, 1)], max_wait=10)
+    connections = [(20, 30, 1), (20, 28, 2)]
+    reached = routing.relax_leg(labels, connections, max_wait=10, min_connection=5)
+    assert [label.service_key for label in reached] == [1]
+
+
+def test_relax_leg_no_connection_time_at_origin():
+    reached = routing.relax_leg(
+        routing.origin_labels(0), [(0, 20, 1)], max_wait=10, min_connection=5
+    )
+    assert len(reached) == 1
+
+
+def test_plan_journey_uses_station_interchange_time(sqlite_db):
+    from app.uk_train_schedule.interchange import interchange_times
+
+    crud.post_timetable_entry(sqlite_db, "first", "AAA", "BBB", 0, 30)
+    crud.post_timetable_entry(sqlite_db, "tight", "BBB", "CCC", 33, 40)
+    crud.post_timetable_entry(sqlite_db, "next", "BBB", "CCC", 40, 50)
+    crud.mark_window_covered(sqlite_db, "AAA", None, 0, 500)
+    crud.mark_window_covered(sqlite_db, "BBB", None, 0, 500)
+    assert interchange_times.minutes(sqlite_db, None) == interchange_times.default
+
+    legs = controller.plan_journey(sqlite_db, ["AAA", "BBB", "CCC"], 0, 15)
+    assert legs[-1].service_id == "tight"
+
+    interchange_times.set(sqlite_db, "BBB", 5)
+    legs = controller.plan_journey(sqlite_db, ["AAA", "BBB", "CCC"], 0, 15)
+    assert legs[-1].service_id == "next"
@@ -1,9 +1,10 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 import pytest
 from pydantic import ValidationError
 
-from app.uk_train_schedule.schema import JourneyRequest
+from app.uk_train_schedule.schema import JourneyOptionsRequest, JourneyRequest
+from app.uk_train_schedule.timeconv import LONDON
 
 
 def test_station_codes_too_short():
@@ -31,9 +32,16 @@ def test_start_time_invalid():
 
 
 def test_start_time_default():
+    before = datetime.now(timezone.utc)
     req = JourneyRequest(station_codes=["ABC", "DEF"], max_wait=10)
-    # Should default to a valid ISO string
-    datetime.fromisoformat(req.start_time)
+    assert before <= req.start_time <= datetime.now(timezone.utc)
+    # UK time, whatever the server's local zone
+    assert req.start_time.tzinfo == LONDON
+    # an empty start time also means now
+    req = JourneyRequest(station_codes=["ABC", "DEF"], start_time="", max_wait=10)
+    assert before <= req.start_time
+    options = JourneyOptionsRequest(origin="ABC", destination="DEF")
+    assert options.start_time.tzinfo == LONDON
 
 
 def test_max_wait_too_low():
@@ -57,5 +65,26 @@ def test_valid_request():
         station_codes=["ABC", "DEF"], start_time="2025-06-16T10:00:00", max_wait=30
     )
     assert req.station_codes == ["ABC", "DEF"]
-    assert req.start_time == "2025-06-16T10:00:00"
+    assert req.start_time == datetime(2025, 6, 16, 10, 0)
     assert req.max_wait == 30
+
+
+def test_start_time_keeps_utc_offset():
+    req = JourneyRequest(
+        station_codes=["ABC", "DEF"], start_time="2025-06-16T10:00:00+02:00", max_wait=5
+    )
+    assert req.start_time.utcoffset() == timedelta(hours=2)
+
+
+def test_missing_field_keeps_default_message():
+    with pytest.raises(ValidationError) as exc:
+        JourneyRequest(max_wait=10)
+    assert exc.value.errors()[0]["type"] == "missing"
+
+
+def test_options_request_messages():
+    with pytest.raises(ValidationError) as exc:
+        JourneyOptionsRequest(origin="abc", destination="DEF", max_changes=6)
+    message = str(exc.value)
+    assert "Invalid station code: abc" in message
+    assert "max_changes must be between 0 and 5." in message
@@ -0,0 +1,103 @@
+from sqlalchemy import event
+
+from app.uk_train_schedule import service_runs
+from app.uk_train_schedule.models import ServiceRun, ServiceStop
+from app.uk_train_schedule.service_runs import (
+    Stop,
+    connection_count,
+    decode_stops,
+    encode_stops,
+    merge_stops,
+)
+from app.uk_train_schedule.store import ServiceRunTimetableStore, StoredConnection
+
+CALLS = [("AAA", 100, 100), ("BBB", 110, 112), ("CCC", 125, 127), ("DDD", 140, 140)]
+
+
+def board(origin: int, service: str = "s1", offset: int = 0):
+    """The rows a board fetched at CALLS[origin] yields for one train."""
+    _, _, departure = CALLS[origin]
+    return [
+        StoredConnection(
+            departure + offset, arrival + offset, CALLS[origin][0], code, service
+        )
+        for code, arrival, _ in CALLS[origin + 1 :]
+    ]
+
+
+def test_encode_round_trip():
+    stops = [Stop(7, None, 100), Stop(3, 110, 112), Stop(9, 125, None)]
+    blob = encode_stops(100, stops)
+    assert len(blob) == 2 + 3 * 4 + 6 * 2
+    assert decode_stops(100, blob) == stops
+    assert connection_count(stops) == 3
+
+
+def test_merge_rejects_other_trains():
+    run = [Stop(1, None, 100), Stop(2, 110, None)]
+    # the same train departing station 2 after its arrival there
+    assert merge_stops(run, [Stop(2, None, 112), Stop(3, 125, None)]) == [
+        Stop(1, None, 100),
+        Stop(2, 110, 112),
+        Stop(3, 125, None),
+    ]
+    # a later train on the same service code
+    assert merge_stops(run, [Stop(2, None, 140), Stop(3, 150, None)]) is None
+    # disagreeing times, and no shared station
+    assert merge_stops(run, [Stop(1, None, 101), Stop(2, 110, None)]) is None
+    assert merge_stops(run, [Stop(4, None, 101), Stop(5, 110, None)]) is None
+
+
+def test_boards_merge_into_one_run(sqlite_db):
+    store = ServiceRunTimetableStore()
+    # boards fetched at every station, in no particular order
+    for origin in (1, 0, 2):
+        store.upsert(sqlite_db, board(origin))
+    assert sqlite_db.query(ServiceRun).count() == 1
+    assert sqlite_db.query(ServiceStop).count() == len(CALLS)
+    # rides between intermediate stations come from different boards
+    assert store.connections(sqlite_db, "BBB", "DDD", 0, 999) == [(112, 140, "s1")]
+    assert len(store.connections_departing(sqlite_db, 0, 999)) == 6
+    assert store.upsert(sqlite_db, board(0)) == 0
+    # the next train on the same service is a run of its own
+    assert store.upsert(sqlite_db, board(0, offset=60)) == 3
+    assert sqlite_db.query(ServiceRun).count() == 2
+    assert store.evict(sqlite_db, 130) == 6
+    assert store.connections(sqlite_db, "AAA", "DDD", 0, 999) == [(160, 200, "s1")]
+
+
+def test_board_cursor_survives_run_growth(sqlite_db):
+    store = ServiceRunTimetableStore()
+    store.upsert(sqlite_db, board(1)[:1])
+    first = store.departures(sqlite_db, "BBB", 0, None, 10)
+    store.upsert(sqlite_db, board(0) + board(1))
+    (departure,) = store.departures(sqlite_db, "BBB", 0, None, 10)
+    assert departure.id == first[0].id
+    assert (departure.station_to, departure.arrival_minute) == ("DDD", 140)
+    assert service_runs.get_departures(sqlite_db, "BBB", 112, departure.id, 10) == []
+
+
+def test_upsert_reads_runs_once_and_inserts_stops_in_one_batch(sqlite_db):
+    store = ServiceRunTimetableStore()
+    store.upsert(sqlite_db, [row for i in range(5) for row in board(1, f"s{i}")])
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[:3])
+
+    engine = sqlite_db.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        # ten trains: five grow stored runs, five start new ones
+        store.upsert(
+            sqlite_db,
+            [row for i in range(10) for row in board(0, f"s{i}")],
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    selects = [words for words in statements if words[0] == "SELECT"]
+    # station and service keys, candidate runs, and their stops
+    assert len(selects) == 4
+    assert statements.count(["INSERT", "INTO", "service_stops"]) == 1
+    assert sqlite_db.query(ServiceRun).count() == 10
+    assert sqlite_db.query(ServiceStop).count() == 5 * 4 + 5 * 4
@@ -0,0 +1,63 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.uk_train_schedule import crud, store
+from app.uk_train_schedule.snapshot import (
+    Connection,
+    TimetableSnapshot,
+    export_snapshot,
+)
+from app.uk_train_schedule.store import MemoryTimetableStore, StoredConnection
+
+
+@pytest.fixture
+def db(sqlite_db):
+    rows = [
+        ("svc2", "AAA", "CCC", 120, 150),
+        ("svc1", "AAA", "BBB", 100, 110),
+        ("svc3", "BBB", "CCC", 115, 130),
+        ("svc4", "AAA", "BBB", 140, 152),
+        ("svc5", "AAA", "BBB", 5000, 5010),
+    ]
+    for service_id, station_from, station_to, dep, arr in rows:
+        crud.post_timetable_entry(
+            sqlite_db, service_id, station_from, station_to, dep, arr
+        )
+    return sqlite_db
+
+
+def test_export_and_query_snapshot(db, tmp_path):
+    path = str(tmp_path / "timetable.snapshot")
+    assert export_snapshot(db, path, 0, 1440) == 4
+    with TimetableSnapshot(path) as snapshot:
+        assert len(snapshot) == 4
+        assert snapshot.station_count == 3
+        assert [c.departure_minute for c in snapshot] == [100, 115, 120, 140]
+        assert list(snapshot.departures("AAA", 110)) == [
+            Connection(120, 150, "AAA", "CCC", "svc2"),
+            Connection(140, 152, "AAA", "BBB", "svc4"),
+        ]
+        assert list(snapshot.departures("AAA", 0, station_to="BBB", limit=1)) == [
+            Connection(100, 110, "AAA", "BBB", "svc1")
+        ]
+        assert list(snapshot.departures("ZZZ", 0)) == []
+        assert snapshot.station_index("BBB") == 1
+        assert snapshot.station_index("ZZZ") is None
+
+
+def test_export_reads_the_timetable_store(tmp_path):
+    memory = MemoryTimetableStore()
+    memory.upsert(None, [StoredConnection(100, 110, "AAA", "BBB", "svc1")])
+    path = str(tmp_path / "memory.snapshot")
+    with patch.object(store, "_store", memory):
+        assert export_snapshot(None, path, 0, 1440) == 1
+    with TimetableSnapshot(path) as snapshot:
+        assert list(snapshot) == [Connection(100, 110, "AAA", "BBB", "svc1")]
+
+
+def test_snapshot_rejects_foreign_file(tmp_path):
+    path = tmp_path / "bogus.snapshot"
+    path.write_bytes(b"\0" * 256)
+    with pytest.raises(ValueError):
+        TimetableSnapshot(str(path))
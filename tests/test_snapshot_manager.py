@@ -0,0 +1,140 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.settings import settings
+from app.uk_train_schedule import crud, snapshot_manager
+from app.uk_train_schedule.events import TIMETABLE_TOPIC, _dispatch
+from app.uk_train_schedule.ingest import FetchBatch, write_batches
+from app.uk_train_schedule.snapshot import TimetableSnapshot, write_snapshot
+from app.uk_train_schedule.snapshot_manager import SnapshotManager, validate_snapshot
+from app.uk_train_schedule.store import StoredConnection
+
+ROWS = [
+    ("svc1", "AAA", "BBB", 100, 110),
+    ("svc2", "AAA", "CCC", 120, 150),
+    ("svc3", "BBB", "CCC", 115, 130),
+]
+
+
+@pytest.fixture
+def sessions(sqlite_database):
+    factory = sqlite_database()
+    with factory() as db:
+        for row in ROWS:
+            crud.post_timetable_entry(db, *row)
+    return factory
+
+
+@pytest.fixture
+def manager(tmp_path, sessions):
+    return SnapshotManager(
+        str(tmp_path / "timetable.snapshot"), sessions, window=lambda: (0, 1440)
+    )
+
+
+def test_rebuild_swaps_while_old_generation_stays_usable(manager, sessions):
+    assert manager.current() is None
+    first = manager.rebuild()
+    assert manager.current() is first
+    assert (first.number, len(first.snapshot)) == (1, 3)
+    with sessions() as db:
+        crud.post_timetable_entry(db, "svc4", "AAA", "BBB", 140, 152)
+    second = manager.rebuild()
+    assert manager.current() is second
+    assert len(second.snapshot) == 4
+    # a request that started on the first generation still reads it
+    assert [c.service_id for c in first.snapshot.departures("AAA", 0)] == [
+        "svc1",
+        "svc2",
+    ]
+    assert second.timetable.journeys("AAA", "BBB", 130, 0, [0, 0, 0])
+    stats = manager.stats()
+    assert (stats.generation, stats.connections, stats.builds) == (2, 4, 2)
+    assert stats.size_bytes == os.path.getsize(manager.path)
+    assert not os.path.exists(f"{manager.path}.{os.getpid()}.next")
+
+
+def test_failed_rebuild_keeps_serving(manager, sessions):
+    served = manager.rebuild()
+    with sessions() as db:
+        crud.evict_timetable_entries(db, 1440)
+    with pytest.raises(ValueError, match="shrank"):
+        manager.rebuild()
+    assert manager.current() is served
+    assert manager.stats().failures == 1
+    with TimetableSnapshot(manager.path) as snapshot:
+        assert len(snapshot) == 3
+    assert not os.path.exists(f"{manager.path}.{os.getpid()}.next")
+
+
+def test_empty_rebuild_is_not_served(tmp_path, sessions):
+    manager = SnapshotManager(
+        str(tmp_path / "later.snapshot"), sessions, window=lambda: (5000, 6440)
+    )
+    with pytest.raises(ValueError, match="no connections"):
+        manager.rebuild()
+    assert manager.current() is None
+    assert not os.path.exists(manager.path)
+
+
+def test_rebuild_adopts_a_snapshot_built_since_the_request(manager, sessions):
+    # a second process serving the same file
+    other = SnapshotManager(manager.path, sessions, window=lambda: (0, 1440))
+    manager.rebuild()
+    assert len(other.current().snapshot) == 3
+    with sessions() as db:
+        crud.post_timetable_entry(db, "svc4", "AAA", "BBB", 140, 152)
+    requested = time.time_ns()
+    manager.rebuild(requested)
+    with patch.object(snapshot_manager, "export_snapshot") as export:
+        adopted = other.rebuild(requested)
+        export.assert_not_called()
+    assert (adopted.number, len(adopted.snapshot)) == (2, 4)
+    assert (other.stats().builds, other.stats().adopted) == (0, 1)
+    # the file is older than a new request: build again
+    other.rebuild()
+    assert (other.stats().builds, other.stats().adopted) == (1, 1)
+
+
+def test_timetable_event_reloads_in_background(manager, sessions):
+    manager.rebuild()
+    with sessions() as db:
+        crud.post_timetable_entry(db, "svc4", "AAA", "BBB", 140, 152)
+    with patch.object(snapshot_manager, "_manager", manager):
+        _dispatch(TIMETABLE_TOPIC, "import")
+        _dispatch(TIMETABLE_TOPIC, "import")
+        manager.wait(10)
+    assert manager.current().number >= 2
+    assert len(manager.current().snapshot) == 4
+    assert not manager.stats().building
+
+
+def test_ingest_write_reloads_once_per_burst(manager, sessions, monkeypatch):
+    manager.rebuild()
+    monkeypatch.setattr(settings, "snapshot_reload_delay_seconds", 0.2)
+    rows = [
+        StoredConnection(140, 152, "AAA", "BBB", "svc4"),
+        StoredConnection(160, 175, "BBB", "CCC", "svc5"),
+    ]
+    with patch.object(snapshot_manager, "_manager", manager), sessions() as db:
+        for row in rows:
+            write_batches(
+                db, [FetchBatch(row.station_from, None, [row], None, None, 1)]
+            )
+        manager.wait(10)
+    assert (manager.current().number, len(manager.current().snapshot)) == (2, 5)
+    assert manager.stats().builds == 2
+
+
+def test_validate_snapshot_checks_header_and_records(tmp_path):
+    path = str(tmp_path / "check.snapshot")
+    write_snapshot(path, [(100, 110, "AAA", "BBB", "s1")], 0, 1440)
+    with TimetableSnapshot(path) as snapshot:
+        validate_snapshot(snapshot, 1, 0, 1440)
+        with pytest.raises(ValueError):
+            validate_snapshot(snapshot, 2, 0, 1440)
+        with pytest.raises(ValueError):
+            validate_snapshot(snapshot, 1, 0, 60)
@@ -0,0 +1,47 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+SRC = str(Path(__file__).resolve().parents[1] / "src")
+
+
+def test_import_has_no_side_effects(tmp_path):
+    db_file = tmp_path / "startup.db"
+    code = (
+        "import threading, main, app.logs as l, database.session as s; "
+        "assert s._engine is None, 'engine created at import'; "
+        "assert l._listener is None, 'log listener started at import'; "
+        "assert threading.active_count() == 1, threading.enumerate()"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        cwd=tmp_path,
+        env={"PYTHONPATH": SRC, "db_url": f"sqlite:///{db_file}", "env": "PROD"},
+    )
+    assert not db_file.exists()
+
+
+def test_lifespan_creates_tables_in_dev():
+    from app.router import app
+    from database.session import get_engine
+
+    with TestClient(app) as client:
+        assert client.get("/").status_code == 200
+    from sqlalchemy import inspect
+
+    assert "timetable_entries" in inspect(get_engine()).get_table_names()
+
+
+def test_cli_migrate(tmp_path):
+    db_file = tmp_path / "migrate.db"
+    subprocess.run(
+        [sys.executable, "-m", "app.cli", "migrate"],
+        check=True,
+        cwd=tmp_path,
+        env={"PYTHONPATH": SRC, "db_url": f"sqlite:///{db_file}"},
+        capture_output=True,
+    )
+    assert db_file.exists()
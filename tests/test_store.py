@@ -0,0 +1,165 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app import cli
+from app.uk_train_schedule import controller, store
+from app.uk_train_schedule.store import (
+    MemoryTimetableStore,
+    ServiceRunTimetableStore,
+    SqliteTimetableStore,
+    StoredConnection,
+)
+
+ROWS = [
+    StoredConnection(100, 130, "AAA", "BBB", "s1"),
+    StoredConnection(100, 160, "AAA", "CCC", "s1"),
+    StoredConnection(110, 140, "AAA", "BBB", "s2"),
+    StoredConnection(120, 150, "BBB", "CCC", "s3"),
+    StoredConnection(200, 230, "AAA", "BBB", "s4"),
+]
+
+
+@pytest.fixture(params=["sqlite", "memory", "services"])
+def timetable_store(request):
+    if request.param == "memory":
+        return MemoryTimetableStore()
+    if request.param == "services":
+        return ServiceRunTimetableStore()
+    store = SqliteTimetableStore()
+    store.batch_size = 2  # exercise batching
+    return store
+
+
+def test_upsert_skips_duplicates(sqlite_db, timetable_store):
+    assert timetable_store.upsert(sqlite_db, ROWS) == len(ROWS)
+    assert timetable_store.upsert(sqlite_db, ROWS[:2]) == 0
+    assert timetable_store.upsert(sqlite_db, []) == 0
+
+
+def test_range_lookups(sqlite_db, timetable_store):
+    timetable_store.upsert(sqlite_db, list(reversed(ROWS)))
+    assert timetable_store.connections(sqlite_db, "AAA", "BBB", 100, 200) == [
+        (100, 130, "s1"),
+        (110, 140, "s2"),
+        (200, 230, "s4"),
+    ]
+    assert timetable_store.connections(sqlite_db, "AAA", "BBB", 101, 199) == [
+        (110, 140, "s2")
+    ]
+    assert timetable_store.connections(sqlite_db, "AAA", "ZZZ", 0, 999) == []
+    departing = timetable_store.connections_departing(sqlite_db, 100, 200)
+    assert sorted(departing) == sorted(ROWS[:4])
+    assert [row.departure_minute for row in departing] == [100, 100, 110, 120]
+
+
+def test_departures_dedupe_and_paginate(sqlite_db, timetable_store):
+    timetable_store.upsert(sqlite_db, ROWS)
+    board = timetable_store.departures(sqlite_db, "AAA", 0, None, 10)
+    # s1 is shown once, by its furthest calling point
+    assert [(d.service_id, d.station_to) for d in board] == [
+        ("s1", "CCC"),
+        ("s2", "BBB"),
+        ("s4", "BBB"),
+    ]
+    first = timetable_store.departures(sqlite_db, "AAA", 0, None, 1)
+    rest = timetable_store.departures(
+        sqlite_db, "AAA", first[-1].departure_minute, first[-1].id, 10
+    )
+    assert first + rest == board
+    filtered = timetable_store.departures(
+        sqlite_db, "AAA", 0, None, 10, calling_at="BBB"
+    )
+    assert [d.service_id for d in filtered] == ["s1", "s2", "s4"]
+    assert timetable_store.departures(sqlite_db, "ZZZ", 0, None, 10) == []
+
+
+def test_coverage(sqlite_db, timetable_store):
+    assert not timetable_store.is_covered(sqlite_db, "AAA", None, 100, 200)
+    timetable_store.mark_covered(sqlite_db, "AAA", None, 100, 200)
+    assert timetable_store.is_covered(sqlite_db, "AAA", None, 120, 200)
+    # an unfiltered fetch covers every calling point, not the reverse
+    assert timetable_store.is_covered(sqlite_db, "AAA", "BBB", 120, 200)
+    timetable_store.mark_covered(sqlite_db, "BBB", "CCC", 100, 200)
+    assert not timetable_store.is_covered(sqlite_db, "BBB", None, 100, 200)
+    assert not timetable_store.is_covered(sqlite_db, "AAA", None, 100, 201)
+
+
+def test_evict(sqlite_db, timetable_store):
+    timetable_store.upsert(sqlite_db, ROWS)
+    timetable_store.mark_covered(sqlite_db, "AAA", None, 0, 120)
+    timetable_store.mark_covered(sqlite_db, "AAA", None, 150, 300)
+    assert timetable_store.evict(sqlite_db, 150) == 4
+    assert timetable_store.connections_departing(sqlite_db, 0, 999) == [ROWS[4]]
+    assert not timetable_store.is_covered(sqlite_db, "AAA", None, 0, 100)
+    assert timetable_store.is_covered(sqlite_db, "AAA", None, 150, 300)
+    # evicted rows can be stored again
+    assert timetable_store.upsert(sqlite_db, ROWS[:1]) == 1
+
+
+def test_fastest_rides(sqlite_db, timetable_store):
+    timetable_store.upsert(sqlite_db, ROWS)
+    assert sorted(timetable_store.fastest_rides(sqlite_db)) == [
+        ("AAA", "BBB", 30),
+        ("AAA", "CCC", 60),
+        ("BBB", "CCC", 30),
+    ]
+
+
+def test_get_store_selects_backend():
+    with patch.object(store, "_store", None), patch.object(
+        store.settings, "timetable_store", "memory"
+    ):
+        assert isinstance(store.get_store(), MemoryTimetableStore)
+    with patch.object(store, "_store", None), patch.object(
+        store.settings, "timetable_store", "services"
+    ):
+        assert isinstance(store.get_store(), ServiceRunTimetableStore)
+    with patch.object(store, "_store", None):
+        assert isinstance(store.get_store(), SqliteTimetableStore)
+    with pytest.raises(ValueError):
+        store._create_store("redis")
+
+
+def test_controller_with_memory_store(sqlite_db):
+    data = {
+        "date": "2025-06-04",
+        "departures": {
+            "all": [
+                {
+                    "service": "svc",
+                    "aimed_departure_time": "07:00",
+                    "station_detail": {
+                        "calling_at": [
+                            {"station_code": "BBB", "aimed_arrival_time": "07:20"},
+                            {"station_code": "CCC", "aimed_arrival_time": "07:40"},
+                        ]
+                    },
+                }
+            ]
+        },
+    }
+    with patch.object(store, "_store", MemoryTimetableStore()), patch.object(
+        controller, "_fetch_timetable_from_api", return_value=data
+    ) as fetch, patch("app.uk_train_schedule.events.publish_many") as publish:
+        start = controller.to_epoch_minute(datetime(2025, 6, 4, 7, 0))
+        board = controller.get_departure_board(sqlite_db, "AAA", start, None, 10)
+        # the unfiltered board fetch covers the journey's first leg
+        legs = controller.plan_journey(sqlite_db, ["AAA", "CCC"], start, 30)
+    assert fetch.call_count == 1
+    assert [entry.station_to for entry in board] == ["CCC"]
+    assert [(leg.service_id, leg.arrival_minute) for leg in legs] == [
+        ("svc", start + 40)
+    ]
+    # written by the background writer, on its own session
+    publish.assert_called_once()
+    assert publish.call_args.args[1:] == ("route", ["AAA:BBB", "AAA:CCC"])
+
+
+def test_evict_command():
+    memory = MemoryTimetableStore()
+    memory.upsert(None, ROWS)
+    with patch.object(store, "_store", memory):
+        assert cli.main(["evict", "--before", "1970-01-01T02:30:00+00:00"]) == 0
+    assert memory.connections_departing(None, 0, 999) == [ROWS[4]]
@@ -0,0 +1,58 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.uk_train_schedule.timeconv import (
+    LONDON,
+    from_epoch_minute,
+    hhmm_to_minutes,
+    service_day,
+    to_epoch_minute,
+)
+
+
+def test_hhmm_to_minutes():
+    assert hhmm_to_minutes("00:00") == 0
+    assert hhmm_to_minutes("07:19") == 7 * 60 + 19
+    assert hhmm_to_minutes("23:59") == 1439
+    with pytest.raises(ValueError):
+        hhmm_to_minutes("24:00")
+    with pytest.raises(ValueError):
+        hhmm_to_minutes(None)
+
+
+def test_service_day_applies_bst_offset():
+    day = service_day("2025-06-04")
+    minute = day.epoch_minute("07:19")
+    assert from_epoch_minute(minute) == datetime(2025, 6, 4, 6, 19, tzinfo=timezone.utc)
+
+
+def test_service_day_applies_gmt_offset():
+    day = service_day("2025-01-15")
+    minute = day.epoch_minute("07:19")
+    assert from_epoch_minute(minute) == datetime(
+        2025, 1, 15, 7, 19, tzinfo=timezone.utc
+    )
+
+
+def test_service_day_dst_changeover():
+    # Clocks go forward at 01:00 GMT on 30 March 2025
+    day = service_day(date(2025, 3, 30))
+    assert from_epoch_minute(day.epoch_minute("00:30")) == datetime(
+        2025, 3, 30, 0, 30, tzinfo=timezone.utc
+    )
+    assert from_epoch_minute(day.epoch_minute("10:00")) == datetime(
+        2025, 3, 30, 9, 0, tzinfo=timezone.utc
+    )
+
+
+def test_service_day_next():
+    day = service_day("2025-06-04")
+    assert day.next().epoch_minute("00:10") - day.epoch_minute("23:50") == 20
+
+
+def test_to_epoch_minute_naive_is_london_local():
+    naive = datetime(2025, 6, 4, 7, 0, 42)
+    aware = datetime(2025, 6, 4, 7, 0, tzinfo=LONDON)
+    assert to_epoch_minute(naive) == to_epoch_minute(aware)
+    assert to_epoch_minute(123) == 123
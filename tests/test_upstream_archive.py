@@ -0,0 +1,62 @@
+from datetime import datetime
+from typing import Any
+
+import httpx
+import pytest
+
+from app.settings import settings
+from app.uk_train_schedule import controller
+from app.uk_train_schedule.upstream_archive import (
+    ResponseArchive,
+    archive_key,
+    get_archive,
+)
+
+DATA = {"date": "2025-06-04", "departures": {"all": [{"service": "svc"}]}}
+
+
+def test_key_ignores_credentials_and_parameter_order():
+    url = "https://example/AAA.json"
+    key = archive_key(url, {"app_id": "a", "app_key": "b", "limit": 10, "live": 0})
+    assert key == archive_key(url, {"live": 0, "limit": 10, "app_key": "other"})
+    assert key != archive_key(url, {"live": 0, "limit": 20})
+
+
+def test_archive_round_trip(tmp_path):
+    archive = ResponseArchive(str(tmp_path))
+    assert archive.get("u", {"a": 1}) is None
+    path = archive.put("u", {"a": 1}, DATA)
+    assert path.suffixes == [".json", ".gz"]
+    assert archive.get("u", {"a": 1}) == DATA
+    assert len(archive) == 1
+
+
+def test_unknown_mode_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "upstream_mode", "tape")
+    with pytest.raises(ValueError):
+        get_archive()
+
+
+def test_record_then_replay_without_network(monkeypatch: Any, tmp_path):
+    monkeypatch.setattr(settings, "upstream_archive_path", str(tmp_path))
+    monkeypatch.setattr(settings, "upstream_mode", "record")
+
+    def fake_get(self, url, params=None, timeout=None):
+        return httpx.Response(200, json=DATA, request=httpx.Request("GET", url))
+
+    monkeypatch.setattr(httpx.Client, "get", fake_get)
+    window = datetime(2025, 6, 4, 7, 0)
+    assert controller._fetch_timetable_from_api("AAA", "BBB", window) == DATA
+    assert len(get_archive()) == 1
+
+    def no_network(self, url, params=None, timeout=None):
+        raise AssertionError("replay must not use the network")
+
+    monkeypatch.setattr(httpx.Client, "get", no_network)
+    monkeypatch.setattr(settings, "upstream_mode", "replay")
+    monkeypatch.setattr(settings, "app_key", "another-key")
+    assert controller._fetch_timetable_from_api("AAA", "BBB", window) == DATA
+    with pytest.raises(controller.TransportAPIException) as exc:
+        controller._fetch_timetable_from_api("AAA", "CCC", window)
+    assert exc.value.status_code == 502
+    assert "No recorded TransportAPI response" in exc.value.detail